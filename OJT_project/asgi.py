@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OJT_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup; keeps the live-updates stream from holding a thread per client
+from google_cal_sync.live import route_streams  # noqa: E402
+
+application = route_streams(django_application)
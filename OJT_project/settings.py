@@ -72,11 +72,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    'google_cal_sync.staticfiles.StaticFilesMiddleware',  # WhiteNoise, async-capable for the live stream
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'google_cal_sync.profiling.ProfilingMiddleware',  # Inactive unless PROFILING_ENABLED
+    'google_cal_sync.caching.StaleDataMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,6 +95,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'google_cal_sync.caching.stale_data',
             ],
         },
     },
@@ -122,6 +125,82 @@ else:
     }
 
 
+# Cache
+# Calendar data is cached per user/calendar/window. LocMem is per-process; point
+# REDIS_URL at a Redis instance (requires the `redis` package) to share it across workers.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'google-cal-sync',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Seconds before cached Google Calendar data is fetched again
+CALENDAR_CACHE_TTL = int(os.getenv('CALENDAR_CACHE_TTL', '300'))
+
+# How long the last good copy is kept to serve (with a banner) while Google is down
+CALENDAR_STALE_TTL = int(os.getenv('CALENDAR_STALE_TTL', str(24 * 60 * 60)))
+
+# Google API timeouts (seconds) and circuit breaker; see google_cal_sync/circuit.py
+GOOGLE_API_CONNECT_TIMEOUT = float(os.getenv('GOOGLE_API_CONNECT_TIMEOUT', '3.05'))
+GOOGLE_API_READ_TIMEOUT = float(os.getenv('GOOGLE_API_READ_TIMEOUT', '15'))
+GOOGLE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('GOOGLE_CIRCUIT_FAILURE_THRESHOLD', '5'))
+GOOGLE_CIRCUIT_RESET_SECONDS = float(os.getenv('GOOGLE_CIRCUIT_RESET_SECONDS', '30'))
+
+# Concurrent identical Calendar reads in a worker share one upstream call. With a
+# shared cache (Redis), a lease of this many seconds coalesces them across workers too.
+SINGLE_FLIGHT_LEASE_SECONDS = float(os.getenv('SINGLE_FLIGHT_LEASE_SECONDS', '0'))
+
+# Background threads per worker that warm the cache with what a user is likely
+# to open next (other calendars, adjacent grid windows); 0 disables prefetching.
+# Each user may cause at most PREFETCH_USER_BUDGET Google fetches a minute this way.
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '2'))
+PREFETCH_USER_BUDGET = int(os.getenv('PREFETCH_USER_BUDGET', '20'))
+
+# Live page updates (/events/live/, Server-Sent Events) need an ASGI server, e.g.
+# `gunicorn -k uvicorn.workers.UvicornWorker OJT_project.asgi:application`, and the
+# shared cache (REDIS_URL) when changes are made in other processes. Seconds
+# between checks of the change log; see google_cal_sync/live.py.
+LIVE_POLL_SECONDS = float(os.getenv('LIVE_POLL_SECONDS', '1'))
+
+# .ics subscription feeds (/feeds/<token>.ics) ask Google whether a calendar
+# changed at most this often; polls in between are served from the cache.
+CALENDAR_FEED_CHECK_SECONDS = int(os.getenv('CALENDAR_FEED_CHECK_SECONDS', '300'))
+
+# The change feed (/events/changes/) asks Google about a calendar at most this
+# often while nothing was written through the app; changes are kept this many
+# days, so older cursors must start over.
+CHANGE_FEED_CHECK_SECONDS = int(os.getenv('CHANGE_FEED_CHECK_SECONDS', '60'))
+CHANGE_FEED_RETENTION_DAYS = int(os.getenv('CHANGE_FEED_RETENTION_DAYS', '7'))
+
+# Base URL for the Google OAuth and Calendar endpoints. Leave empty for real
+# Google; set to e.g. http://127.0.0.1:8099 to use `manage.py fake_google`.
+GOOGLE_API_BASE_URL = os.getenv('GOOGLE_API_BASE_URL', '').rstrip('/')
+
+# Reminders sent by `manage.py run_reminders`: minutes before each event starts,
+# and the sink that delivers them (email, or a JSON POST to REMINDER_WEBHOOK_URL)
+REMINDER_MINUTES = [int(m) for m in os.getenv('REMINDER_MINUTES', '10').split(',') if m.strip()]
+REMINDER_SINK = os.getenv('REMINDER_SINK', 'google_cal_sync.reminders.EmailReminderSink')
+REMINDER_WEBHOOK_URL = os.getenv('REMINDER_WEBHOOK_URL', '')
+
+# Per-request cProfile for staff (?_profile=1) or single-use X-Profile-Token headers.
+# Reports older than PROFILE_MAX_AGE seconds, or beyond the newest PROFILE_MAX_FILES, are deleted.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+PROFILE_MAX_AGE = int(os.getenv('PROFILE_MAX_AGE', str(7 * 24 * 60 * 60)))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
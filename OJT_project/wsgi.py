@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OJT_project.settings')
 
 application = get_wsgi_application()
+
+# Preload mode (APP_PRELOAD=True with gunicorn.conf.py, or `gunicorn --preload`):
+# import the views and the Google client stack once in the master so forked
+# workers share them copy-on-write instead of importing them per worker.
+if os.getenv('APP_PRELOAD', 'False') == 'True':
+    from django.urls import get_resolver
+    from google_cal_sync.google_client import preload
+
+    get_resolver().url_patterns
+    preload()
@@ -0,0 +1,128 @@
+"""
+Worker start-up benchmark: lazy imports vs. preload.
+
+Starts gunicorn in each mode and reports
+  * time from spawn to the first successful response on /login/
+  * latency of the first request that needs the Google client stack
+    (/auth/google/login/ builds an OAuth flow)
+  * RSS and PSS (proportional set size, which credits shared pages) per worker
+
+Usage (from the project root):
+    python benchmarks/startup.py [--workers 2] [--port 8765]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+OPENER = urllib.request.build_opener(NoRedirect)
+
+
+def fetch(url):
+    """Return the status code of a GET, treating redirects as responses."""
+    try:
+        with OPENER.open(url, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB from /proc."""
+    rss = pss = 0
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            if line.startswith('Rss:'):
+                rss = int(line.split()[1])
+            elif line.startswith('Pss:'):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def run_mode(preload, workers, port, env):
+    env = dict(env, APP_PRELOAD='True' if preload else 'False')
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'OJT_project.wsgi:application',
+         '-c', str(ROOT / 'gunicorn.conf.py'), '-w', str(workers), '-b', f'127.0.0.1:{port}'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                if fetch(f'{base}/login/') == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("server did not start")
+        first_response = time.perf_counter() - started
+
+        begin = time.perf_counter()
+        fetch(f'{base}/auth/google/login/')
+        first_google = time.perf_counter() - begin
+
+        # Warm every worker so their memory reflects a served request
+        for _ in range(workers * 10):
+            fetch(f'{base}/login/')
+            fetch(f'{base}/auth/google/login/')
+
+        memory = [memory_kb(pid) for pid in worker_pids(server.pid)]
+        return first_response, first_google, memory
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+    env = dict(
+        os.environ,
+        DEBUG='True',
+        DATABASE_URL=f'sqlite:///{database.name}',
+        GOOGLE_CLIENT_ID=os.getenv('GOOGLE_CLIENT_ID', 'benchmark-client'),
+        GOOGLE_CLIENT_SECRET=os.getenv('GOOGLE_CLIENT_SECRET', 'benchmark-secret'),
+    )
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    try:
+        print(f"{'mode':<8} {'first /login/':>14} {'first google':>13} {'RSS/worker':>11} {'PSS/worker':>11}")
+        for preload in (False, True):
+            first_response, first_google, memory = run_mode(preload, args.workers, args.port, env)
+            rss = sum(r for r, _ in memory) / len(memory)
+            pss = sum(p for _, p in memory) / len(memory)
+            print(f"{'preload' if preload else 'lazy':<8} {first_response * 1000:>12.0f}ms {first_google * 1000:>11.0f}ms "
+                  f"{rss / 1024:>9.1f}MB {pss / 1024:>9.1f}MB")
+    finally:
+        os.unlink(database.name)
+
+
+if __name__ == '__main__':
+    main()
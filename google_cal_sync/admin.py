@@ -1,10 +1,91 @@
 from django.contrib import admin
-from .models import GoogleToken
+from .models import (
+    CalendarFeed,
+    CalendarSyncState,
+    DigestDelivery,
+    EventChange,
+    GoogleToken,
+    ImportJob,
+    IndexedEvent,
+    SentReminder,
+    SyncLink,
+    SyncPair,
+)
 
 
 @admin.register(GoogleToken)
 class GoogleTokenAdmin(admin.ModelAdmin):
-    list_display = ('user', 'token_expiry', 'created_at', 'updated_at')
-    list_filter = ('created_at', 'token_expiry')
+    list_display = ('user', 'token_expiry', 'needs_reauth', 'refresh_failures', 'created_at', 'updated_at')
+    list_filter = ('needs_reauth', 'created_at', 'token_expiry')
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(IndexedEvent)
+class IndexedEventAdmin(admin.ModelAdmin):
+    list_display = ('summary', 'user', 'calendar_id', 'start', 'indexed_at')
+    list_filter = ('calendar_id',)
+    search_fields = ('summary', 'location', 'user__username')
+    readonly_fields = ('indexed_at',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'calendar_id', 'status', 'processed', 'created', 'failed', 'created_at')
+    list_filter = ('status', 'file_format')
+    search_fields = ('filename', 'user__username')
+    readonly_fields = ('created_at', 'finished_at')
+
+
+@admin.register(SentReminder)
+class SentReminderAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'user', 'calendar_id', 'remind_at', 'sent_at')
+    search_fields = ('event_id', 'user__username')
+    readonly_fields = ('sent_at',)
+
+
+@admin.register(SyncPair)
+class SyncPairAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'two_way', 'enabled', 'last_synced_at', 'last_error')
+    list_filter = ('two_way', 'enabled')
+    search_fields = ('source_user__username', 'target_user__username', 'source_calendar_id', 'target_calendar_id')
+    readonly_fields = ('source_sync_token', 'target_sync_token', 'last_synced_at', 'last_stats', 'last_error',
+                       'created_at')
+
+
+@admin.register(SyncLink)
+class SyncLinkAdmin(admin.ModelAdmin):
+    list_display = ('origin_event_id', 'mirror_event_id', 'pair', 'origin', 'updated_at')
+    list_filter = ('origin',)
+    search_fields = ('origin_event_id', 'mirror_event_id')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(CalendarFeed)
+class CalendarFeedAdmin(admin.ModelAdmin):
+    list_display = ('calendar_id', 'user', 'name', 'created_at')
+    search_fields = ('calendar_id', 'name', 'user__username')
+    readonly_fields = ('token', 'created_at')
+
+
+@admin.register(DigestDelivery)
+class DigestDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('day', 'user', 'status', 'events', 'updated_at')
+    list_filter = ('status', 'day')
+    search_fields = ('user__username', 'error')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(CalendarSyncState)
+class CalendarSyncStateAdmin(admin.ModelAdmin):
+    list_display = ('calendar_id', 'user', 'checked_at', 'version')
+    search_fields = ('calendar_id', 'user__username')
+    readonly_fields = ('sync_token', 'checked_at', 'version')
+
+
+@admin.register(EventChange)
+class EventChangeAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'calendar_id', 'user', 'deleted', 'recorded_at')
+    list_filter = ('deleted', 'recorded_at')
+    search_fields = ('event_id', 'calendar_id', 'user__username')
+    readonly_fields = ('event', 'recorded_at')
@@ -0,0 +1,258 @@
+"""
+Calendar analytics: busy-hours heatmap, meeting load and overlaps.
+
+Events are loaded once into NumPy arrays of start/end epochs and every
+statistic is computed with array operations. There are no per-event Python
+loops after loading.
+
+Busy time is the *union* of events (two overlapping meetings count once). The
+union is built from start-sorted intervals with a running maximum of end
+times, which yields disjoint pieces. Time per bucket (hour, week) then comes
+from the cumulative busy-time function
+    F(t) = sum_i clip(t - s_i, 0, e_i - s_i)
+evaluated at every bucket edge with searchsorted over the sorted starts and
+ends, so the cost is O((events + buckets) log events).
+
+All-day, free (transparent) and declined events are left out of busy time.
+"""
+import hashlib
+from datetime import datetime, time, timedelta
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+from .caching import calendar_version, canonical_calendar_id, get_events_window
+from .utils import filter_writable_calendars, parse_google_datetime
+
+
+ANALYTICS_RANGES = {'week': 7, 'month': 30, 'quarter': 91, 'year': 365}
+DEFAULT_RANGE = 'month'
+# Results are keyed by calendar versions, so this only bounds staleness of "now"
+ANALYTICS_CACHE_TTL = 15 * 60
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _counts_toward_busy(raw):
+    if raw.get('transparency') == 'transparent':
+        return False
+    for attendee in raw.get('attendees') or []:
+        if attendee.get('self') and attendee.get('responseStatus') == 'declined':
+            return False
+    return True
+
+
+def busy_view(event):
+    """
+    What analytics reads of a normalized event: its times, transparency and
+    the user's own attendee entry. A year of events is held at once, so the
+    descriptions and the rest of 'raw' are dropped.
+    """
+    raw = event.get('raw') or {}
+    return {'raw': {
+        'start': raw.get('start'),
+        'end': raw.get('end'),
+        'transparency': raw.get('transparency'),
+        'attendees': [attendee for attendee in raw.get('attendees') or () if attendee.get('self')],
+    }}
+
+
+def events_to_arrays(events_by_calendar):
+    """
+    (starts, ends, calendar_index) int64/int arrays for timed, busy events,
+    plus the number of all-day events skipped.
+    """
+    starts, ends, calendars = [], [], []
+    all_day = 0
+    for index, events in enumerate(events_by_calendar):
+        for event in events:
+            raw = event.get('raw') or {}
+            start, end = raw.get('start') or {}, raw.get('end') or {}
+            if start.get('date'):
+                all_day += 1
+                continue
+            if not _counts_toward_busy(raw):
+                continue
+            start_dt = parse_google_datetime(start.get('dateTime'))
+            end_dt = parse_google_datetime(end.get('dateTime'))
+            if not start_dt or not end_dt or end_dt <= start_dt:
+                continue
+            starts.append(start_dt.timestamp())
+            ends.append(end_dt.timestamp())
+            calendars.append(index)
+    return (
+        np.asarray(starts, dtype=np.int64),
+        np.asarray(ends, dtype=np.int64),
+        np.asarray(calendars, dtype=np.intp),
+        all_day,
+    )
+
+
+def union_intervals(starts, ends):
+    """Disjoint (starts, ends) covering the same time as the input intervals."""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    covered_until = np.maximum.accumulate(ends)
+    # Each interval contributes only the part after everything before it
+    previous = np.concatenate(([starts[0]], covered_until[:-1]))
+    piece_starts = np.maximum(starts, previous)
+    keep = ends > piece_starts
+    return piece_starts[keep], ends[keep]
+
+
+def busy_time_before(edges, starts, ends):
+    """F(edge) for every edge: total interval time before that instant."""
+    sorted_starts = np.sort(starts)
+    sorted_ends = np.sort(ends)
+    start_sums = np.concatenate(([0], np.cumsum(sorted_starts)))
+    end_sums = np.concatenate(([0], np.cumsum(sorted_ends)))
+    started = np.searchsorted(sorted_starts, edges, side='right')
+    ended = np.searchsorted(sorted_ends, edges, side='right')
+    return (started * edges - start_sums[started]) - (ended * edges - end_sums[ended])
+
+
+def bucket_busy_seconds(bucket_starts, bucket_ends, starts, ends):
+    """Busy seconds inside each [bucket_start, bucket_end)."""
+    return busy_time_before(bucket_ends, starts, ends) - busy_time_before(bucket_starts, starts, ends)
+
+
+def overlap_stats(starts, ends):
+    """(events overlapping another event, peak number of concurrent events)."""
+    if not len(starts):
+        return 0, 0
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    covered_until = np.maximum.accumulate(ends)
+    overlaps_earlier = np.zeros(len(starts), dtype=bool)
+    overlaps_earlier[1:] = starts[1:] < covered_until[:-1]
+    # Sorted by start, so if the next event starts after this one ends, none later overlaps it
+    overlaps_later = np.zeros(len(starts), dtype=bool)
+    overlaps_later[:-1] = starts[1:] < ends[:-1]
+
+    # Sweep: +1 at each start, -1 at each end; ends sort before starts at equal times
+    times = np.concatenate((starts, ends))
+    deltas = np.concatenate((np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)))
+    order = np.lexsort((deltas, times))
+    peak = int(np.cumsum(deltas[order]).max())
+    return int(np.count_nonzero(overlaps_earlier | overlaps_later)), peak
+
+
+def local_day_starts(first_day, days):
+    """Epoch of local midnight for each day (DST-aware)."""
+    tz = timezone.get_current_timezone()
+    return np.asarray([
+        int(timezone.make_aware(datetime.combine(first_day + timedelta(days=offset), time.min), tz).timestamp())
+        for offset in range(days)
+    ], dtype=np.int64)
+
+
+def compute_analytics(events_by_calendar, calendar_names, first_day, days):
+    """Statistics for `days` local days from `first_day`; see the module docstring."""
+    starts, ends, calendar_index, all_day = events_to_arrays(events_by_calendar)
+    midnights = local_day_starts(first_day, days + 1)
+    range_start, range_end = midnights[0], midnights[-1]
+    starts, ends = np.clip(starts, range_start, range_end), np.clip(ends, range_start, range_end)
+    inside = ends > starts
+    starts, ends, calendar_index = starts[inside], ends[inside], calendar_index[inside]
+
+    busy_starts, busy_ends = union_intervals(starts, ends)
+
+    # Heatmap: busy minutes per (weekday, hour), summed over the days in range
+    hour_starts = (midnights[:-1, None] + 3600 * np.arange(24)).ravel()
+    hourly = bucket_busy_seconds(hour_starts, hour_starts + 3600, busy_starts, busy_ends).reshape(days, 24)
+    weekdays = np.asarray([(first_day + timedelta(days=offset)).weekday() for offset in range(days)])
+    heatmap = np.zeros((7, 24))
+    np.add.at(heatmap, weekdays, hourly / 60)
+
+    # Busy hours per week (weeks counted from first_day)
+    week_edges = midnights[::7]
+    if week_edges[-1] != range_end:
+        week_edges = np.append(week_edges, range_end)
+    weekly = bucket_busy_seconds(week_edges[:-1], week_edges[1:], busy_starts, busy_ends) / 3600
+
+    durations = ends - starts
+    per_calendar_hours = np.bincount(calendar_index, weights=durations, minlength=len(calendar_names)) / 3600
+    per_calendar_counts = np.bincount(calendar_index, minlength=len(calendar_names))
+    overlapping, peak = overlap_stats(starts, ends)
+
+    total_busy = float((busy_ends - busy_starts).sum()) / 3600
+    busiest = np.unravel_index(int(heatmap.argmax()), heatmap.shape) if heatmap.any() else None
+    return {
+        'first_day': first_day.isoformat(),
+        'days': days,
+        'event_count': int(len(starts)),
+        'all_day_count': all_day,
+        'busy_hours': round(total_busy, 2),
+        'hours_per_week': round(total_busy / (days / 7), 2),
+        'double_booked_hours': round(float(durations.sum()) / 3600 - total_busy, 2),
+        'average_meeting_minutes': round(float(durations.mean()) / 60, 1) if len(durations) else 0,
+        'overlapping_events': overlapping,
+        'peak_concurrent': peak,
+        'busiest_slot': {'weekday': WEEKDAYS[busiest[0]], 'hour': int(busiest[1])} if busiest else None,
+        'weekly_hours': [round(float(hours), 2) for hours in weekly],
+        'heatmap': [[round(float(minutes), 1) for minutes in row] for row in heatmap],
+        'calendars': [
+            {'name': name, 'hours': round(float(hours), 2), 'events': int(count)}
+            for name, hours, count in zip(calendar_names, per_calendar_hours, per_calendar_counts)
+        ],
+    }
+
+
+def analytics_cache_key(user, calendars, range_name=DEFAULT_RANGE):
+    """(cache key, first day, days) for a range ending today."""
+    days = ANALYTICS_RANGES.get(range_name, ANALYTICS_RANGES[DEFAULT_RANGE])
+    first_day = timezone.localdate() - timedelta(days=days - 1)
+    versions = ','.join(
+        f"{calendar['id']}={calendar_version(user.pk, canonical_calendar_id(user.pk, calendar['id']))}"
+        for calendar in calendars
+    )
+    digest = hashlib.sha1(versions.encode()).hexdigest()
+    return f'gcs:a:{user.pk}:{first_day.isoformat()}:{days}:{digest}', first_day, days
+
+
+def peek_calendar_analytics(user, calendars, range_name=DEFAULT_RANGE):
+    """The cached analytics for these calendars and range, or None. Never calls Google."""
+    key, _, _ = analytics_cache_key(user, calendars, range_name)
+    return cache.get(key)
+
+
+def get_calendar_analytics(user, service, calendars, range_name=DEFAULT_RANGE):
+    """
+    Analytics for the `range_name` days up to today across the given calendars
+    (the caller picks which), cached until one of them changes.
+    """
+    key, first_day, days = analytics_cache_key(user, calendars, range_name)
+    last_day = first_day + timedelta(days=days - 1)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    tz = timezone.get_current_timezone()
+    time_min = timezone.make_aware(datetime.combine(first_day, time.min), tz).isoformat()
+    time_max = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz).isoformat()
+    # Trimmed per calendar, so only one calendar's full events are held at a time
+    events_by_calendar = [
+        [busy_view(event) for event in get_events_window(user, service, calendar['id'], time_min, time_max)]
+        for calendar in calendars
+    ]
+    result = compute_analytics(
+        events_by_calendar, [calendar.get('summary') or calendar['id'] for calendar in calendars], first_day, days,
+    )
+    cache.set(key, result, ANALYTICS_CACHE_TTL)
+    return result
+
+
+def analytics_calendars(calendars):
+    """Calendars that count toward a user's own load: the ones they can write to."""
+    return filter_writable_calendars(calendars)
+
+
+def heatmap_rows(result, levels=4):
+    """Heatmap as (weekday, [(minutes, level 0..levels)]) rows for templates."""
+    heatmap = np.asarray(result['heatmap'])
+    peak = heatmap.max() if heatmap.size else 0
+    scaled = np.ceil(heatmap / peak * levels).astype(int) if peak else np.zeros(heatmap.shape, dtype=int)
+    return [
+        (WEEKDAYS[day], list(zip(result['heatmap'][day], scaled[day].tolist())))
+        for day in range(len(WEEKDAYS))
+    ]
@@ -0,0 +1,500 @@
+"""
+Versioned cache for Google Calendar data.
+
+Every (user, calendar) pair has a version counter in the shared cache. Cached
+entries embed that version in their key, so bumping it makes every worker
+miss instead of serving stale data.
+
+After a successful create/update/delete the API response is applied directly
+to the cached entries (write-through) and they are re-stored under the bumped
+version, so the page after the redirect needs no upstream calls.
+
+Each loaded value is also kept, unversioned, as a last-good copy for
+CALENDAR_STALE_TTL. When Google fails (5xx/429, timeout or open circuit) the
+copy is served instead and the request is marked stale, which shows a banner
+via the stale_data context processor.
+
+Calendars a user can only read (accessRole reader or freeBusyReader, e.g.
+holiday and team calendars) look the same to every subscriber with that role.
+Their events are cached once, under a shared namespace ('shared-<role>') in
+place of the user ID, and served to every subscriber. A user gets the shared
+copy only while their own calendar list (fetched with their credentials)
+shows the calendar with that role. The first subscriber to miss fetches it
+with their own service, so Google still checks access. Per-user details
+(which attendee is `self`) are dropped from shared copies. Only the entries
+are shared: cache lookups, calendar health and live updates are still
+recorded for the user who read them. Writes through the
+app bump the shared versions along with the writer's own.
+"""
+import bisect
+import contextvars
+import time
+from datetime import datetime, timezone as dt_timezone
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from . import google_client, live
+from .metrics import health
+from .search import index_events, remove_events
+from .utils import (
+    fetch_calendar_events,
+    fetch_calendar_list,
+    fetch_events_window,
+    filter_writable_calendars,
+    parse_google_datetime,
+)
+
+
+# Version counters and the entry registry outlive the data they guard
+VERSION_TTL = 30 * 24 * 60 * 60
+# Most cached entries per calendar that write-through keeps up to date
+MAX_REGISTERED_ENTRIES = 32
+CALENDAR_LIST = '__calendar_list__'
+# Upstream statuses that trigger the last-good fallback
+UNAVAILABLE_STATUSES = (429, 500, 502, 503, 504)
+# Access roles whose event lists are identical for every subscriber
+SHARED_ROLES = ('reader', 'freeBusyReader')
+
+# Oldest fetch time of any last-good copy served during the current request
+_stale_since = contextvars.ContextVar('google_cal_sync_stale_since', default=None)
+
+
+def _version_key(user_id, calendar_id):
+    return f'gcs:v:{user_id}:{calendar_id}'
+
+
+def _now_version():
+    # Millisecond clock: a counter recreated after eviction still moves forward
+    return int(time.time() * 1000)
+
+
+def calendar_version(user_id, calendar_id):
+    """Current version of a user's calendar data."""
+    key = _version_key(user_id, calendar_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _now_version(), VERSION_TTL)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_calendar_version(user_id, calendar_id):
+    """
+    Invalidate every cached entry for a calendar, including shared copies
+    other subscribers read; returns the new version.
+    """
+    _bump_shared(user_id, calendar_id)
+    key = _version_key(user_id, calendar_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _now_version(), VERSION_TTL)
+        return cache.get(key, 0)
+
+
+def _shared_namespace(role):
+    return f'shared-{role}'
+
+
+def _bump_shared(user_id, calendar_id):
+    if calendar_id == 'primary':
+        calendar_id = cache.get(_primary_alias_key(user_id))
+        if calendar_id is None:
+            return
+    for role in SHARED_ROLES:
+        try:
+            cache.incr(_version_key(_shared_namespace(role), calendar_id))
+        except ValueError:
+            pass
+
+
+def _shared_roles_key(user_id):
+    return f'gcs:roles:{user_id}'
+
+
+def cache_namespace(user, calendar_id):
+    """
+    Whose entries hold a calendar's events for this user: their own ID, or a
+    shared namespace when their calendar list shows it with a shared role.
+    `calendar_id` must be canonical.
+    """
+    role = (cache.get(_shared_roles_key(user.pk)) or {}).get(calendar_id)
+    return _shared_namespace(role) if role in SHARED_ROLES else user.pk
+
+
+def _shareable(events):
+    """Copies of normalized events whose attendees don't say which one is the loading user."""
+    return [
+        {**event, 'raw': dict(event['raw'], attendees=[
+            {key: value for key, value in attendee.items() if key != 'self'} for attendee in event['raw']['attendees']
+        ])}
+        if (event.get('raw') or {}).get('attendees') else event
+        for event in events
+    ]
+
+
+def _shared_index_key(user_id, calendar_id, version, spec):
+    return f"gcs:xi:{user_id}:{calendar_id}:{version}:{':'.join(str(part) for part in spec)}"
+
+
+def _cached_events(user, calendar_id, spec, fetch):
+    """
+    _cached for an event list of `calendar_id` (canonical), in the user's own
+    or a shared namespace. Fresh loads are indexed for search; each user
+    indexes a shared entry the first time they read it.
+    """
+    namespace = cache_namespace(user, calendar_id)
+    if namespace == user.pk:
+        def load():
+            events = fetch()
+            index_events(user, calendar_id, events)
+            return events
+        return _cached(user.pk, calendar_id, spec, load)[0]
+
+    loaded = []
+
+    def load():
+        events = _shareable(fetch())
+        loaded.append(events)
+        return events
+
+    events, _ = _cached(user.pk, calendar_id, spec, load, namespace=namespace)
+    marker = _shared_index_key(user.pk, calendar_id, calendar_version(namespace, calendar_id), spec)
+    if loaded or cache.add(marker, 1, settings.CALENDAR_CACHE_TTL):
+        index_events(user, calendar_id, events)
+    return events
+
+
+def _primary_alias_key(user_id):
+    return f'gcs:primary:{user_id}'
+
+
+def canonical_calendar_id(user_id, calendar_id):
+    """
+    Map the primary calendar's real ID to 'primary' so both spellings share
+    one cache namespace (views link to the primary calendar either way).
+    """
+    calendar_id = calendar_id or 'primary'
+    if calendar_id != 'primary' and cache.get(_primary_alias_key(user_id)) == calendar_id:
+        return 'primary'
+    return calendar_id
+
+
+def _entry_key(user_id, calendar_id, version, spec):
+    return f"gcs:e:{user_id}:{calendar_id}:{version}:{':'.join(str(part) for part in spec)}"
+
+
+def _registry_key(user_id, calendar_id):
+    return f'gcs:r:{user_id}:{calendar_id}'
+
+
+def _register(user_id, calendar_id, spec):
+    key = _registry_key(user_id, calendar_id)
+    specs = cache.get(key) or []
+    if spec in specs:
+        return
+    specs = (specs + [spec])[-MAX_REGISTERED_ENTRIES:]
+    cache.set(key, specs, VERSION_TTL)
+
+
+def _stale_key(user_id, calendar_id, spec):
+    return f"gcs:s:{user_id}:{calendar_id}:{':'.join(str(part) for part in spec)}"
+
+
+def _store_last_good(user_id, calendar_id, spec, value):
+    cache.set(_stale_key(user_id, calendar_id, spec), (value, time.time()), settings.CALENDAR_STALE_TTL)
+
+
+def _health_key(user_id, calendar_id):
+    return f'gcs:h:{user_id}:{calendar_id}'
+
+
+def _record_health(user_id, calendar_id, **fields):
+    key = _health_key(user_id, calendar_id)
+    entry = cache.get(key) or {}
+    entry.update(fields)
+    cache.set(key, entry, VERSION_TTL)
+
+
+def calendar_health(user, calendar_ids):
+    """
+    {calendar_id: {'refreshed_at', 'failed_at', 'error'}} (epoch seconds) for
+    calendars the user loaded from Google at least once; shared by every worker.
+    """
+    keys = {
+        calendar_id: _health_key(user.pk, canonical_calendar_id(user.pk, calendar_id)) for calendar_id in calendar_ids
+    }
+    entries = cache.get_many(set(keys.values()))
+    return {calendar_id: entries[key] for calendar_id, key in keys.items() if key in entries}
+
+
+def _cached(user_id, calendar_id, spec, loader, namespace=None):
+    """
+    Read-through helper shared by every cached Calendar read.
+    Falls back to the last-good copy when Google is unavailable. Entries are
+    kept under `namespace` (default: the user's own); lookups, health and
+    live updates are always recorded for the requesting user.
+    """
+    namespace = user_id if namespace is None else namespace
+    key = _entry_key(namespace, calendar_id, calendar_version(namespace, calendar_id), spec)
+    value = cache.get(key)
+    health.record_lookup(value is not None, user_id)
+    if value is not None:
+        return value, True
+
+    try:
+        value = loader()
+    except google_client.HttpError as error:
+        _record_health(user_id, calendar_id, failed_at=time.time(), error=f"{error.resp.status} {error.reason}")
+        last_good = cache.get(_stale_key(namespace, calendar_id, spec))
+        if last_good is None or error.resp.status not in UNAVAILABLE_STATUSES:
+            raise
+        value, fetched_at = last_good
+        _mark_stale(fetched_at)
+        return value, True
+
+    cache.set(key, value, settings.CALENDAR_CACHE_TTL)
+    if spec[0] == 'upcoming' and live.is_listening(user_id):
+        last_good = cache.get(_stale_key(namespace, calendar_id, spec))
+        if last_good is not None:
+            live.publish(user_id, calendar_id, _refresh_changes(last_good[0], value, spec[1]))
+    _store_last_good(namespace, calendar_id, spec, value)
+    _register(namespace, calendar_id, spec)
+    _record_health(user_id, calendar_id, refreshed_at=time.time())
+    return value, False
+
+
+def _mark_stale(fetched_at):
+    current = _stale_since.get()
+    fetched = datetime.fromtimestamp(fetched_at, tz=dt_timezone.utc)
+    if current is None or fetched < current:
+        _stale_since.set(fetched)
+
+
+def stale_since():
+    """When the oldest fallback copy served in this request was fetched, or None."""
+    return _stale_since.get()
+
+
+class StaleDataMiddleware:
+    """Scopes the stale-data marker to a single request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _stale_since.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _stale_since.reset(token)
+
+    async def __acall__(self, request):
+        token = _stale_since.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _stale_since.reset(token)
+
+
+def stale_data(request):
+    """Context processor: `stale_since` for the banner in base.html."""
+    return {'stale_since': _stale_since.get()}
+
+
+def get_calendar_list(user, service):
+    """
+    The user's calendar list, cached. Also records the primary calendar alias
+    and which calendars the user reads through a shared namespace.
+    """
+    def load():
+        calendars = fetch_calendar_list(service)
+        # Lives no longer than the list it was taken from
+        cache.set(_shared_roles_key(user.pk), {
+            calendar['id']: calendar['accessRole'] for calendar in calendars
+            if calendar.get('accessRole') in SHARED_ROLES
+        }, settings.CALENDAR_CACHE_TTL)
+        return calendars
+
+    calendars, _ = _cached(user.pk, CALENDAR_LIST, ('list',), load)
+    primary = next((cal for cal in calendars if cal.get('primary')), None)
+    if primary:
+        cache.set(_primary_alias_key(user.pk), primary.get('id'), VERSION_TTL)
+    return calendars
+
+
+def get_writable_calendar_list(user, service):
+    """Cached calendars where the user has owner or writer access."""
+    return filter_writable_calendars(get_calendar_list(user, service))
+
+
+def get_upcoming_events(user, service, calendar_id, max_results):
+    """Next `max_results` events of a calendar, cached and indexed for search."""
+    calendar_id = canonical_calendar_id(user.pk, calendar_id)
+    events = _cached_events(
+        user, calendar_id, ('upcoming', max_results),
+        lambda: fetch_calendar_events(service, calendar_id=calendar_id, max_results=max_results),
+    )
+    return still_upcoming(events)
+
+
+def still_upcoming(events):
+    """Drop events that finished since the entry was cached."""
+    now = timezone.now()
+    return [event for event in events if (_end_key(event) or now) >= now]
+
+
+def get_events_window(user, service, calendar_id, time_min, time_max):
+    """
+    Normalized events for a time window, served from cache when possible.
+    Freshly fetched windows are indexed for search.
+    """
+    calendar_id = canonical_calendar_id(user.pk, calendar_id)
+    return _cached_events(
+        user, calendar_id, ('window', time_min, time_max),
+        lambda: fetch_events_window(service, calendar_id, time_min, time_max),
+    )
+
+
+def peek_cached(user, calendar_id, spec):
+    """The current cached entry for a spec, or None. Never calls Google."""
+    if calendar_id == CALENDAR_LIST:
+        return cache.get(_entry_key(user.pk, calendar_id, calendar_version(user.pk, calendar_id), spec))
+    calendar_id = canonical_calendar_id(user.pk, calendar_id)
+    namespace = cache_namespace(user, calendar_id)
+    return cache.get(_entry_key(namespace, calendar_id, calendar_version(namespace, calendar_id), spec))
+
+
+def find_cached_event(user, calendar_id, event_id):
+    """
+    Look an event up in the calendar's cached lists without calling Google.
+    Returns the normalized event, or None if no current entry holds it.
+    """
+    calendar_id = canonical_calendar_id(user.pk, calendar_id)
+    version = calendar_version(user.pk, calendar_id)
+    specs = cache.get(_registry_key(user.pk, calendar_id)) or []
+    entries = cache.get_many([_entry_key(user.pk, calendar_id, version, spec) for spec in specs])
+    for events in entries.values():
+        for event in events:
+            if event.get('id') == event_id:
+                return event
+    return None
+
+
+def _time_key(value):
+    value = value or {}
+    return parse_google_datetime(value.get('dateTime') or value.get('date'))
+
+
+def _start_key(event):
+    return _time_key((event.get('raw') or {}).get('start'))
+
+
+def _end_key(event):
+    return _time_key((event.get('raw') or {}).get('end')) or _start_key(event)
+
+
+def _belongs_in(event, spec):
+    """Whether `event` is listed by an entry of `spec`, going by its status and times."""
+    if event is None or event.get('status') == 'cancelled':
+        return False
+    start, end = _start_key(event), _end_key(event)
+    if start is None:
+        return False
+    if spec[0] == 'upcoming':
+        return end >= timezone.now()
+    if spec[0] == 'window':
+        return end > parse_google_datetime(spec[1]) and start < parse_google_datetime(spec[2])
+    return True
+
+
+def _apply_to_entry(events, spec, event_id, event):
+    """
+    Return a new event list with `event_id` removed and `event` (if any)
+    placed in order, or None when only Google knows the new list and the
+    entry has to be dropped.
+    """
+    # A full list says nothing about events after its last item
+    was_full = spec[0] == 'upcoming' and bool(events) and len(events) >= spec[1]
+    last_start = _start_key(events[-1]) if was_full else None
+    remaining = [existing for existing in events if existing.get('id') != event_id]
+    removed = len(remaining) < len(events)
+
+    start = _start_key(event) if _belongs_in(event, spec) else None
+    if start is None or (was_full and (last_start is None or start > last_start)):
+        # Taking an event out of a full list frees a slot for one it never held
+        return None if was_full and removed else remaining
+
+    keys = [_start_key(existing) or start for existing in remaining]
+    remaining.insert(bisect.bisect_right(keys, start), event)
+    if spec[0] == 'upcoming':
+        remaining = remaining[:spec[1]]
+    return remaining
+
+
+def _refresh_changes(old, new, max_results):
+    """
+    (event_id, event or None) changes between two loads of an upcoming list.
+    An event missing from a full new list that would sort after its last item
+    may just have been pushed out, so it is not reported as removed.
+    """
+    old_by_id = {event.get('id'): event for event in old}
+    changes = [
+        (event.get('id'), event) for event in new
+        if event.get('etag') != (old_by_id.get(event.get('id')) or {}).get('etag')
+    ]
+    new_ids = {event.get('id') for event in new}
+    last_start = _start_key(new[-1]) if new and len(new) >= max_results else None
+    for event_id, event in old_by_id.items():
+        if event_id in new_ids:
+            continue
+        start = _start_key(event)
+        if last_start is None or (start is not None and start <= last_start):
+            changes.append((event_id, None))
+    return changes
+
+
+def apply_event_change(user, calendar_id, event_id, event=None):
+    """
+    Write-through after a successful write: apply the API's event resource
+    (or a deletion when `event` is None) to every cached entry of the calendar,
+    bump the version so other workers drop their copies, and store the updated
+    entries under the new version. A full upcoming list that loses an event
+    is refetched instead. Also keeps the search index in step and
+    tells open pages (live.publish).
+    """
+    calendar_id = canonical_calendar_id(user.pk, calendar_id)
+    old_version = calendar_version(user.pk, calendar_id)
+    specs = cache.get(_registry_key(user.pk, calendar_id)) or []
+    entries = {}
+    for spec in specs:
+        events = cache.get(_entry_key(user.pk, calendar_id, old_version, spec))
+        if events is not None:
+            events = _apply_to_entry(events, spec, event_id, event)
+        if events is not None:
+            entries[spec] = events
+
+    new_version = bump_calendar_version(user.pk, calendar_id)
+    cache.set_many(
+        {_entry_key(user.pk, calendar_id, new_version, spec): events for spec, events in entries.items()},
+        settings.CALENDAR_CACHE_TTL,
+    )
+    fetched_at = time.time()
+    cache.set_many(
+        {_stale_key(user.pk, calendar_id, spec): (events, fetched_at) for spec, events in entries.items()},
+        settings.CALENDAR_STALE_TTL,
+    )
+
+    if event is None:
+        remove_events(user, calendar_id, [event_id])
+    else:
+        index_events(user, calendar_id, [event])
+    live.publish(user.pk, calendar_id, [(event_id, event)])
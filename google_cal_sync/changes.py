@@ -0,0 +1,257 @@
+"""
+Change feed for downstream services: what was created, updated or deleted
+on a user's calendars since their last poll.
+
+Every response carries an opaque cursor; the next poll passes it back and
+gets only newer changes. Deletions come as tombstones (`deleted: true`, no
+event). Changes are recorded in the EventChange log when a poll reads them
+from Google, and the cursor is a signed position in that log, so any number
+of clients can poll the same user with their own cursors.
+
+Per calendar, a CalendarSyncState holds Google's sync token. With a token,
+Google is asked only for what changed since it. Without one (first read of
+a calendar, or after Google expired the token) changes are read with
+`updatedMin` and `showDeleted` from the cursor's issue time, and a new token
+is taken for the next read.
+
+A poll leaves Google alone while every calendar's cache version is the one
+it was read at (writes through this app bump it) and it was read less than
+CHANGE_FEED_CHECK_SECONDS ago; an unchanged poll then only reads the
+database and the cache. Only the worker holding a cache lease on the user
+reads their calendars; a poll that finds the lease taken doesn't wait, it
+returns what is logged, and the next poll sees what the other worker found.
+Google is read outside any transaction. What is found for a calendar is
+logged, and its sync state advanced, in a short transaction that holds the
+user's row lock (select_for_update), so a user's log ids commit in order and
+a cursor never skips an id that commits later.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from . import google_client
+from .caching import (
+    CALENDAR_LIST,
+    bump_calendar_version,
+    calendar_version,
+    canonical_calendar_id,
+    get_calendar_list,
+    peek_cached,
+)
+from .models import CalendarSyncState, EventChange
+from .utils import get_calendar_service, iter_response_items
+
+
+logger = logging.getLogger(__name__)
+
+CURSOR_SALT = 'google_cal_sync.changes'
+# Changes returned per poll; `has_more` asks the client to poll again at once
+PAGE_SIZE = 500
+# updatedMin reaches back this far, for clock skew between us and Google
+UPDATED_MIN_OVERLAP = timedelta(minutes=1)
+# Longer than reading every calendar of a user should take
+READ_LEASE_SECONDS = 120
+
+
+class CursorError(Exception):
+    """A cursor that wasn't issued for this user, or can't be read."""
+
+
+class CursorExpired(CursorError):
+    """A cursor older than the change log; the client has to start over."""
+
+
+class ChangeFeedUnavailable(Exception):
+    """The user's Google account can't be used right now."""
+
+
+def make_cursor(user_id, seq, issued_at):
+    return signing.dumps({'u': user_id, 's': seq, 't': int(issued_at.timestamp())}, salt=CURSOR_SALT, compress=True)
+
+
+def read_cursor(user, cursor):
+    """(log position, issue time) of a cursor issued for `user`."""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        seq, issued_at = int(data['s']), datetime.fromtimestamp(data['t'], dt_timezone.utc)
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise CursorError("Invalid cursor")
+    if data.get('u') != user.pk:
+        raise CursorError("Invalid cursor")
+    if issued_at < timezone.now() - timedelta(days=settings.CHANGE_FEED_RETENTION_DAYS):
+        raise CursorExpired("Cursor has expired; poll without a cursor to start over")
+    return seq, issued_at
+
+
+def _list(service, params):
+    """(items, next sync token) for an events.list query, across pages."""
+    items = []
+    page_token = None
+    while True:
+        page = {}
+        items.extend(iter_response_items(service.events().list(pageToken=page_token, **params), page))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return items, page.get('nextSyncToken', '')
+
+
+def _sync_token(service, calendar_id):
+    # Google won't give a sync token with updatedMin, only for a plain listing
+    _, token = _list(service, {'calendarId': calendar_id, 'maxResults': 2500, 'fields': 'nextPageToken,nextSyncToken'})
+    return token
+
+
+def read_changes(service, calendar_id, sync_token, since):
+    """
+    (changed events, next sync token) since `sync_token`, or else since
+    `since` via updatedMin; with neither, no changes and just a token.
+    """
+    if sync_token:
+        try:
+            return _list(service, {'calendarId': calendar_id, 'syncToken': sync_token, 'maxResults': 2500})
+        except google_client.HttpError as error:
+            if error.resp.status != 410:
+                raise
+    token = _sync_token(service, calendar_id)
+    if since is None:
+        return [], token
+    items, _ = _list(service, {
+        'calendarId': calendar_id, 'maxResults': 2500, 'showDeleted': True,
+        'updatedMin': (since - UPDATED_MIN_OVERLAP).isoformat(),
+    })
+    return items, token
+
+
+def _calendar_ids(user, states, subscribing):
+    # The cached calendar list adds calendars the feed hasn't read yet, without a Google call
+    calendars = peek_cached(user, CALENDAR_LIST, ('list',))
+    if calendars is None and subscribing and not states:
+        service = get_calendar_service(user)
+        if service is None:
+            raise ChangeFeedUnavailable("Please connect your Google account first.")
+        calendars = get_calendar_list(user, service)
+    ids = set(states)
+    for calendar in calendars or ():
+        if not calendar.get('hidden'):
+            ids.add(canonical_calendar_id(user.pk, calendar['id']))
+    return ids
+
+
+def _is_due(state, version, now):
+    return (
+        state is None or state.version != version
+        or now - state.checked_at >= timedelta(seconds=settings.CHANGE_FEED_CHECK_SECONDS)
+    )
+
+
+def _due(user, states, subscribing, now):
+    return [
+        calendar_id for calendar_id in sorted(_calendar_ids(user, states, subscribing))
+        if _is_due(states.get(calendar_id), calendar_version(user.pk, calendar_id), now)
+    ]
+
+
+def _lease_key(user_id):
+    return f'gcs:changes:l:{user_id}'
+
+
+def _record(user, calendar_id, state, items, sync_token, now):
+    """
+    Log one calendar's changes and advance its sync state, holding the user's
+    row lock. Dropped if the state moved on since it was read (a worker whose
+    lease had expired got there first).
+    """
+    with transaction.atomic():
+        User.objects.select_for_update().only('pk').get(pk=user.pk)
+        checked_at = (
+            CalendarSyncState.objects.filter(user=user, calendar_id=calendar_id)
+            .values_list('checked_at', flat=True).first()
+        )
+        if checked_at != (state.checked_at if state else None):
+            return
+        EventChange.objects.bulk_create([
+            EventChange(
+                user=user, calendar_id=calendar_id, event_id=item['id'],
+                deleted=item.get('status') == 'cancelled',
+                event=None if item.get('status') == 'cancelled' else item,
+            )
+            for item in items
+        ])
+        # Changes made outside this app make the cached copies stale too
+        version = bump_calendar_version(user.pk, calendar_id) if items else calendar_version(user.pk, calendar_id)
+        CalendarSyncState.objects.update_or_create(
+            user=user, calendar_id=calendar_id,
+            defaults={'sync_token': sync_token, 'checked_at': now, 'version': version},
+        )
+
+
+def _refresh(user, subscribing, since, now):
+    """
+    Read changes of the due calendars from Google and log them. Skipped
+    while another worker holds the user's lease.
+    """
+    lease = _lease_key(user.pk)
+    if not cache.add(lease, 1, READ_LEASE_SECONDS):
+        return
+    try:
+        # The worker that held the lease may have just read them
+        states = {state.calendar_id: state for state in CalendarSyncState.objects.filter(user=user)}
+        due = _due(user, states, subscribing, now)
+        if not due:
+            return
+        service = get_calendar_service(user)
+        if service is None:
+            raise ChangeFeedUnavailable("Please connect your Google account first.")
+        for calendar_id in due:
+            state = states.get(calendar_id)
+            try:
+                items, sync_token = read_changes(
+                    service, calendar_id, state.sync_token if state else '', state.checked_at if state else since,
+                )
+            except google_client.HttpError as error:
+                # Left due; read again on the next poll
+                logger.warning("Change feed read of %s for user %s failed: %s", calendar_id, user.pk, error)
+                continue
+            _record(user, calendar_id, state, items, sync_token, now)
+        EventChange.objects.filter(
+            user=user, recorded_at__lt=now - timedelta(days=settings.CHANGE_FEED_RETENTION_DAYS),
+        ).delete()
+    finally:
+        cache.delete(lease)
+
+
+def poll(user, cursor=None):
+    """
+    {'changes', 'cursor', 'has_more'} since `cursor`. Without a cursor the
+    feed starts now: no changes, only a cursor to poll with.
+    """
+    now = timezone.now()
+    if cursor:
+        seq, since = read_cursor(user, cursor)
+    else:
+        last = EventChange.objects.filter(user=user).order_by('-pk').values_list('pk', flat=True).first()
+        seq, since = last or 0, None
+
+    states = {state.calendar_id: state for state in CalendarSyncState.objects.filter(user=user)}
+    if _due(user, states, cursor is None, now):
+        _refresh(user, cursor is None, since, now)
+
+    rows = list(EventChange.objects.filter(user=user, pk__gt=seq).order_by('pk')[:PAGE_SIZE + 1])
+    has_more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    latest = {}
+    for row in rows:
+        # Only the latest change of an event matters to the client
+        latest.pop((row.calendar_id, row.event_id), None)
+        latest[(row.calendar_id, row.event_id)] = {
+            'calendar_id': row.calendar_id, 'event_id': row.event_id, 'deleted': row.deleted, 'event': row.event,
+        }
+    return {
+        'changes': list(latest.values()),
+        'cursor': make_cursor(user.pk, rows[-1].pk if rows else seq, now),
+        'has_more': has_more,
+    }
@@ -0,0 +1,127 @@
+"""
+Per-endpoint circuit breakers for Google API calls.
+
+Calls are grouped into endpoint classes (calendar list, event reads, event
+writes, batch, freebusy, oauth), each with its own breaker. Failures are
+transport errors, timeouts and 5xx responses. Rate-limit responses (429, or
+403 rateLimitExceeded / userRateLimitExceeded) are not: they are per user,
+and one user over quota must not cut everyone else off. After
+GOOGLE_CIRCUIT_FAILURE_THRESHOLD consecutive failures the breaker opens: calls
+fail immediately for GOOGLE_CIRCUIT_RESET_SECONDS. After that a single probe
+call is let through (half-open). Its success closes the breaker; its failure
+opens it again.
+
+State is per process; each worker learns about an outage on its own, which
+costs at most `threshold` slow calls per worker.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with half-open probing."""
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.counters = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def allow(self):
+        """Whether a call may go upstream now."""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self.probe_in_flight):
+                if self.state == HALF_OPEN:
+                    self.probe_in_flight = True
+                self.counters['calls'] += 1
+                return True
+            self.counters['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.counters['failures'] += 1
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters['opened'] += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self.lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return dict(
+                self.counters,
+                name=self.name,
+                state=self.state,
+                consecutive_failures=self.consecutive_failures,
+                retry_in=retry_in,
+            )
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The process-wide breaker for an endpoint class."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=settings.GOOGLE_CIRCUIT_FAILURE_THRESHOLD,
+                    reset_timeout=settings.GOOGLE_CIRCUIT_RESET_SECONDS,
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def endpoint_class(method, uri):
+    """Group a Google API request for circuit breaking."""
+    path = urlsplit(uri).path
+    if path.startswith('/batch/'):
+        return 'batch'
+    if path.endswith('/token'):
+        return 'oauth'
+    if '/calendarList' in path:
+        return 'calendar_list'
+    if path.endswith('/freeBusy'):
+        return 'freebusy'
+    if '/events' in path:
+        return 'events_read' if method == 'GET' else 'events_write'
+    return 'other'
+
+
+def breaker_metrics():
+    """Snapshots of every breaker created so far, by name."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
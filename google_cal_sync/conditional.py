@@ -0,0 +1,124 @@
+"""
+Conditional GET (ETag / Last-Modified, 304) for per-user HTML pages.
+
+Each page has a validator function. It builds the page's ETag from data that
+is already in the cache (entry contents, calendar versions, token state) and
+never calls Google or renders templates. A matching If-None-Match or
+If-Modified-Since gets a 304 before the view runs.
+
+The ETag also covers the user, the full path, the CSRF cookie (its token is
+embedded in forms) and a digest of the app's templates and static files, so
+a deploy that changes the markup invalidates old copies.
+
+No validators are sent when:
+  * the validator can't be built from cache (cold cache: the page renders
+    normally and the next request can be answered with a 304);
+  * flash messages are pending (they show once and must not be replayed);
+  * the page was rendered from last-good data while Google was failing.
+
+Responses are `Cache-Control: private, no-cache` with `Vary: Cookie`. The
+browser keeps its copy but revalidates it on every navigation, and shared
+caches never store a user's page.
+"""
+import functools
+import hashlib
+import os
+import time
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .caching import stale_since
+
+
+# How long the first-seen time of an ETag is remembered for Last-Modified
+LAST_MODIFIED_TTL = 7 * 24 * 60 * 60
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_markup_digest = None
+
+
+def markup_digest():
+    """Digest of this app's templates and static files, computed once per process."""
+    global _markup_digest
+    if _markup_digest is None:
+        digest = hashlib.sha1()
+        for folder in ('templates', 'static'):
+            for root, dirs, files in os.walk(os.path.join(APP_DIR, folder)):
+                dirs.sort()
+                for name in sorted(files):
+                    with open(os.path.join(root, name), 'rb') as handle:
+                        digest.update(name.encode())
+                        digest.update(handle.read())
+        _markup_digest = digest.hexdigest()
+    return _markup_digest
+
+
+def content_tag(items):
+    """Short tag for a cached list of events or calendars (IDs and Google etags)."""
+    digest = hashlib.sha1()
+    for item in items:
+        raw = item.get('raw') or item
+        digest.update(f"{item.get('id')}:{item.get('etag') or raw.get('etag') or raw.get('updated')};".encode())
+    return digest.hexdigest()
+
+
+def page_etag(request, parts):
+    """ETag for the request's page given the validator's parts."""
+    digest = hashlib.sha1()
+    for part in (
+        request.user.pk,
+        request.get_full_path(),
+        # The CSRF secret as the next request will carry it, even if this render just created it
+        request.META.get('CSRF_COOKIE', ''),
+        markup_digest(),
+        *parts,
+    ):
+        digest.update(f'{part}\x1f'.encode())
+    return quote_etag(digest.hexdigest())
+
+
+def _first_seen(etag):
+    key = f'gcs:lm:{etag}'
+    cache.add(key, int(time.time()), LAST_MODIFIED_TTL)
+    return cache.get(key)
+
+
+def _private(response):
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(validator):
+    """
+    Decorate a GET view with a validator(request) that returns a list of parts
+    built from cached data, or None when it can't tell without rendering.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            # len() loads pending messages without marking them shown
+            if len(get_messages(request)):
+                return _private(view(request, *args, **kwargs))
+
+            parts = validator(request)
+            if parts is not None:
+                etag = page_etag(request, parts)
+                not_modified = get_conditional_response(request, etag=etag, last_modified=_first_seen(etag))
+                if not_modified is not None:
+                    return _private(not_modified)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and stale_since() is None and not response.has_header('ETag'):
+                # The view just filled the cache, so this usually succeeds even after a miss
+                parts = validator(request)
+                if parts is not None:
+                    etag = page_etag(request, parts)
+                    response['ETag'] = etag
+                    response['Last-Modified'] = http_date(_first_seen(etag))
+            return _private(response)
+        return wrapper
+    return decorator
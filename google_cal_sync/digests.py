@@ -0,0 +1,238 @@
+"""
+Daily agenda digests for every connected user.
+
+`manage.py send_digests` works through users in batches of `batch_size`:
+
+  1. fetch: each user's agenda for the day is read through the cached
+     readers (get_calendar_list, get_events_window) in a bounded thread pool.
+     Read-only calendars many users share come from the shared cache;
+  2. render: the agendas, plain data by now, go to a process pool. Each
+     process compiles the digest templates once and reuses them for every
+     digest it renders. Rendering batch N overlaps fetching batch N+1;
+  3. send: the batch goes to Django's email backend over one connection
+     with send_messages(), and its outcomes are stored with one upsert.
+
+Outcomes are DigestDelivery rows. Users whose digest for the day was sent,
+or who had nothing scheduled, are skipped, so a rerun resumes an interrupted
+run and retries the failures. If a run dies between handing a batch to the
+backend and recording it, that batch can be sent twice.
+"""
+import logging
+import multiprocessing
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection
+from django.template.loader import get_template
+from django.utils import timezone
+from . import google_client
+from .caching import get_calendar_list, get_events_window
+from .grid import window_time_range
+from .models import DigestDelivery
+from .utils import get_calendar_service, parse_google_datetime
+
+
+logger = logging.getLogger(__name__)
+
+DONE_STATUSES = (DigestDelivery.STATUS_SENT, DigestDelivery.STATUS_EMPTY)
+TEMPLATES = {'text': 'google_cal_sync/email/digest.txt', 'html': 'google_cal_sync/email/digest.html'}
+
+
+class DigestError(Exception):
+    """A user's agenda can't be read."""
+
+
+def users_due(day):
+    """Users with a usable Google connection and an email address whose digest for `day` isn't done."""
+    done = DigestDelivery.objects.filter(day=day, status__in=DONE_STATUSES).values('user_id')
+    return (
+        User.objects.filter(google_token__needs_reauth=False, is_active=True)
+        .exclude(email='')
+        .exclude(pk__in=done)
+        .order_by('pk')
+    )
+
+
+def _agenda_item(event, calendar):
+    """The digest line for an event, or None when its start can't be read."""
+    raw = event.get('raw') or {}
+    start, end = raw.get('start') or {}, raw.get('end') or {}
+    if start.get('date'):
+        when = 'All day'
+    else:
+        begins = parse_google_datetime(start.get('dateTime'))
+        if begins is None:
+            logger.warning("Digest skips event %s: unreadable start %r", event.get('id'), start)
+            return None
+        begins = timezone.localtime(begins)
+        ends = parse_google_datetime(end.get('dateTime'))
+        when = f"{begins:%H:%M}–{timezone.localtime(ends):%H:%M}" if ends else f"{begins:%H:%M}"
+    return {
+        'sort': '' if start.get('date') else start.get('dateTime', ''),
+        'when': when,
+        'summary': event.get('summary') or 'Untitled event',
+        'location': event.get('location') or '',
+        'calendar': calendar.get('summary') or calendar['id'],
+    }
+
+
+def fetch_agenda(user, day):
+    """The user's events on `day` across their visible calendars, as plain data."""
+    try:
+        service = get_calendar_service(user)
+        if service is None:
+            raise DigestError("Google account needs to be reconnected")
+        time_min, time_max = window_time_range(day, day + timedelta(days=1))
+        items = []
+        for calendar in get_calendar_list(user, service):
+            if calendar.get('hidden'):
+                continue
+            for event in get_events_window(user, service, calendar['id'], time_min, time_max):
+                item = _agenda_item(event, calendar) if event.get('status') != 'cancelled' else None
+                if item is not None:
+                    items.append(item)
+    finally:
+        # Runs on a fetch pool thread, whose connection would otherwise stay open under CONN_MAX_AGE
+        db_connection.close()
+    items.sort(key=lambda item: item['sort'])
+    return {
+        'user_id': user.pk,
+        'email': user.email,
+        'name': user.get_full_name() or user.username,
+        'day': day,
+        'events': items,
+    }
+
+
+_compiled = {}
+
+
+def _template(kind):
+    # Compiled once per process, then reused for every digest it renders
+    if kind not in _compiled:
+        _compiled[kind] = get_template(TEMPLATES[kind])
+    return _compiled[kind]
+
+
+def render_digests(agendas, site_url=''):
+    """[(subject, text body, html body)] for agendas; runs in a render process."""
+    rendered = []
+    for agenda in agendas:
+        context = dict(agenda, site_url=site_url)
+        subject = f"Your agenda for {agenda['day']:%A, %B} {agenda['day'].day}: {len(agenda['events'])} events"
+        rendered.append((subject, _template('text').render(context), _template('html').render(context)))
+    return rendered
+
+
+class DigestRun:
+    """One pass over the users due for a day; see the module docstring."""
+
+    def __init__(self, day, fetch_workers=8, render_processes=2, batch_size=100, site_url='', on_batch=None):
+        self.day = day
+        self.fetch_workers = fetch_workers
+        self.render_processes = render_processes
+        self.batch_size = batch_size
+        self.site_url = site_url
+        self.on_batch = on_batch
+        self.stats = {
+            'users': 0, 'sent': 0, 'empty': 0, 'failed': 0,
+            'fetch_seconds': 0.0, 'render_seconds': 0.0, 'send_seconds': 0.0,
+        }
+
+    def _fetch(self, user):
+        try:
+            return fetch_agenda(user, self.day), None
+        except (DigestError, google_client.HttpError) as error:
+            return None, str(error)
+
+    def _fetch_batch(self, executor, users):
+        started = time.monotonic()
+        results = list(executor.map(self._fetch, users))
+        self.stats['fetch_seconds'] += time.monotonic() - started
+        rows = {}
+        agendas = []
+        for user, (agenda, error) in zip(users, results):
+            if error is not None:
+                rows[user.pk] = DigestDelivery(user_id=user.pk, day=self.day, status=DigestDelivery.STATUS_FAILED, error=error)
+            elif not agenda['events']:
+                rows[user.pk] = DigestDelivery(user_id=user.pk, day=self.day, status=DigestDelivery.STATUS_EMPTY)
+            else:
+                agendas.append(agenda)
+        return agendas, rows
+
+    def _send_batch(self, connection, agendas, rendered, rows):
+        started = time.monotonic()
+        messages = []
+        for agenda, (subject, text, html) in zip(agendas, rendered):
+            message = EmailMultiAlternatives(subject, text, to=[agenda['email']], connection=connection)
+            message.attach_alternative(html, 'text/html')
+            messages.append(message)
+        try:
+            connection.send_messages(messages)
+            error = ''
+        except Exception as failure:
+            error = f"Email backend error: {failure}"
+        status = DigestDelivery.STATUS_FAILED if error else DigestDelivery.STATUS_SENT
+        for agenda in agendas:
+            rows[agenda['user_id']] = DigestDelivery(
+                user_id=agenda['user_id'], day=self.day, status=status, events=len(agenda['events']), error=error,
+            )
+        self.stats['send_seconds'] += time.monotonic() - started
+        self._record(rows)
+
+    def _record(self, rows):
+        DigestDelivery.objects.bulk_create(
+            rows.values(), update_conflicts=True, unique_fields=['user', 'day'],
+            update_fields=['status', 'events', 'error', 'updated_at'],
+        )
+        for row in rows.values():
+            self.stats[row.status] += 1
+        self.stats['users'] += len(rows)
+        if self.on_batch:
+            self.on_batch(self.stats)
+
+    def _finish(self, pending, connection):
+        """Wait for a batch's rendering, then send it."""
+        started, future, agendas, rows = pending
+        rendered = future.result()
+        self.stats['render_seconds'] += time.monotonic() - started
+        self._send_batch(connection, agendas, rendered, rows)
+
+    def run(self):
+        fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix='digest-fetch')
+        render_pool = (
+            ProcessPoolExecutor(
+                max_workers=self.render_processes,
+                # Not forked: this process has the fetch threads running
+                mp_context=multiprocessing.get_context('spawn'),
+                # Set up before this module, which imports models, is unpickled
+                initializer=django.setup,
+            )
+            if self.render_processes > 0 else ThreadPoolExecutor(max_workers=1)
+        )
+        started = time.monotonic()
+        try:
+            with fetch_pool, render_pool, get_connection() as connection:
+                pending = None
+                last_pk = 0
+                while True:
+                    # Keyset pages; no cursor stays open while fetch threads write
+                    batch = list(users_due(self.day).filter(pk__gt=last_pk)[:self.batch_size])
+                    if not batch:
+                        break
+                    last_pk = batch[-1].pk
+                    agendas, rows = self._fetch_batch(fetch_pool, batch)
+                    if pending:
+                        self._finish(pending, connection)
+                    # Chunks across processes; this batch renders while the next one is fetched
+                    pending = (
+                        time.monotonic(), render_pool.submit(render_digests, agendas, self.site_url), agendas, rows,
+                    )
+                if pending:
+                    self._finish(pending, connection)
+        finally:
+            self.stats['seconds'] = time.monotonic() - started
+        return self.stats
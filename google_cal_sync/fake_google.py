@@ -0,0 +1,541 @@
+"""
+In-process fake of the Google Calendar v3 and OAuth token endpoints for load
+testing (run it with `manage.py fake_google`, then set GOOGLE_API_BASE_URL).
+
+Implements calendarList.list, events list/get/insert/import/patch/delete,
+syncToken and page tokens, per-event ETags with If-Match/If-None-Match,
+multipart batch requests and freebusy.query. Latency, server errors and quota
+errors can be injected. State is in memory and lost on exit.
+"""
+import copy
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+API_PREFIX = '/calendar/v3'
+BATCH_PATH = '/batch/calendar/v3'
+DEFAULT_ACCOUNT = 'default'
+
+
+class FakeApiError(Exception):
+    """An error rendered in the Google JSON error format."""
+
+    def __init__(self, status, message, reason='backendError'):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.reason = reason
+
+    def body(self):
+        return {
+            'error': {
+                'code': self.status,
+                'message': self.message,
+                'errors': [{'domain': 'global', 'reason': self.reason, 'message': self.message}],
+            }
+        }
+
+
+def _rfc3339(dt):
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    if len(value) == 10:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _event_bounds(event):
+    start = event.get('start') or {}
+    end = event.get('end') or {}
+    begin = _parse_time(start.get('dateTime') or start.get('date'))
+    finish = _parse_time(end.get('dateTime') or end.get('date')) or begin
+    return begin, finish
+
+
+def _etag(payload):
+    return '"%s"' % hashlib.md5(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class FakeCalendarStore:
+    """Thread-safe in-memory accounts, calendars and events."""
+
+    def __init__(self, seed_events=50, seed=None):
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.seed_events = seed_events
+        self.sequence = 0
+        self.accounts = {}
+        self.tokens = {}
+
+    # Accounts and tokens
+
+    def account(self, name):
+        """Return an account, creating it with seeded calendars on first use."""
+        if name not in self.accounts:
+            primary = f'{name}@fake.example.com'
+            calendars = {
+                primary: {'id': primary, 'summary': name, 'primary': True, 'accessRole': 'owner', 'timeZone': 'UTC'},
+                f'team-{name}@group.fake.example.com': {
+                    'id': f'team-{name}@group.fake.example.com', 'summary': 'Team', 'accessRole': 'writer', 'timeZone': 'UTC',
+                },
+                'en.usa#holiday@group.v.calendar.google.com': {
+                    'id': 'en.usa#holiday@group.v.calendar.google.com', 'summary': 'Holidays', 'accessRole': 'reader',
+                    'timeZone': 'UTC',
+                },
+            }
+            events = {calendar_id: {} for calendar_id in calendars}
+            account = {'calendars': calendars, 'events': events, 'primary': primary}
+            self.accounts[name] = account
+            now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            for calendar_id in calendars:
+                for index in range(self.seed_events):
+                    start = now + timedelta(hours=self.random.randint(-24 * 14, 24 * 60))
+                    self._store_event(account, calendar_id, {
+                        'summary': f'Seeded event {index}',
+                        'description': 'Generated by the fake Google server',
+                        'location': self.random.choice(['Room A', 'Room B', 'https://meet.example.com/x', '']),
+                        'start': {'dateTime': _rfc3339(start)},
+                        'end': {'dateTime': _rfc3339(start + timedelta(minutes=self.random.choice([30, 60, 90])))},
+                        'attendees': [{'email': f'user{n}@example.com'} for n in range(self.random.randint(0, 8))],
+                    })
+        return self.accounts[name]
+
+    def issue_token(self, account_name, refresh_token=None):
+        access_token = f'fake-at-{uuid.uuid4().hex}'
+        refresh_token = refresh_token or f'fake-rt-{account_name}'
+        with self.lock:
+            self.tokens[access_token] = account_name
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'expires_in': 3600,
+            'token_type': 'Bearer',
+            'scope': 'https://www.googleapis.com/auth/calendar',
+        }
+
+    def account_for_token(self, access_token):
+        return self.tokens.get(access_token, DEFAULT_ACCOUNT)
+
+    # Events
+
+    def _next_sequence(self):
+        self.sequence += 1
+        return self.sequence
+
+    def _store_event(self, account, calendar_id, body, event_id=None):
+        events = account['events'][calendar_id]
+        now = _rfc3339(datetime.now(timezone.utc))
+        event = events.get(event_id) or {
+            'kind': 'calendar#event',
+            'id': event_id or uuid.uuid4().hex,
+            'created': now,
+            'status': 'confirmed',
+            'htmlLink': 'https://calendar.google.com/calendar/event',
+        }
+        event.update(copy.deepcopy(body))
+        event.setdefault('iCalUID', f"{event['id']}@fake.example.com")
+        event['updated'] = now
+        event['_seq'] = self._next_sequence()
+        event.pop('etag', None)
+        event['etag'] = _etag({k: v for k, v in event.items() if k != '_seq'})
+        events[event['id']] = event
+        return event
+
+    @staticmethod
+    def public(event):
+        return {k: v for k, v in event.items() if not k.startswith('_')}
+
+    def calendar(self, account, calendar_id):
+        if calendar_id == 'primary':
+            calendar_id = account['primary']
+        if calendar_id not in account['calendars']:
+            raise FakeApiError(404, 'Not Found', 'notFound')
+        return calendar_id
+
+    def writable(self, account, calendar_id):
+        calendar_id = self.calendar(account, calendar_id)
+        if account['calendars'][calendar_id]['accessRole'] not in ('owner', 'writer'):
+            raise FakeApiError(403, 'You need to have writer access to this calendar.', 'requiredAccessLevel')
+        return calendar_id
+
+    def list_events(self, account, calendar_id, params):
+        calendar_id = self.calendar(account, calendar_id)
+        events = list(account['events'][calendar_id].values())
+        sync_token = params.get('syncToken')
+        show_deleted = params.get('showDeleted') == 'true' or bool(sync_token)
+
+        if sync_token:
+            try:
+                since = int(sync_token.rsplit('-', 1)[1])
+            except (IndexError, ValueError):
+                raise FakeApiError(410, 'Sync token is no longer valid, a full sync is required.', 'fullSyncRequired')
+            events = [event for event in events if event['_seq'] > since]
+        else:
+            time_min = _parse_time(params.get('timeMin'))
+            time_max = _parse_time(params.get('timeMax'))
+            updated_min = _parse_time(params.get('updatedMin'))
+            query = (params.get('q') or '').lower()
+            private = params.get('privateExtendedProperty')
+            selected = []
+            for event in events:
+                begin, finish = _event_bounds(event)
+                if time_min and finish and finish <= time_min:
+                    continue
+                if time_max and begin and begin >= time_max:
+                    continue
+                if updated_min and _parse_time(event['updated']) < updated_min:
+                    continue
+                if query and query not in json.dumps([event.get('summary'), event.get('description'),
+                                                       event.get('location')]).lower():
+                    continue
+                if private:
+                    key, _, value = private.partition('=')
+                    if (event.get('extendedProperties') or {}).get('private', {}).get(key) != value:
+                        continue
+                selected.append(event)
+            events = selected
+
+        if not show_deleted:
+            # Like Google, cancelled occurrences of recurring events are still listed
+            events = [
+                event for event in events
+                if event.get('status') != 'cancelled' or (event.get('recurringEventId') and params.get('singleEvents') != 'true')
+            ]
+        if params.get('orderBy') == 'startTime':
+            events.sort(key=lambda event: _event_bounds(event)[0] or datetime.min.replace(tzinfo=timezone.utc))
+        elif sync_token:
+            events.sort(key=lambda event: event['_seq'])
+
+        offset = int(params.get('pageToken') or 0)
+        page_size = min(int(params.get('maxResults') or 250), 2500)
+        page = events[offset:offset + page_size]
+        response = {
+            'kind': 'calendar#events',
+            'summary': account['calendars'][calendar_id]['summary'],
+            'timeZone': 'UTC',
+            'updated': _rfc3339(datetime.now(timezone.utc)),
+            'items': [self.public(event) for event in page],
+        }
+        if offset + page_size < len(events):
+            response['nextPageToken'] = str(offset + page_size)
+        elif not any(params.get(key) for key in ('timeMin', 'timeMax', 'updatedMin', 'q', 'privateExtendedProperty')):
+            response['nextSyncToken'] = f'sync-{self.sequence}'
+        response['etag'] = _etag([event['etag'] for event in page])
+        return response
+
+    def get_event(self, account, calendar_id, event_id):
+        calendar_id = self.calendar(account, calendar_id)
+        event = account['events'][calendar_id].get(event_id)
+        if not event:
+            raise FakeApiError(404, 'Not Found', 'notFound')
+        return event
+
+    def insert_event(self, account, calendar_id, body):
+        calendar_id = self.writable(account, calendar_id)
+        if not (body.get('start') and body.get('end')):
+            raise FakeApiError(400, 'Missing time range.', 'required')
+        return self._store_event(account, calendar_id, body)
+
+    def import_event(self, account, calendar_id, body):
+        calendar_id = self.writable(account, calendar_id)
+        uid = body.get('iCalUID')
+        if not uid:
+            raise FakeApiError(400, 'Missing iCalUID.', 'required')
+        existing = next((event for event in account['events'][calendar_id].values() if event.get('iCalUID') == uid), None)
+        return self._store_event(account, calendar_id, body, event_id=existing['id'] if existing else None)
+
+    def patch_event(self, account, calendar_id, event_id, body, if_match=None):
+        calendar_id = self.writable(account, calendar_id)
+        event = self.get_event(account, calendar_id, event_id)
+        if if_match and if_match != '*' and if_match != event['etag']:
+            raise FakeApiError(412, 'Precondition Failed', 'conditionNotMet')
+        return self._store_event(account, calendar_id, body, event_id=event_id)
+
+    def delete_event(self, account, calendar_id, event_id, if_match=None):
+        calendar_id = self.writable(account, calendar_id)
+        event = self.get_event(account, calendar_id, event_id)
+        if event.get('status') == 'cancelled':
+            raise FakeApiError(410, 'Resource has been deleted', 'deleted')
+        if if_match and if_match != '*' and if_match != event['etag']:
+            raise FakeApiError(412, 'Precondition Failed', 'conditionNotMet')
+        self._store_event(account, calendar_id, {'status': 'cancelled'}, event_id=event_id)
+
+    def calendar_list(self, account, params):
+        items = list(account['calendars'].values())
+        offset = int(params.get('pageToken') or 0)
+        page_size = min(int(params.get('maxResults') or 100), 250)
+        page = items[offset:offset + page_size]
+        response = {
+            'kind': 'calendar#calendarList',
+            'items': [dict(item, kind='calendar#calendarListEntry', etag=_etag(item)) for item in page],
+        }
+        if offset + page_size < len(items):
+            response['nextPageToken'] = str(offset + page_size)
+        else:
+            response['nextSyncToken'] = f'sync-{self.sequence}'
+        response['etag'] = _etag([item['etag'] for item in response['items']])
+        return response
+
+    def freebusy(self, account, body):
+        time_min, time_max = _parse_time(body.get('timeMin')), _parse_time(body.get('timeMax'))
+        calendars = {}
+        for item in body.get('items', []):
+            try:
+                calendar_id = self.calendar(account, item.get('id'))
+            except FakeApiError:
+                calendars[item.get('id')] = {'errors': [{'domain': 'global', 'reason': 'notFound'}], 'busy': []}
+                continue
+            busy = []
+            for event in account['events'][calendar_id].values():
+                begin, finish = _event_bounds(event)
+                if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+                    continue
+                if begin and finish and finish > time_min and begin < time_max:
+                    busy.append((max(begin, time_min), min(finish, time_max)))
+            busy.sort()
+            calendars[item.get('id')] = {'busy': [{'start': _rfc3339(b), 'end': _rfc3339(e)} for b, e in busy]}
+        return {'kind': 'calendar#freeBusy', 'timeMin': body.get('timeMin'), 'timeMax': body.get('timeMax'),
+                'calendars': calendars}
+
+
+class FaultInjector:
+    """Adds latency and random failures to every API call."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, quota_error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_error_rate = quota_error_rate
+        self.random = random.Random(seed)
+
+    def apply(self):
+        delay = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        roll = self.random.random()
+        if roll < self.quota_error_rate:
+            if self.random.random() < 0.5:
+                raise FakeApiError(429, 'Rate Limit Exceeded', 'rateLimitExceeded')
+            raise FakeApiError(403, 'Rate Limit Exceeded', 'rateLimitExceeded')
+        if roll < self.quota_error_rate + self.error_rate:
+            raise FakeApiError(503, 'The service is currently unavailable.', 'backendError')
+
+
+def dispatch(store, method, path, params, body, headers, account_name):
+    """
+    Route one API call; `headers` has lower-case names.
+    Returns (status, payload, extra_headers); raises FakeApiError on errors.
+    """
+    if not path.startswith(API_PREFIX + '/'):
+        raise FakeApiError(404, 'Not Found', 'notFound')
+    parts = [urllib.parse.unquote(part) for part in path[len(API_PREFIX) + 1:].split('/')]
+
+    with store.lock:
+        account = store.account(account_name)
+
+        if parts == ['users', 'me', 'calendarList'] and method == 'GET':
+            return 200, store.calendar_list(account, params), {}
+
+        if parts == ['freeBusy'] and method == 'POST':
+            return 200, store.freebusy(account, body or {}), {}
+
+        if len(parts) >= 3 and parts[0] == 'calendars' and parts[2] == 'events':
+            calendar_id = parts[1]
+            if len(parts) == 3:
+                if method == 'GET':
+                    return 200, store.list_events(account, calendar_id, params), {}
+                if method == 'POST':
+                    return 200, store.public(store.insert_event(account, calendar_id, body or {})), {}
+            elif parts[3] == 'import' and len(parts) == 4 and method == 'POST':
+                return 200, store.public(store.import_event(account, calendar_id, body or {})), {}
+            elif len(parts) == 4:
+                event_id = parts[3]
+                if_match = headers.get('if-match')
+                if method == 'GET':
+                    event = store.get_event(account, calendar_id, event_id)
+                    if headers.get('if-none-match') == event['etag']:
+                        return 304, None, {'ETag': event['etag']}
+                    return 200, store.public(event), {'ETag': event['etag']}
+                if method in ('PATCH', 'PUT'):
+                    event = store.patch_event(account, calendar_id, event_id, body or {}, if_match)
+                    return 200, store.public(event), {'ETag': event['etag']}
+                if method == 'DELETE':
+                    store.delete_event(account, calendar_id, event_id, if_match)
+                    return 204, None, {}
+
+    raise FakeApiError(404, f'No fake handler for {method} {path}', 'notFound')
+
+
+class FakeGoogleHandler(BaseHTTPRequestHandler):
+    """HTTP front-end; configured through attributes set on the server."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # Helpers
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, payload=None, headers=None, content_type='application/json; charset=UTF-8'):
+        body = b'' if payload is None else (payload if isinstance(payload, bytes) else json.dumps(payload).encode())
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if status not in (204, 304):
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status not in (204, 304):
+            self.wfile.write(body)
+
+    def _account(self):
+        auth = self.headers.get('Authorization', '')
+        if not auth.startswith('Bearer '):
+            raise FakeApiError(401, 'Login Required.', 'required')
+        return self.server.store.account_for_token(auth[len('Bearer '):])
+
+    def _api_call(self, method, raw_path, body_bytes, headers, account_name):
+        parsed = urllib.parse.urlsplit(raw_path)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        body = json.loads(body_bytes) if body_bytes and body_bytes.strip() else None
+        self.server.faults.apply()
+        return dispatch(self.server.store, method, parsed.path, params, body, headers, account_name)
+
+    # OAuth
+
+    def _oauth_authorize(self, params):
+        redirect_uri = params.get('redirect_uri', '')
+        query = urllib.parse.urlencode({'code': f"fake-code-{params.get('login_hint') or DEFAULT_ACCOUNT}",
+                                        'state': params.get('state', ''),
+                                        'scope': params.get('scope', '')})
+        self._send(302, b'', {'Location': f'{redirect_uri}?{query}'})
+
+    def _oauth_token(self):
+        form = dict(urllib.parse.parse_qsl(self._read_body().decode()))
+        grant_type = form.get('grant_type')
+        if grant_type == 'authorization_code':
+            account_name = form.get('code', '').replace('fake-code-', '', 1) or DEFAULT_ACCOUNT
+            self._send(200, self.server.store.issue_token(account_name))
+        elif grant_type == 'refresh_token':
+            refresh_token = form.get('refresh_token', '')
+            if refresh_token.startswith('revoked'):
+                self._send(400, {'error': 'invalid_grant', 'error_description': 'Token has been expired or revoked.'})
+                return
+            account_name = refresh_token.replace('fake-rt-', '', 1) or DEFAULT_ACCOUNT
+            self._send(200, self.server.store.issue_token(account_name, refresh_token))
+        else:
+            self._send(400, {'error': 'unsupported_grant_type'})
+
+    # Batch
+
+    def _batch(self, account_name):
+        content_type = self.headers.get('Content-Type', '')
+        body = self._read_body()
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+        )
+        boundary = f'batch_{uuid.uuid4().hex}'
+        parts = []
+        for part in message.iter_parts():
+            content_id = part.get('Content-ID', '')
+            raw = part.get_payload(decode=True) or b''
+            head, _, part_body = raw.replace(b'\r\n', b'\n').partition(b'\n\n')
+            request_line, *header_lines = head.decode().split('\n')
+            method, path, _ = request_line.split(' ', 2)
+            headers = {}
+            for line in header_lines:
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            try:
+                status, payload, extra = self._api_call(method, path, part_body, headers, account_name)
+            except FakeApiError as error:
+                status, payload, extra = error.status, error.body(), {}
+            text = json.dumps(payload) if payload is not None else ''
+            header_text = ''.join(f'{key}: {value}\r\n' for key, value in extra.items())
+            parts.append(
+                f'--{boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id.strip("<>")}>\r\n\r\n'
+                f'HTTP/1.1 {status} {self.responses.get(status, ("",))[0]}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n{header_text}\r\n'
+                f'{text}\r\n'
+            )
+        payload = (''.join(parts) + f'--{boundary}--\r\n').encode()
+        self._send(200, payload, content_type=f'multipart/mixed; boundary={boundary}')
+
+    # Entry points
+
+    def _handle(self, method):
+        parsed = urllib.parse.urlsplit(self.path)
+        try:
+            if parsed.path == '/o/oauth2/auth':
+                return self._oauth_authorize(dict(urllib.parse.parse_qsl(parsed.query)))
+            if parsed.path == '/token' and method == 'POST':
+                return self._oauth_token()
+            account_name = self._account()
+            if parsed.path == BATCH_PATH and method == 'POST':
+                self.server.faults.apply()
+                return self._batch(account_name)
+            body = self._read_body() if method in ('POST', 'PATCH', 'PUT') else b''
+            status, payload, extra = self._api_call(
+                method, self.path, body, {key.lower(): value for key, value in self.headers.items()}, account_name
+            )
+            self._send(status, payload, extra)
+        except FakeApiError as error:
+            self._send(error.status, error.body())
+        except (ValueError, KeyError) as error:
+            self._send(400, FakeApiError(400, f'Bad Request: {error}', 'invalid').body())
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class FakeGoogleServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out (e.g. on injected latency) hang up mid-request; not worth a traceback
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(host='127.0.0.1', port=8099, store=None, faults=None, verbose=False):
+    """Create (but don't start) a fake Google server."""
+    server = FakeGoogleServer((host, port), FakeGoogleHandler)
+    server.store = store or FakeCalendarStore()
+    server.faults = faults or FaultInjector()
+    server.verbose = verbose
+    return server
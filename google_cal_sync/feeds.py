@@ -0,0 +1,244 @@
+"""
+Secret-URL .ics subscription feeds, one per calendar.
+
+Calendar apps poll feed URLs every few minutes, so a poll should not call
+Google or serialize anything. For each (user, calendar) the shared cache holds:
+
+  * the body, serialized once, with a gzip copy, keyed by its SHA-1;
+  * a state entry: that digest, when the content last changed
+    (Last-Modified), the calendar version it was checked at, when Google was
+    last asked, and a sync token.
+
+While the state matches the calendar's cache version (bumped by writes through
+this app) and is younger than CALENDAR_FEED_CHECK_SECONDS, polls are answered
+from the cache. A matching If-None-Match / If-Modified-Since gets a 304
+without even reading the body. Otherwise one worker takes a lease and asks
+Google for changes since the sync token, a single small request. Only when
+something changed is the calendar listed and serialized again. Other workers
+keep serving the current body meanwhile.
+
+DTSTAMP is each event's `updated` time (RFC 5545 allows this for feeds
+without a METHOD), so the same data always gives the same bytes and the same
+strong ETag.
+"""
+import gzip
+import hashlib
+import logging
+import re
+import secrets
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from . import google_client
+from .caching import calendar_version
+from .exporter import EVENT_FIELDS, PAGE_SIZE
+from .ical import CALENDAR_FOOTER, calendar_header, events_to_vevents
+from .models import CalendarFeed
+from .utils import get_calendar_service, iter_response_items
+
+
+logger = logging.getLogger(__name__)
+
+# Bodies and state outlive many checks; an evicted body is rebuilt on the next poll
+FEED_STATE_TTL = 7 * 24 * 60 * 60
+FEED_LOOKUP_TTL = 60 * 60
+# Unknown tokens are remembered briefly so guessing doesn't reach the database
+MISSING_FEED_TTL = 60
+# Also the back-off after a failed refresh: the lease is left to expire
+REFRESH_LEASE_SECONDS = 60
+MAX_TOKEN_LENGTH = 64
+CONTENT_TYPE = 'text/calendar; charset=utf-8'
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class FeedUnavailable(Exception):
+    """The feed owner's Google account can't be used right now."""
+
+
+def new_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+def _lookup_key(token):
+    return f'gcs:feed:t:{token}'
+
+
+def _state_key(user_id, calendar_id):
+    return f'gcs:feed:s:{user_id}:{calendar_id}'
+
+
+def _body_key(user_id, calendar_id, digest):
+    return f'gcs:feed:b:{user_id}:{calendar_id}:{digest}'
+
+
+def _lease_key(user_id, calendar_id):
+    return f'gcs:feed:l:{user_id}:{calendar_id}'
+
+
+def lookup_feed(token):
+    """{'user_id', 'calendar_id', 'name'} for a feed token, or None."""
+    if not token or len(token) > MAX_TOKEN_LENGTH:
+        return None
+    feed = cache.get(_lookup_key(token))
+    if feed is None:
+        feed = CalendarFeed.objects.filter(token=token).values('user_id', 'calendar_id', 'name').first()
+        cache.set(_lookup_key(token), feed or False, FEED_LOOKUP_TTL if feed else MISSING_FEED_TTL)
+    return feed or None
+
+
+def revoke_feed(feed):
+    """Delete a CalendarFeed and stop serving its token at once."""
+    feed.delete()
+    cache.delete(_lookup_key(feed.token))
+
+
+def _ical_utc(iso_value):
+    return datetime.fromisoformat(iso_value.replace('Z', '+00:00')).astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _dtstamp(event):
+    return _ical_utc(event.get('updated') or '1970-01-01T00:00:00Z')
+
+
+def _iter_events(service, calendar_id, meta):
+    """Every event of the calendar across pages; sets meta['nextSyncToken'] after the last page."""
+    page_token = None
+    while True:
+        params = {'calendarId': calendar_id, 'maxResults': PAGE_SIZE, 'fields': f'nextSyncToken,{EVENT_FIELDS}'}
+        if page_token:
+            params['pageToken'] = page_token
+        page = {}
+        yield from iter_response_items(service.events().list(**params), page)
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            meta['nextSyncToken'] = page.get('nextSyncToken')
+            return
+
+
+def build_body(service, calendar_id, name):
+    """(ICS body bytes, sync token) for every event of the calendar."""
+    meta = {}
+    chunks = [calendar_header(name)]
+    # Recurring series come with their cancelled and modified occurrences
+    chunks.extend(events_to_vevents(_iter_events(service, calendar_id, meta), _dtstamp))
+    chunks.append(CALENDAR_FOOTER)
+    return ''.join(chunks).encode('utf-8'), meta.get('nextSyncToken')
+
+
+def changes_since(service, calendar_id, sync_token):
+    """
+    (changed, next sync token) for the calendar since `sync_token`.
+    An expired token (410) counts as changed.
+    """
+    page_token = None
+    while True:
+        params = {'calendarId': calendar_id, 'syncToken': sync_token, 'fields': 'nextPageToken,nextSyncToken,items(id)'}
+        if page_token:
+            params['pageToken'] = page_token
+        page = {}
+        try:
+            for _ in iter_response_items(service.events().list(**params), page):
+                return True, None
+        except google_client.HttpError as error:
+            if error.resp.status == 410:
+                return True, None
+            raise
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return False, page.get('nextSyncToken')
+
+
+def _refresh(feed, state, version):
+    user_id, calendar_id = feed['user_id'], feed['calendar_id']
+    user = User.objects.filter(pk=user_id).first()
+    service = get_calendar_service(user) if user else None
+    if service is None:
+        raise FeedUnavailable(f"Google account of user {user_id} is not usable")
+
+    now = time.time()
+    if state and state.get('sync_token'):
+        changed, sync_token = changes_since(service, calendar_id, state['sync_token'])
+        if not changed:
+            return dict(state, version=version, checked_at=now, sync_token=sync_token or state['sync_token'])
+
+    body, sync_token = build_body(service, calendar_id, feed['name'])
+    digest = hashlib.sha1(body).hexdigest()
+    if state is None or state['digest'] != digest:
+        cache.set(
+            _body_key(user_id, calendar_id, digest),
+            (body, gzip.compress(body, compresslevel=9, mtime=0)),
+            FEED_STATE_TTL,
+        )
+    changed_at = state['changed_at'] if state and state['digest'] == digest else int(now)
+    return {'digest': digest, 'changed_at': changed_at, 'version': version, 'checked_at': now, 'sync_token': sync_token}
+
+
+def feed_state(feed, force=False):
+    """
+    The feed's current state, refreshed from Google when it is due. Returns
+    the previous state (possibly None) while another worker refreshes or
+    Google is failing.
+    """
+    user_id, calendar_id = feed['user_id'], feed['calendar_id']
+    state = cache.get(_state_key(user_id, calendar_id))
+    version = calendar_version(user_id, calendar_id)
+    if (
+        state is not None and not force and state['version'] == version
+        and time.time() - state['checked_at'] < settings.CALENDAR_FEED_CHECK_SECONDS
+    ):
+        return state
+
+    lease = _lease_key(user_id, calendar_id)
+    if not cache.add(lease, 1, REFRESH_LEASE_SECONDS):
+        return state
+    try:
+        state = _refresh(feed, None if force else state, version)
+    except (google_client.HttpError, FeedUnavailable) as error:
+        logger.warning("Feed refresh of %s for user %s failed: %s", calendar_id, user_id, error)
+        return None if force else state
+    cache.set(_state_key(user_id, calendar_id), state, FEED_STATE_TTL)
+    cache.delete(lease)
+    return state
+
+
+def _feed_headers(response, etag, state):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(state['changed_at'])
+    response['Cache-Control'] = f'private, max-age={settings.CALENDAR_FEED_CHECK_SECONDS}'
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def feed_response(request, feed):
+    """
+    200 with the pre-serialized body (gzipped when accepted), 304 when the
+    client's copy is current, or 503 while no body can be built.
+    """
+    state = feed_state(feed)
+    use_gzip = bool(_accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+    if state is not None:
+        etag = f'"{state["digest"]}{"-gz" if use_gzip else ""}"'
+        if get_conditional_response(request, etag=etag, last_modified=state['changed_at']) is not None:
+            return _feed_headers(HttpResponseNotModified(), etag, state)
+        bodies = cache.get(_body_key(feed['user_id'], feed['calendar_id'], state['digest']))
+        if bodies is None:
+            # The body was evicted before its state entry
+            state = feed_state(feed, force=True)
+            bodies = state and cache.get(_body_key(feed['user_id'], feed['calendar_id'], state['digest']))
+    if state is None or bodies is None:
+        response = HttpResponse("Feed is not available yet, try again shortly.\n", status=503, content_type='text/plain')
+        response['Retry-After'] = str(REFRESH_LEASE_SECONDS)
+        return response
+
+    etag = f'"{state["digest"]}{"-gz" if use_gzip else ""}"'
+    response = HttpResponse(bodies[1] if use_gzip else bodies[0], content_type=CONTENT_TYPE)
+    if use_gzip:
+        response['Content-Encoding'] = 'gzip'
+    response['Content-Disposition'] = 'inline; filename="calendar.ics"'
+    return _feed_headers(response, etag, state)
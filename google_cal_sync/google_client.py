@@ -0,0 +1,221 @@
+"""
+Thin facade over the Google client libraries.
+
+googleapiclient, google_auth_oauthlib and google.auth take a noticeable share
+of worker start-up to import, and most requests (login, search, cached pages)
+never touch them. Names here are resolved on first attribute access, e.g.
+`google_client.HttpError` in an except clause only imports googleapiclient
+once an exception actually reaches it.
+
+preload() imports everything up front; call it in the gunicorn master (see
+OJT_project/wsgi.py and gunicorn.conf.py) so forked workers share the
+modules and the discovery document copy-on-write.
+
+Calendar services talk HTTP through ResilientHttp: a requests session with
+separate connect/read timeouts (GOOGLE_API_CONNECT_TIMEOUT,
+GOOGLE_API_READ_TIMEOUT) and a shared connection pool, guarded by the
+circuit breakers in circuit.py. Timeouts, unreachable hosts and open circuits
+come back as synthetic 503 responses, so googleapiclient raises an ordinary
+HttpError and every existing error path (and the stale-cache fallback in
+caching.py) handles them.
+"""
+import importlib
+import json
+import threading
+import time
+from django.conf import settings
+from . import circuit
+from .metrics import UNAVAILABLE, classify, health
+
+
+_LAZY_NAMES = {
+    'Flow': ('google_auth_oauthlib.flow', 'Flow'),
+    'Credentials': ('google.oauth2.credentials', 'Credentials'),
+    'Request': ('google.auth.transport.requests', 'Request'),
+    'RefreshError': ('google.auth.exceptions', 'RefreshError'),
+    'TransportError': ('google.auth.exceptions', 'TransportError'),
+    'HttpError': ('googleapiclient.errors', 'HttpError'),
+    'build_from_document': ('googleapiclient.discovery', 'build_from_document'),
+    'AuthorizedSession': ('google.auth.transport.requests', 'AuthorizedSession'),
+    'HTTPAdapter': ('requests.adapters', 'HTTPAdapter'),
+    'RequestException': ('requests', 'RequestException'),
+    'Timeout': ('requests', 'Timeout'),
+    'HttpResponse': ('httplib2', 'Response'),
+}
+
+# Header on synthetic 503 responses naming the breaker (or failure) behind them
+UNAVAILABLE_HEADER = 'x-google-unavailable'
+
+_discovery_documents = {}
+_discovery_lock = threading.Lock()
+
+
+def _resolve(name):
+    module_name, attribute = _LAZY_NAMES[name]
+    value = getattr(importlib.import_module(module_name), attribute)
+    globals()[name] = value
+    return value
+
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _resolve(name)
+
+
+def discovery_document(api='calendar', version='v3'):
+    """
+    The bundled discovery document as a JSON string, read once per process.
+    A string is kept (not a dict) because build_from_document mutates dicts.
+    With settings.GOOGLE_API_BASE_URL set, rootUrl (and so the batch endpoint)
+    points at that server instead of googleapis.com.
+    """
+    key = (api, version)
+    document = _discovery_documents.get(key)
+    if document is None:
+        with _discovery_lock:
+            document = _discovery_documents.get(key)
+            if document is None:
+                from googleapiclient.discovery_cache import get_static_doc
+                document = get_static_doc(api, version)
+                base_url = getattr(settings, 'GOOGLE_API_BASE_URL', '')
+                if base_url:
+                    parsed = json.loads(document)
+                    parsed['rootUrl'] = f'{base_url}/'
+                    parsed['baseUrl'] = f"{base_url}/{parsed['servicePath']}"
+                    document = json.dumps(parsed)
+                _discovery_documents[key] = document
+    return document
+
+
+def _timeouts():
+    return settings.GOOGLE_API_CONNECT_TIMEOUT, settings.GOOGLE_API_READ_TIMEOUT
+
+
+_adapter = None
+_adapter_lock = threading.Lock()
+
+
+def _shared_adapter():
+    """One urllib3 pool for every session in the process, so connections are reused."""
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                _adapter = _resolve('HTTPAdapter')(pool_connections=8, pool_maxsize=32)
+    return _adapter
+
+
+def _mount(session):
+    adapter = _shared_adapter()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _failed(status):
+    # A 429 (or 403 rateLimitExceeded) is one user's quota, not an outage
+    return status >= 500
+
+
+class GuardedRequest:
+    """
+    google.auth transport request (used for token refresh) with timeouts and
+    the 'oauth' circuit breaker. Failures surface as TransportError.
+    """
+
+    def __init__(self):
+        requests_module = importlib.import_module('requests')
+        self._request = _resolve('Request')(session=_mount(requests_module.Session()))
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        breaker = circuit.get_breaker(circuit.endpoint_class(method, url))
+        if not breaker.allow():
+            raise _resolve('TransportError')(f"Google {breaker.name} circuit is open")
+        try:
+            response = self._request(url, method=method, body=body, headers=headers, timeout=_timeouts(), **kwargs)
+        except _resolve('TransportError'):
+            breaker.record_failure()
+            raise
+        if _failed(response.status):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+class ResilientHttp:
+    """httplib2.Http stand-in for googleapiclient; see the module docstring."""
+
+    def __init__(self, credentials, user_id=None):
+        self.session = _mount(_resolve('AuthorizedSession')(credentials, auth_request=GuardedRequest()))
+        # Attributes calls to a user in the health metrics
+        self.user_id = user_id
+
+    def _unavailable(self, breaker, reason, message):
+        body = json.dumps({
+            'error': {'code': 503, 'message': message, 'errors': [{'domain': 'global', 'reason': reason}]},
+        }).encode()
+        response = _resolve('HttpResponse')({
+            'status': '503',
+            'content-type': 'application/json; charset=UTF-8',
+            UNAVAILABLE_HEADER: breaker.name,
+        })
+        response.reason = 'Service Unavailable'
+        return response, body
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        breaker = circuit.get_breaker(circuit.endpoint_class(method, uri))
+        if not breaker.allow():
+            health.record_call(breaker.name, 0.0, UNAVAILABLE, self.user_id)
+            return self._unavailable(
+                breaker, 'circuitOpen', f"Google Calendar is not responding ({breaker.name} circuit open)",
+            )
+
+        started = time.monotonic()
+        try:
+            upstream = self.session.request(method, uri, data=body, headers=headers, timeout=_timeouts())
+        except _resolve('Timeout'):
+            breaker.record_failure()
+            health.record_call(breaker.name, time.monotonic() - started, UNAVAILABLE, self.user_id)
+            return self._unavailable(
+                breaker, 'timeout', f"Google Calendar timed out after {time.monotonic() - started:.1f}s",
+            )
+        except _resolve('RequestException') as error:
+            breaker.record_failure()
+            health.record_call(breaker.name, time.monotonic() - started, UNAVAILABLE, self.user_id)
+            return self._unavailable(breaker, 'unreachable', f"Google Calendar is unreachable: {error}")
+
+        health.record_call(
+            breaker.name, time.monotonic() - started, classify(upstream.status_code, upstream.content), self.user_id,
+        )
+        if _failed(upstream.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        # requests has already decoded the body
+        response_headers = {
+            key.lower(): value for key, value in upstream.headers.items()
+            if key.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')
+        }
+        response_headers['status'] = str(upstream.status_code)
+        response = _resolve('HttpResponse')(response_headers)
+        response.reason = upstream.reason
+        return response, upstream.content
+
+    def close(self):
+        self.session.close()
+
+
+def build_calendar_service(credentials, user_id=None, **kwargs):
+    """Build a Calendar v3 service from the cached discovery document."""
+    return _resolve('build_from_document')(
+        discovery_document(), http=ResilientHttp(credentials, user_id=user_id), **kwargs,
+    )
+
+
+def preload():
+    """Import the Google client stack and load static resources eagerly."""
+    for name in _LAZY_NAMES:
+        _resolve(name)
+    discovery_document()
@@ -0,0 +1,106 @@
+"""
+Week and month grid layout for calendar events.
+
+Events are bucketed into day cells in a single pass: each event is visited once
+and appended to the days it covers, so the cost is O(events + covered days)
+rather than a per-day scan over all events.
+"""
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+from .utils import parse_google_datetime
+
+
+GRID_VIEWS = ('week', 'month')
+
+
+def window_bounds(view, anchor):
+    """
+    Return (first_day, last_day_exclusive) of the grid containing `anchor`.
+    Weeks start on Monday; month grids are padded out to whole weeks.
+    """
+    if view == 'week':
+        first = anchor - timedelta(days=anchor.weekday())
+        return first, first + timedelta(days=7)
+
+    month_start = anchor.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    first = month_start - timedelta(days=month_start.weekday())
+    last = next_month + timedelta(days=(7 - next_month.weekday()) % 7)
+    return first, last
+
+
+def adjacent_anchors(view, anchor):
+    """Anchor dates of the previous and next window."""
+    if view == 'week':
+        return anchor - timedelta(days=7), anchor + timedelta(days=7)
+    month_start = anchor.replace(day=1)
+    previous = (month_start - timedelta(days=1)).replace(day=1)
+    following = (month_start + timedelta(days=32)).replace(day=1)
+    return previous, following
+
+
+def window_time_range(first_day, last_day):
+    """RFC 3339 timeMin/timeMax for a window of local days."""
+    tz = timezone.get_current_timezone()
+    time_min = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    time_max = timezone.make_aware(datetime.combine(last_day, time.min), tz)
+    return time_min.isoformat(), time_max.isoformat()
+
+
+def _event_days(event):
+    """
+    Local (first_day, last_day_inclusive, all_day) for a normalized event,
+    or None if it has no usable start.
+    """
+    raw = event.get('raw') or {}
+    start = raw.get('start') or {}
+    end = raw.get('end') or {}
+
+    if start.get('date'):
+        first = date.fromisoformat(start['date'])
+        # All-day end dates are exclusive
+        last = date.fromisoformat(end['date']) - timedelta(days=1) if end.get('date') else first
+        return first, max(first, last), True
+
+    start_dt = parse_google_datetime(start.get('dateTime'))
+    if not start_dt:
+        return None
+    end_dt = parse_google_datetime(end.get('dateTime')) or start_dt
+    first = timezone.localtime(start_dt).date()
+    # An event ending exactly at midnight doesn't occupy the following day
+    last = timezone.localtime(max(start_dt, end_dt - timedelta(microseconds=1))).date()
+    event['start_dt'] = timezone.localtime(start_dt)
+    return first, max(first, last), False
+
+
+def bucket_events_by_day(events, first_day, last_day):
+    """
+    Lay events out as a list of weeks, each a list of 7 day cells:
+    {'date', 'is_today', 'spans': [...], 'events': [...]}. All-day and multi-day
+    events go in 'spans', single-day timed events in 'events'; every entry is
+    {'event', 'starts_here', 'ends_here'} so spans can be drawn across days.
+    Input order (start time) is preserved within each cell.
+    """
+    total_days = (last_day - first_day).days
+    today = timezone.localdate()
+    cells = [
+        {'date': first_day + timedelta(days=offset), 'is_today': first_day + timedelta(days=offset) == today,
+         'spans': [], 'events': []}
+        for offset in range(total_days)
+    ]
+
+    for event in events:
+        days = _event_days(event)
+        if not days:
+            continue
+        first, last, all_day = days
+        begin = max((first - first_day).days, 0)
+        finish = min((last - first_day).days, total_days - 1)
+        for index in range(begin, finish + 1):
+            cells[index]['spans' if all_day or first != last else 'events'].append({
+                'event': event,
+                'starts_here': index == (first - first_day).days,
+                'ends_here': index == (last - first_day).days,
+            })
+
+    return [cells[index:index + 7] for index in range(0, total_days, 7)]
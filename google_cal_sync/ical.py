@@ -0,0 +1,320 @@
+"""
+Minimal iCalendar (RFC 5545) helpers for streaming import and export.
+Only VEVENT components are read; everything else is skipped.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+
+DURATION_RE = re.compile(r'^\+?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+def unfold_lines(lines):
+    """
+    Yield logical content lines from an iterable of physical lines,
+    joining folded continuation lines (those starting with a space or tab).
+    """
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_content_line(line):
+    """
+    Split 'NAME;PARAM=VAL:value' into (name, params, value).
+    Returns None for lines without a value separator.
+    """
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None
+
+    parts = head.split(';')
+    params = {}
+    for part in parts[1:]:
+        key, _, val = part.partition('=')
+        params[key.upper()] = val.strip('"')
+    return parts[0].upper(), params, value
+
+
+def unescape_text(value):
+    """Undo RFC 5545 TEXT escaping."""
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            nxt = next(chars, '')
+            out.append('\n' if nxt in ('n', 'N') else nxt)
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def parse_ical_datetime(value, params, default_timezone=None):
+    """
+    Convert a DTSTART/DTEND value into a Google Calendar start/end dict.
+    Floating times (no TZID, no trailing Z) are taken in `default_timezone`;
+    Google rejects a local dateTime without a timeZone.
+    Raises ValueError for malformed values.
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return {'date': datetime.strptime(value, '%Y%m%d').date().isoformat()}
+
+    if value.endswith('Z'):
+        dt = datetime.strptime(value[:-1], '%Y%m%dT%H%M%S')
+        return {'dateTime': dt.isoformat() + 'Z'}
+
+    dt = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    result = {'dateTime': dt.isoformat()}
+    if params.get('TZID') or default_timezone:
+        result['timeZone'] = params.get('TZID') or default_timezone
+    return result
+
+
+def parse_duration(value):
+    """Parse a simple RFC 5545 DURATION such as 'PT1H30M' or 'P1D'."""
+    match = DURATION_RE.match(value.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Invalid duration: {value}")
+    weeks, days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def iter_vevents(lines):
+    """
+    Stream VEVENT components out of an iCalendar line iterable.
+    Yields (line_number, properties) where properties maps property name to a
+    list of (params, value) tuples. Nested components (VALARM) are skipped.
+    Only one event is held in memory at a time.
+    """
+    event = None
+    depth = 0
+    start_line = 0
+    for number, line in enumerate(unfold_lines(lines), start=1):
+        parsed = parse_content_line(line)
+        if not parsed:
+            continue
+        name, params, value = parsed
+
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and event is None:
+                event = {}
+                depth = 0
+                start_line = number
+            elif event is not None:
+                depth += 1
+            continue
+        if name == 'END':
+            if event is not None and depth:
+                depth -= 1
+            elif event is not None and value.upper() == 'VEVENT':
+                yield start_line, event
+                event = None
+            continue
+
+        if event is not None and not depth:
+            event.setdefault(name, []).append((params, value))
+
+
+def vevent_to_event_body(properties, default_timezone=None):
+    """
+    Convert parsed VEVENT properties into a Calendar API event body.
+    Floating DTSTART/DTEND values are taken in `default_timezone`.
+    Raises ValueError if required fields are missing or invalid.
+    """
+    def first(name):
+        values = properties.get(name)
+        return values[0] if values else (None, None)
+
+    _, summary = first('SUMMARY')
+    start_params, start_value = first('DTSTART')
+    end_params, end_value = first('DTEND')
+    _, duration = first('DURATION')
+
+    if not start_value:
+        raise ValueError("DTSTART is required")
+    if properties.get('RECURRENCE-ID'):
+        # events.import would replace the whole series with this one occurrence
+        raise ValueError("modified occurrences of recurring events (RECURRENCE-ID) can't be imported")
+
+    start = parse_ical_datetime(start_value, start_params, default_timezone)
+    if end_value:
+        end = parse_ical_datetime(end_value, end_params, default_timezone)
+    elif 'date' in start:
+        day = datetime.fromisoformat(start['date']) + (parse_duration(duration) if duration else timedelta(days=1))
+        end = {'date': day.date().isoformat()}
+    else:
+        begin = datetime.fromisoformat(start['dateTime'].rstrip('Z'))
+        finish = begin + (parse_duration(duration) if duration else timedelta(hours=1))
+        end = dict(start, dateTime=finish.isoformat() + ('Z' if start['dateTime'].endswith('Z') else ''))
+
+    body = {
+        'summary': unescape_text(summary) if summary else 'Untitled event',
+        'start': start,
+        'end': end,
+    }
+    _, description = first('DESCRIPTION')
+    _, location = first('LOCATION')
+    _, uid = first('UID')
+    if description:
+        body['description'] = unescape_text(description)
+    if location:
+        body['location'] = unescape_text(location)
+    if uid:
+        body['iCalUID'] = uid
+    rules = [f"RRULE:{value}" for _, value in properties.get('RRULE', [])]
+    rules.extend(
+        f"EXDATE{''.join(f';{key}={value}' for key, value in params.items())}:{value}"
+        for params, value in properties.get('EXDATE', [])
+    )
+    if rules:
+        body['recurrence'] = rules
+    return body
+
+
+def escape_text(value):
+    """Apply RFC 5545 TEXT escaping."""
+    return (
+        value.replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line, limit=75):
+    """Fold a content line to at most `limit` octets per physical line."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= limit:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        cut = min(limit if not parts else limit - 1, len(encoded))
+        # Don't split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_ical_time(name, value):
+    """Render a Google start/end dict as a DTSTART/DTEND content line."""
+    value = value or {}
+    if value.get('date'):
+        return f"{name};VALUE=DATE:{value['date'].replace('-', '')}"
+    raw = value.get('dateTime')
+    if not raw:
+        return None
+    dt = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        tzid = value.get('timeZone')
+        stamp = dt.strftime('%Y%m%dT%H%M%S')
+        return f"{name};TZID={tzid}:{stamp}" if tzid else f"{name}:{stamp}"
+    return f"{name}:{dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def calendar_header(name=None):
+    """Opening lines of a VCALENDAR stream."""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Calendar Sync//Google Calendar Export//EN',
+        'CALSCALE:GREGORIAN',
+    ]
+    if name:
+        lines.append(f'X-WR-CALNAME:{escape_text(name)}')
+    return ''.join(fold_line(line) for line in lines)
+
+
+CALENDAR_FOOTER = 'END:VCALENDAR\r\n'
+
+
+def event_to_vevent(event, dtstamp, exdates=()):
+    """
+    Serialize a raw Google event resource as a VEVENT block. A modified
+    occurrence of a recurring event gets a RECURRENCE-ID; `exdates` are the
+    originalStartTime values of cancelled occurrences of a series master.
+    Returns an empty string for events without a usable start.
+    """
+    dtstart = format_ical_time('DTSTART', event.get('start'))
+    if not dtstart:
+        return ''
+    uid = event.get('iCalUID') or f"{event.get('recurringEventId') or event.get('id')}@google.com"
+    lines = ['BEGIN:VEVENT', f'UID:{uid}', f'DTSTAMP:{dtstamp}', dtstart]
+    if event.get('recurringEventId'):
+        recurrence_id = format_ical_time('RECURRENCE-ID', event.get('originalStartTime'))
+        if recurrence_id:
+            lines.append(recurrence_id)
+    dtend = format_ical_time('DTEND', event.get('end'))
+    if dtend:
+        lines.append(dtend)
+    for name, key in (('SUMMARY', 'summary'), ('DESCRIPTION', 'description'), ('LOCATION', 'location')):
+        if event.get(key):
+            lines.append(f'{name}:{escape_text(event[key])}')
+    if event.get('updated'):
+        updated = datetime.fromisoformat(event['updated'].replace('Z', '+00:00'))
+        lines.append(f"LAST-MODIFIED:{updated.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+    for rule in event.get('recurrence') or []:
+        lines.append(rule)
+    for original_start in exdates:
+        exdate = format_ical_time('EXDATE', original_start)
+        if exdate:
+            lines.append(exdate)
+    if event.get('status') == 'tentative':
+        lines.append('STATUS:TENTATIVE')
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def events_to_vevents(events, dtstamp):
+    """
+    Serialize raw Google events, as listed without singleEvents, as VEVENT
+    blocks. `dtstamp(event)` gives each DTSTAMP.
+
+    Google lists a recurring series as its master plus one item per changed
+    occurrence, cancelled ones included. Ordinary events stream straight
+    through; series are held back until `events` is exhausted, then written
+    as the master with an EXDATE per cancelled occurrence, followed by the
+    modified occurrences with RECURRENCE-ID. Modified occurrences whose master
+    wasn't listed are written as ordinary events under their own UID.
+    """
+    series = {}
+    for event in events:
+        master_id = event.get('recurringEventId')
+        if master_id:
+            entry = series.setdefault(master_id, {'master': None, 'modified': [], 'cancelled': []})
+            entry['cancelled' if event.get('status') == 'cancelled' else 'modified'].append(event)
+        elif event.get('status') == 'cancelled':
+            continue
+        elif event.get('recurrence'):
+            series.setdefault(event.get('id'), {'master': None, 'modified': [], 'cancelled': []})['master'] = event
+        else:
+            yield event_to_vevent(event, dtstamp(event))
+
+    for entry in series.values():
+        master = entry['master']
+        if master is None:
+            for event in entry['modified']:
+                standalone = {key: value for key, value in event.items() if key not in ('iCalUID', 'recurringEventId')}
+                yield event_to_vevent(standalone, dtstamp(event))
+            continue
+        exdates = [event['originalStartTime'] for event in entry['cancelled'] if event.get('originalStartTime')]
+        yield event_to_vevent(master, dtstamp(master), exdates)
+        for event in entry['modified']:
+            yield event_to_vevent(event, dtstamp(event))
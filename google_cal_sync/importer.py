@@ -0,0 +1,334 @@
+"""
+Streaming bulk import of .ics / CSV files into a Google Calendar.
+
+Files are read line by line and events are pushed through batched Calendar
+requests from a small thread pool, so memory stays flat regardless of file size.
+"""
+import codecs
+import csv
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import islice
+from django.db import connection
+from django.utils import timezone
+from . import google_client
+from .caching import bump_calendar_version, canonical_calendar_id
+from .ical import iter_vevents, vevent_to_event_body
+from .models import ImportJob
+from .search import index_events
+from .utils import get_calendar_service, normalize_event
+
+
+# Calendar API batch requests are most reliable with at most 50 calls each
+BATCH_SIZE = 50
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+MAX_REPORTED_FAILURES = 200
+
+CSV_COLUMNS = {
+    'summary': ('summary', 'title', 'subject', 'name'),
+    'description': ('description', 'notes', 'details'),
+    'location': ('location', 'where'),
+    'start': ('start', 'start_time', 'start time', 'start date', 'starts'),
+    'end': ('end', 'end_time', 'end time', 'end date', 'ends'),
+}
+
+
+def detect_format(filename):
+    """Pick 'ics' or 'csv' from the uploaded file name."""
+    name = (filename or '').lower()
+    if name.endswith(('.ics', '.ical', '.ifb')):
+        return 'ics'
+    if name.endswith('.csv'):
+        return 'csv'
+    raise ValueError("Unsupported file type. Upload a .ics or .csv file.")
+
+
+def iter_text_lines(binary_file, encoding='utf-8-sig'):
+    """Decode a binary file object into text lines without reading it whole."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending = ''
+    for chunk in iter(lambda: binary_file.read(64 * 1024), b''):
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+        yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _parse_csv_datetime(value):
+    """Accept ISO dates or datetimes; returns a date or datetime object."""
+    value = (value or '').strip()
+    if not value:
+        raise ValueError("missing date")
+    if len(value) == 10:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return datetime.fromisoformat(value.replace('Z', '+00:00').replace(' ', 'T', 1))
+
+
+def _as_google_time(value, default_timezone):
+    if not isinstance(value, datetime):
+        return {'date': value.isoformat()}
+    if value.tzinfo is None:
+        return {'dateTime': value.isoformat(), 'timeZone': default_timezone}
+    return {'dateTime': value.isoformat()}
+
+
+def csv_row_to_event_body(row, default_timezone):
+    """
+    Validate one CSV row (dict keyed by lower-cased header) and build an event body.
+    Raises ValueError describing the first problem found.
+    """
+    def pick(field):
+        for column in CSV_COLUMNS[field]:
+            if row.get(column):
+                return row[column].strip()
+        return ''
+
+    summary = pick('summary')
+    if not summary:
+        raise ValueError("title is required")
+    try:
+        start = _parse_csv_datetime(pick('start'))
+    except ValueError as error:
+        raise ValueError(f"invalid start: {error}")
+
+    end_value = pick('end')
+    all_day = not isinstance(start, datetime)
+    if end_value:
+        try:
+            end = _parse_csv_datetime(end_value)
+        except ValueError as error:
+            raise ValueError(f"invalid end: {error}")
+        if all_day == isinstance(end, datetime):
+            raise ValueError("start and end must both be dates or both be date-times")
+    else:
+        end = start + (timedelta(days=1) if all_day else timedelta(hours=1))
+
+    if not all_day and (start.tzinfo is None) != (end.tzinfo is None):
+        raise ValueError("start and end must both include or both omit a UTC offset")
+    if end < start:
+        raise ValueError("end is before start")
+
+    body = {
+        'summary': summary,
+        'start': _as_google_time(start, default_timezone),
+        'end': _as_google_time(end, default_timezone),
+    }
+    description = pick('description')
+    location = pick('location')
+    if description:
+        body['description'] = description
+    if location:
+        body['location'] = location
+    return body
+
+
+def iter_upload_rows(lines, file_format, default_timezone='UTC'):
+    """
+    Yield (row_number, event_body, error) for each event in the upload.
+    Exactly one of event_body / error is set.
+    """
+    if file_format == 'ics':
+        for number, properties in iter_vevents(lines):
+            try:
+                yield number, vevent_to_event_body(properties, default_timezone), None
+            except ValueError as error:
+                yield number, None, str(error)
+        return
+
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for number, row in enumerate(reader, start=2):
+        try:
+            yield number, csv_row_to_event_body(row, default_timezone), None
+        except ValueError as error:
+            yield number, None, str(error)
+
+
+def is_retryable(error):
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status in (429, 500, 502, 503):
+        return True
+    return status == 403 and 'rateLimitExceeded' in str(error)
+
+
+def _insert_request(service, calendar_id, body):
+    # Events with a UID go through events.import so re-running an import is idempotent
+    if body.get('iCalUID'):
+        return service.events().import_(calendarId=calendar_id, body=body)
+    return service.events().insert(calendarId=calendar_id, body=body)
+
+
+def _send_batch(service, calendar_id, rows):
+    """
+    Send one batch, retrying rate-limited calls with backoff.
+    Returns (created_events, failures) where failures are (row_number, message).
+    """
+    created = []
+    failures = []
+    pending = rows
+    for attempt in range(MAX_RETRIES + 1):
+        retry = []
+        by_id = {str(number): (number, body) for number, body in pending}
+
+        def callback(request_id, response, exception):
+            number, body = by_id[request_id]
+            if exception is None:
+                created.append(normalize_event(response))
+            elif is_retryable(exception) and attempt < MAX_RETRIES:
+                retry.append((number, body))
+            else:
+                failures.append((number, str(exception)))
+
+        batch = service.new_batch_http_request(callback=callback)
+        for number, body in pending:
+            batch.add(_insert_request(service, calendar_id, body), request_id=str(number))
+        try:
+            batch.execute()
+        except google_client.HttpError as error:
+            if not is_retryable(error) or attempt == MAX_RETRIES:
+                failures.extend((number, str(error)) for number, _ in pending)
+                break
+            retry = pending
+
+        if not retry:
+            break
+        pending = retry
+        time.sleep(2 ** attempt)
+    return created, failures
+
+
+def import_events(service_factory, calendar_id, rows, batch_size=BATCH_SIZE,
+                  max_workers=MAX_WORKERS, on_progress=None, on_created=None):
+    """
+    Push validated rows from iter_upload_rows() into a calendar.
+
+    service_factory() must return a fresh Calendar service; one is built per
+    worker thread because the underlying HTTP client is not thread-safe.
+    At most max_workers * 2 batches are queued at once, so the row iterator is
+    consumed lazily and memory stays bounded.
+
+    on_progress(report) is called after each batch; on_created(events) receives
+    normalized created events. Returns the final report dict.
+    """
+    report = {'processed': 0, 'created': 0, 'failed': 0, 'failures': []}
+    services = {}
+
+    def record_failures(failures):
+        report['failed'] += len(failures)
+        room = MAX_REPORTED_FAILURES - len(report['failures'])
+        if room > 0:
+            report['failures'].extend([number, message] for number, message in failures[:room])
+
+    def run(batch):
+        key = threading.get_ident()
+        try:
+            if key not in services:
+                services[key] = service_factory()
+            service = services[key]
+            if not service:
+                return [], [(number, "Google Calendar service is not available.") for number, _ in batch]
+            return _send_batch(service, calendar_id, batch)
+        finally:
+            # service_factory() may have opened this thread's database connection;
+            # close_old_connections() would keep it open under CONN_MAX_AGE
+            connection.close()
+
+    def collect(future, size):
+        created, failures = future.result()
+        report['processed'] += size
+        report['created'] += len(created)
+        record_failures(failures)
+        if created and on_created:
+            on_created(created)
+        if on_progress:
+            on_progress(report)
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        iterator = iter(rows)
+        while True:
+            chunk = list(islice(iterator, batch_size))
+            if not chunk:
+                break
+            valid = [(number, body) for number, body, error in chunk if body is not None]
+            invalid = [(number, error) for number, body, error in chunk if body is None]
+            if invalid:
+                report['processed'] += len(invalid)
+                record_failures(invalid)
+            if valid:
+                in_flight[executor.submit(run, valid)] = len(valid)
+
+            while len(in_flight) >= max_workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, in_flight.pop(future))
+
+        for future in list(in_flight):
+            collect(future, in_flight.pop(future))
+
+    return report
+
+
+def _record_created(user, calendar_id, events):
+    """Index a committed batch and drop cached pages, feeds and change-feed state of the calendar."""
+    bump_calendar_version(user.pk, canonical_calendar_id(user.pk, calendar_id))
+    index_events(user, calendar_id, events)
+
+
+def run_import_job(job, path, remove_file=True):
+    """
+    Execute an ImportJob against a file on disk, saving progress as batches finish.
+    Safe to run in a background thread.
+    """
+    def save_progress(report):
+        ImportJob.objects.filter(pk=job.pk).update(
+            processed=report['processed'],
+            created=report['created'],
+            failed=report['failed'],
+            failures=report['failures'],
+        )
+
+    ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.STATUS_RUNNING)
+    try:
+        with open(path, 'rb') as upload:
+            rows = iter_upload_rows(
+                iter_text_lines(upload),
+                job.file_format,
+                default_timezone=timezone.get_current_timezone_name(),
+            )
+            report = import_events(
+                lambda: get_calendar_service(job.user),
+                job.calendar_id,
+                rows,
+                on_progress=save_progress,
+                on_created=lambda events: _record_created(job.user, job.calendar_id, events),
+            )
+        save_progress(report)
+        ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.STATUS_COMPLETED, finished_at=timezone.now())
+    except Exception as e:
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.STATUS_FAILED,
+            error=str(e),
+            finished_at=timezone.now(),
+        )
+    finally:
+        if remove_file and os.path.exists(path):
+            os.remove(path)
+        # Normally run on its own thread (start_import_job)
+        connection.close()
+
+
+def start_import_job(job, path):
+    """Run an import in a daemon thread so the upload request returns immediately."""
+    thread = threading.Thread(target=run_import_job, args=(job, path), daemon=True)
+    thread.start()
+    return thread
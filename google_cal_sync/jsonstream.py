@@ -0,0 +1,68 @@
+"""
+Incremental decoding of Google list responses.
+
+A list page is `{"kind": ..., "nextPageToken": ..., "items": [...]}`.
+json.loads builds the whole tree of every item before the caller sees the
+first one. iter_items() walks the top-level object with
+JSONDecoder.raw_decode and yields one element of the array at a time. The
+caller can normalize each element and let it go, so the page is never held
+as objects all at once. Other top-level values (page and sync tokens) are
+collected into a dict.
+"""
+import json
+import re
+
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+def _skip(text, pos):
+    return _whitespace.match(text, pos).end()
+
+
+def _expect(text, pos, chars):
+    char = text[pos:pos + 1]
+    if not char or char not in chars:
+        raise json.JSONDecodeError(f"Expecting one of {chars!r}", text, pos)
+    return char
+
+
+def iter_items(text, meta, key='items'):
+    """
+    Yield the elements of the top-level `key` array of a JSON object.
+    Every other top-level member is stored in `meta` as it is passed; read
+    it after the generator is exhausted.
+    """
+    pos = _skip(text, 0)
+    _expect(text, pos, '{')
+    pos = _skip(text, pos + 1)
+    if _expect(text, pos, '"}') == '}':
+        return
+
+    while True:
+        name, pos = _decoder.raw_decode(text, pos)
+        pos = _skip(text, pos)
+        _expect(text, pos, ':')
+        pos = _skip(text, pos + 1)
+
+        if name == key and text[pos:pos + 1] == '[':
+            pos = _skip(text, pos + 1)
+            if text[pos:pos + 1] == ']':
+                pos += 1
+            else:
+                while True:
+                    item, pos = _decoder.raw_decode(text, pos)
+                    yield item
+                    pos = _skip(text, pos)
+                    if _expect(text, pos, ',]') == ']':
+                        pos += 1
+                        break
+                    pos = _skip(text, pos + 1)
+        else:
+            meta[name], pos = _decoder.raw_decode(text, pos)
+
+        pos = _skip(text, pos)
+        if _expect(text, pos, ',}') == '}':
+            return
+        pos = _skip(text, pos + 1)
@@ -0,0 +1,285 @@
+"""
+Live updates for open pages over Server-Sent Events.
+
+When cached calendar data changes, the change is appended to the user's change
+log in the shared cache. This covers writes through the app
+(caching.apply_event_change), refreshes that find different events than the
+last-good copy, and sync runs. The log is a sequence counter
+(`gcs:live:{user}`) plus one entry per change (`gcs:live:{user}:{seq}`, kept
+for LOG_TTL). Any process can publish, management commands included. Nothing
+is written unless a page of that user is listening.
+
+Each event loop serving streams runs one Hub. A connection is a coroutine
+waiting on an asyncio.Event, so idle clients cost a socket and a few objects,
+not a thread. Every LIVE_POLL_SECONDS the hub reads the counters of all
+subscribed users with a single get_many. It polls sooner when a change is
+published in the same process. New entries are fanned out to that user's
+connections.
+
+Entry ids are sent as SSE ids, so a reconnecting EventSource resumes with
+Last-Event-ID. If the gap can't be filled (entries expired, counter
+evicted, too slow a reader), the page is told to reload.
+
+The stream view (views.live_events_view) is a native async view, and every
+middleware in settings.MIDDLEWARE is async-capable. That alone doesn't free
+the thread: Django's ASGI handler opens a ThreadSensitiveContext per request,
+and the first thread-sensitive sync call in it (a MiddlewareMixin hook, the
+async ORM behind request.auser()) starts a thread that is kept until the
+response ends. For a stream that is its whole lifetime. route_streams()
+wraps the ASGI application so the stream path is handled without that
+context. Its sync calls then take short turns on asgiref's one shared
+thread, and an idle stream holds no thread at all.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+
+logger = logging.getLogger(__name__)
+
+# How long changes are kept for reconnecting clients
+LOG_TTL = 10 * 60
+COUNTER_TTL = 30 * 24 * 60 * 60
+# A user counts as listening for this long after their last connection was seen
+PRESENCE_TTL = 60
+# Changes queued for one connection before it is told to reload instead
+CONNECTION_BACKLOG = 100
+# How long a missing log entry is waited for (its publisher is between incr and set)
+GAP_SECONDS = 5
+# Comment lines keep idle connections open through proxies
+HEARTBEAT_SECONDS = 25
+RECONNECT_MILLISECONDS = 5000
+
+
+def _sequence_key(user_id):
+    return f'gcs:live:{user_id}'
+
+
+def _log_key(user_id, seq):
+    return f'gcs:live:{user_id}:{seq}'
+
+
+def _presence_key(user_id):
+    return f'gcs:live:on:{user_id}'
+
+
+def _new_counter():
+    # Millisecond clock, like calendar versions: a recreated counter moves forward
+    return int(time.time() * 1000)
+
+
+def is_listening(user_id):
+    """Whether any process has a live connection open for the user."""
+    return cache.get(_presence_key(user_id)) is not None
+
+
+def publish(user_id, calendar_id, changes):
+    """
+    Append changes to one calendar to the user's change log. `changes` is a
+    list of (event_id, normalized event, or None when it was removed).
+    """
+    if not changes or not is_listening(user_id):
+        return
+    key = _sequence_key(user_id)
+    cache.add(key, _new_counter(), COUNTER_TTL)
+    try:
+        last = cache.incr(key, len(changes))
+    except ValueError:
+        return
+    first = last - len(changes) + 1
+    cache.set_many({
+        _log_key(user_id, first + offset): {'calendar_id': calendar_id, 'event_id': event_id, 'event': event}
+        for offset, (event_id, event) in enumerate(changes)
+    }, LOG_TTL)
+    _wake_hubs()
+
+
+def message(data=None, event=None, id=None, retry=None):
+    """One SSE message. With only an id it updates the client's Last-Event-ID silently."""
+    lines = []
+    if retry is not None:
+        lines.append(f'retry: {retry}')
+    if id is not None:
+        lines.append(f'id: {id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if data is not None:
+        lines.extend(f'data: {line}' for line in json.dumps(data).splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+class Connection:
+    """Changes waiting to be sent to one client; an entry of None means 'reload'."""
+
+    def __init__(self, user_id, last_seq):
+        self.user_id = user_id
+        self.last_seq = last_seq
+        self.pending = deque()
+        self.ready = asyncio.Event()
+
+    def push(self, seq, entry):
+        if len(self.pending) >= CONNECTION_BACKLOG:
+            self.pending.clear()
+            entry = None
+        self.pending.append((seq, entry))
+        self.ready.set()
+
+    async def changes(self, timeout):
+        """[(seq, entry)] queued so far, waiting up to `timeout` for the first one."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        changes = list(self.pending)
+        self.pending.clear()
+        if changes:
+            self.last_seq = changes[-1][0]
+        return changes
+
+
+class Hub:
+    """Polls the change logs of subscribed users for one event loop."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.connections = {}
+        self.delivered = {}
+        self.gaps = {}
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.presence_at = 0
+
+    async def subscribe(self, user_id, last_seq=None):
+        """Register a connection; `last_seq` (from Last-Event-ID) replays what it missed."""
+        key = _sequence_key(user_id)
+        await cache.aadd(key, _new_counter(), COUNTER_TTL)
+        head = await cache.aget(key, 0)
+        await cache.aset(_presence_key(user_id), 1, PRESENCE_TTL)
+        self.delivered.setdefault(user_id, head)
+
+        delivered = self.delivered[user_id]
+        if last_seq is None or last_seq > delivered:
+            last_seq = delivered
+        connection = Connection(user_id, last_seq)
+        self.connections.setdefault(user_id, set()).add(connection)
+        if self.task is None:
+            # A fresh context, so the poller doesn't hold on to this request's executor
+            self.task = self.loop.create_task(self.run(), context=contextvars.Context())
+        if last_seq < delivered:
+            await self._replay(connection, last_seq, delivered)
+        return connection
+
+    def unsubscribe(self, connection):
+        connections = self.connections.get(connection.user_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.connections[connection.user_id]
+            self.delivered.pop(connection.user_id, None)
+            self.gaps = {gap: since for gap, since in self.gaps.items() if gap[0] != connection.user_id}
+
+    async def _replay(self, connection, since, upto):
+        if upto - since > CONNECTION_BACKLOG:
+            missed = [(upto, None)]
+        else:
+            seqs = range(since + 1, upto + 1)
+            entries = await cache.aget_many([_log_key(connection.user_id, seq) for seq in seqs])
+            missed = [(seq, entries.get(_log_key(connection.user_id, seq))) for seq in seqs]
+            if any(entry is None for _, entry in missed):
+                missed = [(upto, None)]
+        # Anything the poller queued meanwhile is newer than `upto`
+        connection.pending.extendleft(reversed(missed))
+        connection.ready.set()
+
+    async def run(self):
+        try:
+            while self.connections:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), settings.LIVE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                try:
+                    await self.poll()
+                except Exception:
+                    logger.exception("Live update poll failed")
+        finally:
+            self.task = None
+
+    def _fan_out(self, user_id, seq, entry):
+        for connection in self.connections.get(user_id, ()):
+            connection.push(seq, entry)
+        self.delivered[user_id] = seq
+
+    async def poll(self):
+        users = list(self.connections)
+        now = time.monotonic()
+        if now - self.presence_at > PRESENCE_TTL / 3:
+            await cache.aset_many({_presence_key(user_id): 1 for user_id in users}, PRESENCE_TTL)
+            self.presence_at = now
+
+        heads = await cache.aget_many([_sequence_key(user_id) for user_id in users])
+        for user_id in users:
+            head, delivered = heads.get(_sequence_key(user_id)), self.delivered.get(user_id)
+            if head is None or delivered is None or head <= delivered:
+                continue
+            if head - delivered > CONNECTION_BACKLOG:
+                self._fan_out(user_id, head, None)
+                continue
+            seqs = range(delivered + 1, head + 1)
+            entries = await cache.aget_many([_log_key(user_id, seq) for seq in seqs])
+            for seq in seqs:
+                entry = entries.get(_log_key(user_id, seq))
+                if entry is None and now - self.gaps.setdefault((user_id, seq), now) < GAP_SECONDS:
+                    break
+                self.gaps.pop((user_id, seq), None)
+                self._fan_out(user_id, seq, entry)
+
+
+_hubs = weakref.WeakKeyDictionary()
+_hubs_lock = threading.Lock()
+
+
+def hub():
+    """The Hub of the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _hubs_lock:
+        current = _hubs.get(loop)
+        if current is None:
+            current = _hubs[loop] = Hub(loop)
+        return current
+
+
+def _wake_hubs():
+    with _hubs_lock:
+        hubs = list(_hubs.items())
+    for loop, current in hubs:
+        if current.connections and not loop.is_closed():
+            loop.call_soon_threadsafe(current.wakeup.set)
+
+
+def route_streams(application):
+    """
+    Wrap Django's ASGI application so the live stream runs outside the
+    per-request ThreadSensitiveContext; every other request is passed through.
+    """
+    stream_path = reverse('google_cal_sync:live_events')
+
+    async def app(scope, receive, send):
+        path = scope.get('path', '').removeprefix(scope.get('root_path', ''))
+        if scope['type'] == 'http' and path == stream_path:
+            # ASGIHandler.__call__ is this plus the context
+            await application.handle(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return app
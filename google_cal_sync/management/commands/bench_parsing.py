@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from google_cal_sync.jsonstream import iter_items
+from google_cal_sync.utils import normalize_event
+
+
+VARIANTS = ['tree', 'stream']
+
+
+def synthetic_page(events, attendees, seed=0):
+    """An events.list page body shaped like Google's, with large guest lists."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc)
+    items = []
+    for index in range(events):
+        begins = start + timedelta(minutes=30 * index)
+        guests = [
+            {
+                'email': f'guest{rng.randrange(100000)}@example.com',
+                'displayName': f'Guest {rng.randrange(100000)}',
+                'responseStatus': rng.choice(['accepted', 'declined', 'tentative', 'needsAction']),
+            }
+            for _ in range(attendees)
+        ]
+        guests.append({'email': 'me@example.com', 'self': True, 'responseStatus': 'accepted'})
+        items.append({
+            'kind': 'calendar#event',
+            'etag': f'"{rng.getrandbits(48)}"',
+            'id': f'evt{index:06d}',
+            'status': 'confirmed',
+            'summary': f'Meeting {index}',
+            'description': 'Agenda and notes ' * 4,
+            'location': 'Room 4',
+            'updated': '2026-01-01T00:00:00.000Z',
+            'start': {'dateTime': begins.isoformat()},
+            'end': {'dateTime': (begins + timedelta(minutes=30)).isoformat()},
+            'organizer': {'email': 'organizer@example.com'},
+            'attendees': guests,
+        })
+    return json.dumps({
+        'kind': 'calendar#events',
+        'summary': 'me@example.com',
+        'items': items,
+        'nextPageToken': 'page-2',
+    }).encode()
+
+
+def parse_tree(content):
+    # What the client library's JsonModel did: decode the whole page, then normalize
+    response = json.loads(content.decode('utf-8'))
+    return [normalize_event(event) for event in response.get('items', [])], response.get('nextPageToken')
+
+
+def parse_stream(content):
+    text = content.decode('utf-8')
+    del content
+    meta = {}
+    events = [normalize_event(event) for event in iter_items(text, meta)]
+    return events, meta.get('nextPageToken')
+
+
+def memory_status_kb(field):
+    """VmRSS (current) or VmHWM (peak) of this process, in kB (Linux)."""
+    # Not getrusage: its ru_maxrss survives exec, so a child would report the parent's peak
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise CommandError(f"{field} is not available on this platform")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare peak memory of decoding a large events.list page into a dict tree "
+        "against the incremental item parser. Each variant runs in a fresh process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2500, help="Events in the page (Google's maximum is 2500)")
+        parser.add_argument('--attendees', type=int, default=50, help="Guests per event")
+        parser.add_argument('--variant', choices=VARIANTS, help="Run one variant in this process (used internally)")
+        parser.add_argument('--body', help="Page body file for --variant (used internally)")
+
+    def _measure(self, variant, path):
+        with open(path, 'rb') as handle:
+            content = handle.read()
+        parse = parse_tree if variant == 'tree' else parse_stream
+        # RSS first, untraced: tracemalloc's own bookkeeping would inflate it
+        baseline = memory_status_kb('VmRSS')
+        started = time.perf_counter()
+        events, next_page = parse(content)
+        elapsed = time.perf_counter() - started
+        peak = memory_status_kb('VmHWM')
+        del events
+        # Then Python allocations only, which don't depend on what the allocator kept from the first pass
+        tracemalloc.start()
+        events, next_page = parse(content)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(events) and next_page == 'page-2'
+        return {
+            'variant': variant,
+            'events': len(events),
+            'rss_growth_kb': max(0, peak - baseline),
+            'traced_peak_kb': traced_peak // 1024,
+            'seconds': round(elapsed, 3),
+        }
+
+    def handle(self, *args, **options):
+        if options['variant']:
+            if not options['body']:
+                raise CommandError("--variant needs --body")
+            self.stdout.write(json.dumps(self._measure(options['variant'], options['body'])))
+            return
+
+        if options['events'] < 1 or options['attendees'] < 0:
+            raise CommandError("--events must be positive and --attendees non-negative")
+        content = synthetic_page(options['events'], options['attendees'])
+        self.stdout.write(
+            f"Page: {options['events']} events x {options['attendees']} attendees, {len(content) / 1e6:.1f} MB"
+        )
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as handle:
+            handle.write(content)
+        try:
+            results = []
+            for variant in VARIANTS:
+                output = subprocess.run(
+                    [sys.executable, sys.argv[0], 'bench_parsing', '--variant', variant, '--body', handle.name],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+        finally:
+            os.unlink(handle.name)
+
+        self.stdout.write(f"{'variant':<8} {'events':>7} {'peak RSS +MB':>13} {'traced peak MB':>15} {'seconds':>8}")
+        for result in results:
+            self.stdout.write(
+                f"{result['variant']:<8} {result['events']:>7} {result['rss_growth_kb'] / 1024:>13.1f} "
+                f"{result['traced_peak_kb'] / 1024:>15.1f} {result['seconds']:>8.3f}"
+            )
+        tree, stream = results
+        if stream['rss_growth_kb']:
+            self.stdout.write(f"Peak RSS growth, tree / stream: {tree['rss_growth_kb'] / stream['rss_growth_kb']:.1f}x")
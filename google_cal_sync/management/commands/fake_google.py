@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from google_cal_sync.fake_google import FakeCalendarStore, FaultInjector, make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local fake of the Google Calendar v3 and OAuth token endpoints for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+        parser.add_argument('--latency-ms', type=float, default=0, help="Fixed delay added to every API call")
+        parser.add_argument('--jitter-ms', type=float, default=0, help="Extra random delay, 0..N ms")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls failing with 503")
+        parser.add_argument('--quota-error-rate', type=float, default=0.0,
+                            help="Fraction of calls failing with 403/429 rateLimitExceeded")
+        parser.add_argument('--seed-events', type=int, default=50, help="Events generated per calendar")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for repeatable runs")
+        parser.add_argument('--verbose-requests', action='store_true', help="Log every request")
+
+    def handle(self, *args, **options):
+        server = make_server(
+            host=options['host'],
+            port=options['port'],
+            store=FakeCalendarStore(seed_events=options['seed_events'], seed=options['seed']),
+            faults=FaultInjector(
+                latency_ms=options['latency_ms'],
+                jitter_ms=options['jitter_ms'],
+                error_rate=options['error_rate'],
+                quota_error_rate=options['quota_error_rate'],
+                seed=options['seed'],
+            ),
+            verbose=options['verbose_requests'],
+        )
+        base_url = f"http://{options['host']}:{server.server_address[1]}"
+        self.stdout.write(self.style.SUCCESS(f"Fake Google listening on {base_url}"))
+        self.stdout.write(
+            f"Start Django with GOOGLE_API_BASE_URL={base_url} "
+            "(and OAUTHLIB_INSECURE_TRANSPORT=1 to sign in through it)."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,47 @@
+import os
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from google_cal_sync.importer import detect_format, run_import_job
+from google_cal_sync.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = "Stream a .ics or CSV file into a user's Google Calendar."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the .ics or .csv file")
+        parser.add_argument('--user', required=True, help="Username owning the Google token")
+        parser.add_argument('--calendar', default='primary', help="Target calendar ID")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        try:
+            user = User.objects.get(username=options['user'])
+            file_format = detect_format(path)
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['user']}")
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        job = ImportJob.objects.create(
+            user=user,
+            calendar_id=options['calendar'],
+            filename=os.path.basename(path)[:255],
+            file_format=file_format,
+        )
+        started = time.monotonic()
+        run_import_job(job, path, remove_file=False)
+        job.refresh_from_db()
+        elapsed = time.monotonic() - started
+
+        for row, message in job.failures:
+            self.stderr.write(f"Row {row}: {message}")
+        if job.error:
+            raise CommandError(job.error)
+        rate = job.processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {job.created} events ({job.failed} failed) in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        ))
@@ -0,0 +1,109 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from google_cal_sync.metrics import percentile
+from google_cal_sync.models import GoogleToken
+
+
+DEFAULT_PATHS = ['/dashboard/', '/events/upcoming/', '/events/calendar/', '/events/search/?q=event']
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server's views at a fixed concurrency and report p50/p95/p99 latency. "
+        "Users, fake Google tokens and sessions are created in this project's database, "
+        "so point the server at `manage.py fake_google` via GOOGLE_API_BASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the Django server")
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=500, help="Total requests across all workers")
+        parser.add_argument('--users', type=int, default=10, help="Distinct signed-in users to spread load over")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help=f"Path to request (repeatable; default: {', '.join(DEFAULT_PATHS)})")
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def _session_cookies(self, count):
+        """Create loadtest users with fake Google tokens and a signed-in session each."""
+        cookies = []
+        for index in range(count):
+            user, _ = User.objects.get_or_create(username=f'loadtest-{index}')
+            GoogleToken.objects.update_or_create(user=user, defaults={
+                'access_token': 'fake-loadtest',
+                'refresh_token': f'fake-rt-loadtest-{index}',
+                # Expired, so the first request refreshes through the fake token endpoint
+                'token_expiry': timezone.now() - timedelta(minutes=1),
+            })
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            cookies.append(f'{settings.SESSION_COOKIE_NAME}={session.session_key}')
+        return cookies
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1 or options['users'] < 1:
+            raise CommandError("--concurrency, --requests and --users must be positive")
+        base_url = options['url'].rstrip('/')
+        paths = options['paths'] or DEFAULT_PATHS
+        cookies = self._session_cookies(options['users'])
+        opener = urllib.request.build_opener(NoRedirect)
+
+        results = []
+        results_lock = threading.Lock()
+
+        def fetch(index):
+            path = paths[index % len(paths)]
+            request = urllib.request.Request(base_url + path, headers={'Cookie': cookies[index % len(cookies)]})
+            started = time.perf_counter()
+            try:
+                with opener.open(request, timeout=options['timeout']) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            except (urllib.error.URLError, OSError):
+                status = 0
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                results.append((path, status, elapsed))
+
+        self.stdout.write(
+            f"{options['requests']} requests, concurrency {options['concurrency']}, "
+            f"{len(cookies)} users against {base_url}"
+        )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(fetch, range(options['requests'])))
+        wall = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{'path':<32} {'count':>6} {'errors':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+        )
+        for path in paths + ['ALL']:
+            rows = [row for row in results if path in ('ALL', row[0])]
+            latencies = sorted(elapsed * 1000 for _, _, elapsed in rows)
+            # Redirects to the login/dashboard page count as errors: the session or token didn't work
+            errors = sum(1 for _, status, _ in rows if status != 200)
+            self.stdout.write(
+                f"{path[:32]:<32} {len(rows):>6} {errors:>6} {percentile(latencies, 0.50):>6.1f}ms "
+                f"{percentile(latencies, 0.95):>6.1f}ms {percentile(latencies, 0.99):>6.1f}ms "
+                f"{(latencies[-1] if latencies else 0):>6.1f}ms"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(results) / wall:.1f} requests/s over {wall:.1f}s"))
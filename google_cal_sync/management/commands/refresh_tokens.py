@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from google_cal_sync.token_refresh import refresh_due_tokens
+
+
+class Command(BaseCommand):
+    help = "Refresh Google tokens that expire soon, so users don't wait on the token endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-minutes', type=int, default=15,
+                            help="Refresh tokens expiring within this many minutes")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent refresh requests")
+        parser.add_argument('--batch-size', type=int, default=200, help="Tokens per bulk_update")
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+                            help="Repeat every SECONDS instead of running once (for a periodic worker)")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try:
+                stats = refresh_due_tokens(
+                    window=timedelta(minutes=options['window_minutes']),
+                    max_workers=options['workers'],
+                    batch_size=options['batch_size'],
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write(
+                f"Refreshed {stats['refreshed']} tokens, {stats['failed']} failed (will retry), "
+                f"{stats['flagged']} flagged for reconnect in {time.monotonic() - started:.1f}s"
+            )
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,46 @@
+import signal
+import threading
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from google_cal_sync.reminders import DEFAULT_POLL_INTERVAL, ReminderScheduler, get_sink
+
+
+class Command(BaseCommand):
+    help = "Long-running dispatcher that sends reminders before indexed events start."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', help="Dotted path of the sink class (default: settings.REMINDER_SINK)")
+        parser.add_argument('--minutes', type=int, action='append',
+                            help="Minutes before start to remind (repeatable; default: settings.REMINDER_MINUTES)")
+        parser.add_argument('--horizon-minutes', type=int, default=30,
+                            help="How far ahead reminders are held in memory")
+        parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_INTERVAL,
+                            help="How often to look for changed events")
+        parser.add_argument('--workers', type=int, default=4, help="Threads delivering through the sink")
+
+    def handle(self, *args, **options):
+        try:
+            sink = get_sink(options['sink'])
+        except ImportError as error:
+            raise CommandError(str(error))
+
+        scheduler = ReminderScheduler(
+            sink,
+            offsets=options['minutes'],
+            horizon=timedelta(minutes=options['horizon_minutes']),
+            poll_interval=options['poll_seconds'],
+            max_workers=options['workers'],
+        )
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dispatching reminders {scheduler.offsets} min before events via {type(sink).__name__}"
+        ))
+        scheduler.run(stop_event)
+        stats = scheduler.stats
+        self.stdout.write(
+            f"Sent {stats['sent']} ({stats['failed']} failed, {stats['skipped']} skipped), "
+            f"max drift {stats['max_drift']:.3f}s"
+        )
@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from google_cal_sync.digests import DigestRun
+
+
+class Command(BaseCommand):
+    help = "Email every connected user their agenda for a day (tomorrow by default). Safe to rerun."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day of the agenda, YYYY-MM-DD (default: tomorrow)")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent agenda fetches")
+        parser.add_argument('--render-processes', type=int, default=2,
+                            help="Processes rendering digests; 0 renders in this process")
+        parser.add_argument('--batch-size', type=int, default=100, help="Digests per email connection batch")
+        parser.add_argument('--site-url', default='', help="Link to the app included in each digest")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+        else:
+            day = timezone.localdate() + timedelta(days=1)
+        if options['workers'] < 1 or options['batch_size'] < 1 or options['render_processes'] < 0:
+            raise CommandError("--workers and --batch-size must be positive, --render-processes not negative")
+
+        def progress(stats):
+            self.stdout.write(f"  {stats['users']} users: {stats['sent']} sent, {stats['empty']} empty, {stats['failed']} failed")
+
+        stats = DigestRun(
+            day,
+            fetch_workers=options['workers'],
+            render_processes=options['render_processes'],
+            batch_size=options['batch_size'],
+            site_url=options['site_url'],
+            on_batch=progress if options['verbosity'] > 1 else None,
+        ).run()
+        rate = stats['users'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(
+            f"Digests for {day}: {stats['sent']} sent, {stats['empty']} with nothing scheduled, "
+            f"{stats['failed']} failed (will retry) of {stats['users']} users in {stats['seconds']:.1f}s "
+            f"({rate:.1f} users/s; fetch {stats['fetch_seconds']:.1f}s, render {stats['render_seconds']:.1f}s, "
+            f"send {stats['send_seconds']:.1f}s)"
+        )
@@ -0,0 +1,63 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from google_cal_sync.models import SyncPair
+from google_cal_sync.sync import sync_all, sync_pair
+
+
+def _calendar_ref(value):
+    username, _, calendar_id = value.partition(':')
+    if not username or not calendar_id:
+        raise CommandError(f"Expected USERNAME:CALENDAR_ID, got {value!r}")
+    try:
+        return User.objects.get(username=username), calendar_id
+    except User.DoesNotExist:
+        raise CommandError(f"User '{username}' not found")
+
+
+class Command(BaseCommand):
+    help = "Mirror events between calendars configured as sync pairs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', metavar='USER:CALENDAR', help="Create (or reuse) a pair from this calendar")
+        parser.add_argument('--target', metavar='USER:CALENDAR', help="...into this calendar")
+        parser.add_argument('--two-way', action='store_true', help="Also mirror target changes back (with --source)")
+        parser.add_argument('--pair', type=int, help="Only run the pair with this ID")
+        parser.add_argument('--full', action='store_true', help="Ignore sync tokens and reconcile every event")
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+                            help="Repeat every SECONDS instead of running once")
+
+    def handle(self, *args, **options):
+        pairs = None
+        if options['source'] or options['target']:
+            if not (options['source'] and options['target']):
+                raise CommandError("--source and --target must be given together")
+            source_user, source_calendar = _calendar_ref(options['source'])
+            target_user, target_calendar = _calendar_ref(options['target'])
+            if (source_user, source_calendar) == (target_user, target_calendar):
+                raise CommandError("Source and target must be different calendars")
+            pair, created = SyncPair.objects.get_or_create(
+                source_user=source_user, source_calendar_id=source_calendar,
+                target_user=target_user, target_calendar_id=target_calendar,
+                defaults={'two_way': options['two_way']},
+            )
+            self.stdout.write(f"{'Created' if created else 'Using'} pair {pair.pk}: {pair}")
+            pairs = [pair]
+        elif options['pair']:
+            try:
+                pairs = [SyncPair.objects.select_related('source_user', 'target_user').get(pk=options['pair'])]
+            except SyncPair.DoesNotExist:
+                raise CommandError(f"Sync pair {options['pair']} not found")
+
+        while True:
+            started = time.monotonic()
+            results = [(pair, sync_pair(pair, full=options['full'])) for pair in pairs] if pairs else sync_all(options['full'])
+            for pair, stats in results:
+                summary = ', '.join(f"{name} {value}" for name, value in stats.items() if name != 'errors' and value)
+                self.stdout.write(f"Pair {pair.pk} ({pair}): {summary or 'nothing to do'}")
+                for error in stats.get('errors', []):
+                    self.stderr.write(f"  {error}")
+            self.stdout.write(f"Finished in {time.monotonic() - started:.1f}s")
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
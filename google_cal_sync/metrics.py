@@ -0,0 +1,135 @@
+"""
+Lightweight health metrics for Google API calls and the calendar cache.
+
+Each Google request made through ResilientHttp is recorded in fixed-size ring
+buffers: one for the whole process, one per endpoint class and one per user.
+The record holds the time, latency and outcome (ok, error, throttled, or
+unavailable, which covers timeouts and open circuits). Cache lookups in
+caching._cached are recorded the same way as hits and misses. Summaries only
+cover samples from the last SUMMARY_WINDOW seconds.
+
+Buffers live in process memory, like the circuit breakers: cheap to write
+(a deque append under a lock) and lost on restart. Each worker reports what
+it has seen itself. Per-user buffers are evicted least-recently-used beyond
+MAX_SCOPES users.
+
+The last successful refresh and last failure of each calendar are different.
+They are kept in the shared cache (see caching.calendar_health), so every
+worker reports the same data age.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+SAMPLE_SIZE = 256
+MAX_SCOPES = 2048
+SUMMARY_WINDOW = 15 * 60
+
+OK = 'ok'
+ERROR = 'error'
+THROTTLED = 'throttled'
+UNAVAILABLE = 'unavailable'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def classify(status, content=b''):
+    """Outcome of an upstream response for health reporting."""
+    if status == 429 or (status == 403 and b'ateLimitExceeded' in (content or b'')):
+        return THROTTLED
+    if status >= 500:
+        return ERROR
+    return OK
+
+
+class RingBuffer:
+    """The most recent `size` samples, each a tuple starting with a timestamp."""
+
+    def __init__(self, size=SAMPLE_SIZE):
+        self.samples = deque(maxlen=size)
+        self.total = 0
+
+    def add(self, sample):
+        self.samples.append(sample)
+        self.total += 1
+
+    def recent(self, window, now=None):
+        since = (now or time.time()) - window
+        return [sample for sample in self.samples if sample[0] >= since]
+
+
+class HealthMetrics:
+    """Ring buffers keyed by scope ('all', 'endpoint:<class>', 'user:<id>')."""
+
+    def __init__(self, size=SAMPLE_SIZE, max_scopes=MAX_SCOPES):
+        self.size = size
+        self.max_scopes = max_scopes
+        self.lock = threading.Lock()
+        self.calls = OrderedDict()
+        self.lookups = OrderedDict()
+
+    def _buffer(self, table, scope):
+        buffer = table.get(scope)
+        if buffer is None:
+            buffer = table[scope] = RingBuffer(self.size)
+            if len(table) > self.max_scopes:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(scope)
+        return buffer
+
+    def record_call(self, endpoint, seconds, outcome, user_id=None):
+        sample = (time.time(), seconds, outcome)
+        with self.lock:
+            self._buffer(self.calls, 'all').add(sample)
+            self._buffer(self.calls, f'endpoint:{endpoint}').add(sample)
+            if user_id is not None:
+                self._buffer(self.calls, f'user:{user_id}').add(sample)
+
+    def record_lookup(self, hit, user_id=None):
+        sample = (time.time(), hit)
+        with self.lock:
+            self._buffer(self.lookups, 'all').add(sample)
+            if user_id is not None:
+                self._buffer(self.lookups, f'user:{user_id}').add(sample)
+
+    def generation(self, scope):
+        """Calls ever recorded for a scope; changes whenever a summary would."""
+        with self.lock:
+            buffer = self.calls.get(scope)
+            return buffer.total if buffer else 0
+
+    def summary(self, scope='all', window=SUMMARY_WINDOW):
+        """Latency percentiles (ms), outcome counts and cache hit rate for a scope."""
+        with self.lock:
+            calls = self.calls[scope].recent(window) if scope in self.calls else []
+            lookups = self.lookups[scope].recent(window) if scope in self.lookups else []
+        latencies = sorted(seconds * 1000 for _, seconds, _ in calls)
+        outcomes = [outcome for _, _, outcome in calls]
+        hits = sum(1 for _, hit in lookups if hit)
+        return {
+            'calls': len(calls),
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'max_ms': round(latencies[-1], 1) if latencies else 0.0,
+            'errors': outcomes.count(ERROR) + outcomes.count(UNAVAILABLE),
+            'throttled': outcomes.count(THROTTLED),
+            'cache_lookups': len(lookups),
+            'cache_hit_rate': round(hits / len(lookups), 3) if lookups else None,
+        }
+
+    def endpoint_summaries(self, window=SUMMARY_WINDOW):
+        with self.lock:
+            endpoints = [scope for scope in self.calls if scope.startswith('endpoint:')]
+        return {scope.split(':', 1)[1]: self.summary(scope, window) for scope in sorted(endpoints)}
+
+
+health = HealthMetrics()
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+TABLE = 'google_cal_sync_indexedevent'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {TABLE}_fts USING fts5(
+        summary, description, location,
+        content='{TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {TABLE}_fts_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {TABLE}_fts(rowid, summary, description, location)
+        VALUES (new.id, new.summary, new.description, new.location);
+    END""",
+    f"""CREATE TRIGGER {TABLE}_fts_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {TABLE}_fts({TABLE}_fts, rowid, summary, description, location)
+        VALUES ('delete', old.id, old.summary, old.description, old.location);
+    END""",
+    f"""CREATE TRIGGER {TABLE}_fts_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {TABLE}_fts({TABLE}_fts, rowid, summary, description, location)
+        VALUES ('delete', old.id, old.summary, old.description, old.location);
+        INSERT INTO {TABLE}_fts(rowid, summary, description, location)
+        VALUES (new.id, new.summary, new.description, new.location);
+    END""",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {TABLE}_fts_au",
+    f"DROP TRIGGER IF EXISTS {TABLE}_fts_ad",
+    f"DROP TRIGGER IF EXISTS {TABLE}_fts_ai",
+    f"DROP TABLE IF EXISTS {TABLE}_fts",
+]
+
+POSTGRES_FORWARD = [
+    f"""ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(summary, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) STORED""",
+    f"CREATE INDEX {TABLE}_search_gin ON {TABLE} USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    f"DROP INDEX IF EXISTS {TABLE}_search_gin",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements_by_vendor):
+    statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index: FTS5 on SQLite, tsvector/GIN on PostgreSQL."""
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_cal_sync', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calendar_id', models.CharField(max_length=255)),
+                ('event_id', models.CharField(max_length=255)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('description', models.TextField(blank=True, default='')),
+                ('location', models.TextField(blank=True, default='')),
+                ('start_text', models.CharField(blank=True, default='', max_length=64)),
+                ('start', models.DateTimeField(blank=True, null=True)),
+                ('end', models.DateTimeField(blank=True, null=True)),
+                ('updated', models.CharField(blank=True, default='', help_text="Google's 'updated' timestamp", max_length=64)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indexed_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Indexed Event',
+                'verbose_name_plural': 'Indexed Events',
+                'indexes': [models.Index(fields=['user', 'start'], name='google_cal__user_id_237307_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'calendar_id', 'event_id'), name='unique_indexed_event')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_cal_sync', '0003_import_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calendar_id', models.CharField(max_length=255)),
+                ('event_id', models.CharField(max_length=255)),
+                ('remind_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('error', models.TextField(blank=True, default='', help_text='Sink error, if delivery failed')),
+            ],
+            options={
+                'verbose_name': 'Sent Reminder',
+                'verbose_name_plural': 'Sent Reminders',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='indexedevent',
+            index=models.Index(fields=['start'], name='google_cal__start_644d6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='indexedevent',
+            index=models.Index(fields=['indexed_at'], name='google_cal__indexed_49d59b_idx'),
+        ),
+        migrations.AddField(
+            model_name='sentreminder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='sentreminder',
+            constraint=models.UniqueConstraint(fields=('user', 'calendar_id', 'event_id', 'remind_at'), name='unique_sent_reminder'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_cal_sync', '0004_sent_reminder'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googletoken',
+            name='last_refresh_attempt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='googletoken',
+            name='last_refresh_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='googletoken',
+            name='needs_reauth',
+            field=models.BooleanField(default=False, help_text='Refresh token revoked or repeatedly failing; the user must reconnect'),
+        ),
+        migrations.AddField(
+            model_name='googletoken',
+            name='refresh_failures',
+            field=models.PositiveIntegerField(default=0, help_text='Consecutive failed refresh attempts'),
+        ),
+        migrations.AddIndex(
+            model_name='googletoken',
+            index=models.Index(fields=['token_expiry'], name='google_cal__token_e_707881_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_cal_sync', '0005_token_refresh_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_calendar_id', models.CharField(max_length=255)),
+                ('target_calendar_id', models.CharField(max_length=255)),
+                ('two_way', models.BooleanField(default=False)),
+                ('enabled', models.BooleanField(default=True)),
+                ('source_sync_token', models.TextField(blank=True, default='', help_text='Resume point for the source calendar')),
+                ('target_sync_token', models.TextField(blank=True, default='', help_text='Resume point for the target calendar')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_stats', models.JSONField(blank=True, default=dict)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_sources', to=settings.AUTH_USER_MODEL)),
+                ('target_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_targets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sync Pair',
+                'verbose_name_plural': 'Sync Pairs',
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(choices=[('source', 'Source'), ('target', 'Target')], help_text='Side the original event lives on', max_length=6)),
+                ('origin_event_id', models.CharField(max_length=1024)),
+                ('mirror_event_id', models.CharField(max_length=1024)),
+                ('content_hash', models.CharField(help_text='Hash of the content last written to the mirror', max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pair', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='google_cal_sync.syncpair')),
+            ],
+            options={
+                'verbose_name': 'Sync Link',
+                'verbose_name_plural': 'Sync Links',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncpair',
+            constraint=models.UniqueConstraint(fields=('source_user', 'source_calendar_id', 'target_user', 'target_calendar_id'), name='unique_sync_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='synclink',
+            constraint=models.UniqueConstraint(fields=('pair', 'origin', 'origin_event_id'), name='unique_sync_link'),
+        ),
+    ]
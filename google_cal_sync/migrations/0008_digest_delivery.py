@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_cal_sync', '0007_calendar_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Day the agenda covers')),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('empty', 'Nothing scheduled'), ('failed', 'Failed')], max_length=16)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Digest Delivery',
+                'verbose_name_plural': 'Digest Deliveries',
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_digest_delivery')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_cal_sync', '0008_digest_delivery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calendar_id', models.CharField(max_length=255)),
+                ('sync_token', models.TextField(blank=True, default='', help_text='Empty: the next read uses updatedMin')),
+                ('checked_at', models.DateTimeField(help_text='When Google was last asked for changes')),
+                ('version', models.BigIntegerField(default=0, help_text='Calendar cache version at that time')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_sync_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Calendar Sync State',
+                'verbose_name_plural': 'Calendar Sync States',
+                'constraints': [models.UniqueConstraint(fields=('user', 'calendar_id'), name='unique_calendar_sync_state')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calendar_id', models.CharField(max_length=255)),
+                ('event_id', models.CharField(max_length=1024)),
+                ('deleted', models.BooleanField(default=False)),
+                ('event', models.JSONField(blank=True, help_text="Google's event resource; empty for deletions", null=True)),
+                ('recorded_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Event Change',
+                'verbose_name_plural': 'Event Changes',
+                'indexes': [models.Index(fields=['user', 'id'], name='event_change_user_id')],
+            },
+        ),
+    ]
@@ -8,12 +8,276 @@ class GoogleToken(models.Model):
     access_token = models.TextField(help_text="Google OAuth2 access token")
     refresh_token = models.TextField(help_text="Google OAuth2 refresh token")
     token_expiry = models.DateTimeField(help_text="When the access token expires")
+    needs_reauth = models.BooleanField(
+        default=False, help_text="Refresh token revoked or repeatedly failing; the user must reconnect",
+    )
+    refresh_failures = models.PositiveIntegerField(default=0, help_text="Consecutive failed refresh attempts")
+    last_refresh_attempt = models.DateTimeField(null=True, blank=True)
+    last_refresh_error = models.TextField(blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Google Token"
         verbose_name_plural = "Google Tokens"
+        indexes = [
+            models.Index(fields=['token_expiry']),
+        ]
 
     def __str__(self):
         return f"GoogleToken for {self.user.username}"
+
+
+class IndexedEvent(models.Model):
+    """
+    Local copy of the searchable fields of a Google Calendar event.
+    Kept in sync as events are fetched or written so search never hits the API.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='indexed_events')
+    calendar_id = models.CharField(max_length=255)
+    event_id = models.CharField(max_length=255)
+    summary = models.TextField(blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    location = models.TextField(blank=True, default='')
+    start_text = models.CharField(max_length=64, blank=True, default='')
+    start = models.DateTimeField(null=True, blank=True)
+    end = models.DateTimeField(null=True, blank=True)
+    updated = models.CharField(max_length=64, blank=True, default='', help_text="Google's 'updated' timestamp")
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Indexed Event"
+        verbose_name_plural = "Indexed Events"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'calendar_id', 'event_id'], name='unique_indexed_event'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'start']),
+            # Range scans by the reminder dispatcher (see reminders.py)
+            models.Index(fields=['start']),
+            models.Index(fields=['indexed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.summary} ({self.calendar_id})"
+
+
+class ImportJob(models.Model):
+    """Progress and per-row failures of a bulk .ics/CSV import."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    calendar_id = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    file_format = models.CharField(max_length=8)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    failures = models.JSONField(default=list, blank=True, help_text="First failing rows as [row, message] pairs")
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import of {self.filename} for {self.user.username}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
+
+class SentReminder(models.Model):
+    """
+    A reminder claimed by the dispatcher. The row is inserted before the sink
+    is called, so concurrent or restarted dispatchers never send it twice.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_reminders')
+    calendar_id = models.CharField(max_length=255)
+    event_id = models.CharField(max_length=255)
+    remind_at = models.DateTimeField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+    error = models.TextField(blank=True, default='', help_text="Sink error, if delivery failed")
+
+    class Meta:
+        verbose_name = "Sent Reminder"
+        verbose_name_plural = "Sent Reminders"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'calendar_id', 'event_id', 'remind_at'], name='unique_sent_reminder',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.event_id} at {self.remind_at}"
+
+
+class SyncPair(models.Model):
+    """
+    Mirror events from one calendar into another, possibly of another user.
+    With two_way set, changes made on the target are mirrored back as well.
+    """
+    source_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_sources')
+    source_calendar_id = models.CharField(max_length=255)
+    target_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_targets')
+    target_calendar_id = models.CharField(max_length=255)
+    two_way = models.BooleanField(default=False)
+    enabled = models.BooleanField(default=True)
+    source_sync_token = models.TextField(blank=True, default='', help_text="Resume point for the source calendar")
+    target_sync_token = models.TextField(blank=True, default='', help_text="Resume point for the target calendar")
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_stats = models.JSONField(default=dict, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Sync Pair"
+        verbose_name_plural = "Sync Pairs"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_user', 'source_calendar_id', 'target_user', 'target_calendar_id'],
+                name='unique_sync_pair',
+            ),
+        ]
+
+    def __str__(self):
+        arrow = '<->' if self.two_way else '->'
+        return f"{self.source_user.username}:{self.source_calendar_id} {arrow} {self.target_user.username}:{self.target_calendar_id}"
+
+
+class SyncLink(models.Model):
+    """An event and its mirror on the other side of a SyncPair."""
+    SOURCE = 'source'
+    TARGET = 'target'
+    ORIGIN_CHOICES = [
+        (SOURCE, 'Source'),
+        (TARGET, 'Target'),
+    ]
+
+    pair = models.ForeignKey(SyncPair, on_delete=models.CASCADE, related_name='links')
+    origin = models.CharField(max_length=6, choices=ORIGIN_CHOICES, help_text="Side the original event lives on")
+    origin_event_id = models.CharField(max_length=1024)
+    mirror_event_id = models.CharField(max_length=1024)
+    content_hash = models.CharField(max_length=64, help_text="Hash of the content last written to the mirror")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Sync Link"
+        verbose_name_plural = "Sync Links"
+        constraints = [
+            models.UniqueConstraint(fields=['pair', 'origin', 'origin_event_id'], name='unique_sync_link'),
+        ]
+
+    def __str__(self):
+        return f"{self.origin_event_id} -> {self.mirror_event_id}"
+
+
+class CalendarFeed(models.Model):
+    """
+    A secret .ics subscription URL for one calendar. Anyone holding the token
+    can read the calendar, so revoking deletes the row.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_feeds')
+    calendar_id = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, blank=True, default='', help_text="Calendar name shown by subscribers")
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Calendar Feed"
+        verbose_name_plural = "Calendar Feeds"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'calendar_id'], name='unique_calendar_feed'),
+        ]
+
+    def __str__(self):
+        return f"Feed of {self.calendar_id} for {self.user.username}"
+
+
+class DigestDelivery(models.Model):
+    """
+    Outcome of one user's agenda digest for a day. `send_digests` skips users
+    whose digest for the day was sent (or had nothing to send), so a rerun
+    picks up where an interrupted one stopped and retries failures.
+    """
+    STATUS_SENT = 'sent'
+    STATUS_EMPTY = 'empty'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_SENT, 'Sent'),
+        (STATUS_EMPTY, 'Nothing scheduled'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='digest_deliveries')
+    day = models.DateField(help_text="Day the agenda covers")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES)
+    events = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Digest Delivery"
+        verbose_name_plural = "Digest Deliveries"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_digest_delivery'),
+        ]
+
+    def __str__(self):
+        return f"Digest of {self.day} for {self.user.username}"
+
+
+class CalendarSyncState(models.Model):
+    """Where the change feed (google_cal_sync/changes.py) last read a calendar from Google."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_sync_states')
+    calendar_id = models.CharField(max_length=255)
+    sync_token = models.TextField(blank=True, default='', help_text="Empty: the next read uses updatedMin")
+    checked_at = models.DateTimeField(help_text="When Google was last asked for changes")
+    version = models.BigIntegerField(default=0, help_text="Calendar cache version at that time")
+
+    class Meta:
+        verbose_name = "Calendar Sync State"
+        verbose_name_plural = "Calendar Sync States"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'calendar_id'], name='unique_calendar_sync_state'),
+        ]
+
+    def __str__(self):
+        return f"Sync state of {self.calendar_id} for {self.user.username}"
+
+
+class EventChange(models.Model):
+    """
+    An event created, updated or deleted, as seen by the change feed. Change
+    feed cursors point into this log by id.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_changes')
+    calendar_id = models.CharField(max_length=255)
+    event_id = models.CharField(max_length=1024)
+    deleted = models.BooleanField(default=False)
+    event = models.JSONField(null=True, blank=True, help_text="Google's event resource; empty for deletions")
+    recorded_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Event Change"
+        verbose_name_plural = "Event Changes"
+        indexes = [
+            models.Index(fields=['user', 'id'], name='event_change_user_id'),
+        ]
+
+    def __str__(self):
+        return f"{'Deletion' if self.deleted else 'Change'} of {self.event_id} in {self.calendar_id}"
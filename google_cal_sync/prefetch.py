@@ -0,0 +1,192 @@
+"""
+Speculative prefetch of what a user is likely to open next.
+
+After a page is served, views hand the prefetcher the cache entries a next
+click would need: the same list for the user's other calendars, or the next
+and previous grid windows. A small thread pool (PREFETCH_WORKERS) loads each
+one through the normal cached readers, so a later page finds it warm.
+
+Prefetching only spends capacity that is spare:
+  * the queue is bounded (QUEUE_SIZE); tasks beyond it are dropped;
+  * each user may cause PREFETCH_USER_BUDGET upstream fetches per minute
+    (counted in the shared cache, so across workers); entries already
+    cached don't count;
+  * under load (event reads circuit not closed, throttling or a slow p95 in
+    the last LOAD_WINDOW seconds) nothing is queued and queued tasks are
+    cancelled. A task that waited longer than MAX_TASK_AGE is dropped too.
+
+Every filled entry leaves a marker with the calendar version it was loaded
+at. When a page later reads that entry at the same version, the marker is
+claimed and counted as used. used / filled is the prefetch hit rate. Counters
+live in the shared cache so every worker reports the same numbers.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from . import circuit, google_client
+from .caching import (
+    cache_namespace,
+    calendar_version,
+    canonical_calendar_id,
+    get_events_window,
+    get_upcoming_events,
+    peek_cached,
+)
+from .metrics import health
+from .utils import get_calendar_service
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 32
+# Candidates taken from one page view
+MAX_PER_PAGE = 4
+MAX_TASK_AGE = 10
+LOAD_WINDOW = 60
+SLOW_P95_MS = 1500
+COUNTERS = ('scheduled', 'filled', 'used', 'cached', 'over_budget', 'dropped', 'cancelled', 'failed')
+
+
+def _marker_key(user_id, calendar_id, spec):
+    return f"gcs:pf:m:{user_id}:{calendar_id}:{':'.join(str(part) for part in spec)}"
+
+
+def _budget_key(user_id, minute):
+    return f'gcs:pf:b:{user_id}:{minute}'
+
+
+def _counter_key(name):
+    return f'gcs:pf:n:{name}'
+
+
+def _count(name):
+    key = _counter_key(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def under_load():
+    """Whether Google or this worker's view of it looks busy; prefetching would compete with pages."""
+    if circuit.get_breaker('events_read').snapshot()['state'] != circuit.CLOSED:
+        return True
+    recent = health.summary('all', window=LOAD_WINDOW)
+    return recent['throttled'] > 0 or recent['p95_ms'] > SLOW_P95_MS
+
+
+def _load(user, service, calendar_id, spec):
+    if spec[0] == 'upcoming':
+        get_upcoming_events(user, service, calendar_id, spec[1])
+    else:
+        get_events_window(user, service, calendar_id, spec[1], spec[2])
+
+
+class Prefetcher:
+    """Bounded background loader for one process; see the module docstring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.queued = {}
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=settings.PREFETCH_WORKERS, thread_name_prefix='prefetch')
+        return self.executor
+
+    def record_use(self, user, calendar_id, spec):
+        """Note that a page read (calendar_id, spec); claims a prefetch of it, if any."""
+        calendar_id = canonical_calendar_id(user.pk, calendar_id)
+        key = _marker_key(user.pk, calendar_id, spec)
+        version = cache.get(key)
+        if version is not None:
+            cache.delete(key)
+            if version == calendar_version(cache_namespace(user, calendar_id), calendar_id):
+                _count('used')
+
+    def schedule(self, user, wanted):
+        """Queue background loads of [(calendar_id, spec)] the user may open next."""
+        if settings.PREFETCH_WORKERS <= 0 or not wanted:
+            return
+        if under_load():
+            self.cancel_queued()
+            return
+        with self.lock:
+            for calendar_id, spec in wanted[:MAX_PER_PAGE]:
+                key = (user.pk, calendar_id, spec)
+                if key in self.queued:
+                    continue
+                if len(self.queued) >= QUEUE_SIZE:
+                    _count('dropped')
+                    continue
+                self.queued[key] = self._executor().submit(self._run, user, calendar_id, spec, time.monotonic())
+                _count('scheduled')
+
+    def cancel_queued(self):
+        """Cancel tasks that haven't started yet."""
+        with self.lock:
+            futures = list(self.queued.items())
+        for key, future in futures:
+            if future.cancel():
+                with self.lock:
+                    self.queued.pop(key, None)
+                _count('cancelled')
+
+    def _take_budget(self, user_id):
+        key = _budget_key(user_id, int(time.time() // 60))
+        cache.add(key, 0, 120)
+        try:
+            return cache.incr(key) <= settings.PREFETCH_USER_BUDGET
+        except ValueError:
+            return False
+
+    def _run(self, user, calendar_id, spec, queued_at):
+        try:
+            if time.monotonic() - queued_at > MAX_TASK_AGE or under_load():
+                _count('cancelled')
+                return
+            if peek_cached(user, calendar_id, spec) is not None:
+                _count('cached')
+                return
+            if not self._take_budget(user.pk):
+                _count('over_budget')
+                return
+            service = get_calendar_service(user)
+            if service is None:
+                return
+            canonical = canonical_calendar_id(user.pk, calendar_id)
+            version = calendar_version(cache_namespace(user, canonical), canonical)
+            _load(user, service, calendar_id, spec)
+            # A stale fallback copy isn't stored under the current version
+            if peek_cached(user, calendar_id, spec) is not None:
+                cache.set(_marker_key(user.pk, canonical, spec), version, settings.CALENDAR_CACHE_TTL)
+                _count('filled')
+        except google_client.HttpError as error:
+            _count('failed')
+            logger.info("Prefetch of %s %s for user %s failed: %s", calendar_id, spec, user.pk, error)
+        except Exception:
+            _count('failed')
+            logger.exception("Prefetch of %s %s for user %s failed", calendar_id, spec, user.pk)
+        finally:
+            with self.lock:
+                self.queued.pop((user.pk, calendar_id, spec), None)
+            # A pool thread's connection would otherwise stay open under CONN_MAX_AGE
+            connection.close()
+
+    def stats(self):
+        """Counters across workers, this worker's queue length and the hit rate (used / filled)."""
+        values = cache.get_many([_counter_key(name) for name in COUNTERS])
+        counters = {name: values.get(_counter_key(name), 0) for name in COUNTERS}
+        with self.lock:
+            counters['queued'] = len(self.queued)
+        counters['hit_rate'] = round(counters['used'] / counters['filled'], 3) if counters['filled'] else None
+        return counters
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,236 @@
+"""
+Opt-in per-request CPU profiling.
+
+With settings.PROFILING_ENABLED off, the middleware raises MiddlewareNotUsed
+at start-up and is dropped from the chain, so it costs nothing.
+
+With it on, a request is profiled with cProfile when either
+  * a staff user adds `?_profile=1`, or
+  * the request carries an `X-Profile-Token` header made by make_profile_token()
+    (for curl or a load balancer, where there is no staff session). Each token
+    profiles one request; replays are served normally.
+
+The raw .prof file and a plain-text report go to settings.PROFILE_DIR. The
+response gets a `Link: <...>; rel="profile"` header pointing at the report.
+Reports older than settings.PROFILE_MAX_AGE are removed, and only the newest
+settings.PROFILE_MAX_FILES are kept.
+The report splits self time into Google client code, DB access, template
+rendering and this app's utils.py (normalize_event separately). It also lists
+cumulative time per utils.py function and the SQL queries with their wall time.
+
+Streaming responses are only profiled up to the point the view returns.
+
+Under ASGI the middleware runs in the async chain. Requests that don't ask for
+a profile pass straight through. Those that do are handed to a thread, and
+the rest of the chain runs from there, so sync views and their queries land
+in that thread's profile. Async views still run on the event loop and show
+up as time waited.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+import uuid
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+
+
+TOKEN_SALT = 'google_cal_sync.profiling'
+TOKEN_MAX_AGE = 60 * 60
+PROFILE_NAME_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# (category, path fragment) in match order; the first hit wins
+CATEGORIES = [
+    ('normalize_event', None),
+    ('utils.py', os.path.join('google_cal_sync', 'utils.py')),
+    ('google client', os.sep + 'googleapiclient' + os.sep),
+    ('google client', os.sep + 'google' + os.sep + 'auth' + os.sep),
+    ('google client', os.sep + 'httplib2' + os.sep),
+    ('db', os.path.join('django', 'db') + os.sep),
+    ('db', 'sqlite3'),
+    ('db', 'psycopg'),
+    ('templates', os.path.join('django', 'template') + os.sep),
+    ('app', os.sep + 'google_cal_sync' + os.sep),
+    ('django (other)', os.sep + 'django' + os.sep),
+]
+
+
+def make_profile_token():
+    """A signed, single-use token for the X-Profile-Token header, valid for an hour."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def _used_token_key(nonce):
+    return f'gcs:profile:used:{nonce}'
+
+
+def _has_valid_token(request):
+    token = request.headers.get('X-Profile-Token')
+    if not token:
+        return False
+    try:
+        nonce = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    # Spend the token; it can't be replayed while it is still within max_age
+    return cache.add(_used_token_key(nonce), 1, TOKEN_MAX_AGE)
+
+
+def asks_for_profile(request):
+    """Whether the request wants a profile at all; checked without I/O."""
+    return bool(request.GET.get('_profile')) or 'X-Profile-Token' in request.headers
+
+
+def should_profile(request):
+    user = getattr(request, 'user', None)
+    if request.GET.get('_profile') and user is not None and user.is_staff:
+        return True
+    return _has_valid_token(request)
+
+
+def profile_path(name, extension):
+    return os.path.join(settings.PROFILE_DIR, f'{name}.{extension}')
+
+
+def sweep_profiles():
+    """Delete reports past PROFILE_MAX_AGE, then all but the newest PROFILE_MAX_FILES."""
+    try:
+        entries = list(os.scandir(settings.PROFILE_DIR))
+    except FileNotFoundError:
+        return
+    written = {}
+    for entry in entries:
+        name, _, extension = entry.name.partition('.')
+        if extension in ('prof', 'txt') and PROFILE_NAME_RE.match(name):
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            written[name] = max(written.get(name, 0.0), mtime)
+
+    cutoff = time.time() - settings.PROFILE_MAX_AGE
+    fresh = sorted((name for name in written if written[name] >= cutoff), key=written.get, reverse=True)
+    expired = [name for name in written if written[name] < cutoff] + fresh[settings.PROFILE_MAX_FILES:]
+    for name in expired:
+        for extension in ('prof', 'txt'):
+            try:
+                os.remove(profile_path(name, extension))
+            except FileNotFoundError:
+                pass
+
+
+def _category(filename, function):
+    for category, fragment in CATEGORIES:
+        if fragment is None:
+            if function == category:
+                return category
+        elif fragment in filename:
+            return category
+    return 'other'
+
+
+def build_report(request, stats, queries, wall_time):
+    """Plain-text attribution summary for one profiled request."""
+    totals = {}
+    utils_functions = []
+    for (filename, _, function), (_, _, tottime, cumtime, _) in stats.stats.items():
+        category = _category(filename, function)
+        totals[category] = totals.get(category, 0.0) + tottime
+        if category in ('utils.py', 'normalize_event'):
+            utils_functions.append((cumtime, function))
+
+    lines = [
+        f"{request.method} {request.get_full_path()}",
+        f"Wall time: {wall_time * 1000:.1f} ms, profiled CPU: {stats.total_tt * 1000:.1f} ms",
+        "",
+        "Self time by area:",
+    ]
+    for category, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        lines.append(f"  {category:<16} {seconds * 1000:>9.1f} ms")
+
+    lines += ["", "utils.py functions (cumulative):"]
+    for cumtime, function in sorted(utils_functions, reverse=True):
+        lines.append(f"  {function:<32} {cumtime * 1000:>9.1f} ms")
+
+    lines += ["", f"SQL queries: {len(queries)} in {sum(d for _, d in queries) * 1000:.1f} ms"]
+    for sql, duration in sorted(queries, key=lambda query: -query[1])[:20]:
+        lines.append(f"  {duration * 1000:>7.1f} ms  {sql[:160]}")
+
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats('cumulative').print_stats(40)
+    lines += ["", output.getvalue()]
+    return '\n'.join(lines)
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it; see the module docstring."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not asks_for_profile(request) or not should_profile(request):
+            return self.get_response(request)
+        return self._profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not asks_for_profile(request):
+            return await self.get_response(request)
+        # should_profile may load the user and spend a token; both are sync I/O
+        return await sync_to_async(self._profile_if_allowed)(request)
+
+    def _profile_if_allowed(self, request):
+        get_response = async_to_sync(self.get_response)
+        if not should_profile(request):
+            return get_response(request)
+        return self._profile(request, get_response)
+
+    def _profile(self, request, get_response):
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((sql, time.perf_counter() - started))
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with connections['default'].execute_wrapper(record_query):
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        wall_time = time.perf_counter() - started
+
+        name = uuid.uuid4().hex
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(profile_path(name, 'prof'))
+        with open(profile_path(name, 'txt'), 'w') as report:
+            report.write(build_report(request, stats, queries, wall_time))
+        sweep_profiles()
+
+        url = reverse('google_cal_sync:profile_report', args=[name])
+        link = f'<{url}>; rel="profile"'
+        response['Link'] = f"{response['Link']}, {link}" if response.has_header('Link') else link
+        return response
@@ -0,0 +1,249 @@
+"""
+Reminder dispatcher for indexed events.
+
+A reminder fires REMINDER_MINUTES before an event in the local index
+(IndexedEvent) starts. Only the reminders due within the next `horizon` are
+held in memory, in a heap keyed by fire time. Everything later stays in the
+database until the horizon slides over it, so memory is bounded by the
+horizon, not by the total number of pending reminders.
+
+Changes are picked up incrementally: each poll reads the rows whose
+indexed_at moved since the last poll and pushes fresh heap entries.
+Superseded entries are not removed from the heap. They are dropped when they
+reach the top and no longer match the event (lazy deletion). Rows deleted from
+the index are caught by re-reading the due events just before they fire.
+
+Events the app has never fetched are not in the index and get no reminders.
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import IndexedEvent, SentReminder
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON = timedelta(minutes=30)
+DEFAULT_POLL_INTERVAL = 5.0
+# Re-read a little of the previous poll window: rows committed late carry an
+# indexed_at slightly older than the last one seen
+POLL_OVERLAP = timedelta(seconds=2)
+LOAD_CHUNK_SIZE = 2000
+
+
+class ReminderSink:
+    """Delivers one reminder. Subclasses implement send()."""
+
+    def send(self, event, minutes_before):
+        raise NotImplementedError
+
+
+class EmailReminderSink(ReminderSink):
+    """Emails the event owner through Django's configured email backend."""
+
+    def send(self, event, minutes_before):
+        if not event.user.email:
+            return
+        start = timezone.localtime(event.start).strftime('%Y-%m-%d %H:%M')
+        body = f"{event.summary or 'Untitled event'} starts at {start}."
+        if event.location:
+            body += f"\nLocation: {event.location}"
+        send_mail(
+            subject=f"Reminder: {event.summary or 'Untitled event'} in {minutes_before} min",
+            message=body,
+            from_email=None,
+            recipient_list=[event.user.email],
+        )
+
+
+class WebhookReminderSink(ReminderSink):
+    """POSTs the reminder as JSON to settings.REMINDER_WEBHOOK_URL."""
+
+    timeout = 5
+
+    def send(self, event, minutes_before):
+        payload = json.dumps({
+            'user': event.user.username,
+            'calendar_id': event.calendar_id,
+            'event_id': event.event_id,
+            'summary': event.summary,
+            'location': event.location,
+            'start': event.start.isoformat(),
+            'minutes_before': minutes_before,
+        }).encode()
+        request = urllib.request.Request(
+            settings.REMINDER_WEBHOOK_URL, data=payload, headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def get_sink(path=None):
+    """Instantiate the sink named by `path` or settings.REMINDER_SINK."""
+    return import_string(path or settings.REMINDER_SINK)()
+
+
+class ReminderScheduler:
+    """
+    Heap of reminders due within the horizon, refilled from the database as
+    time passes and updated from incremental index changes.
+    """
+
+    def __init__(self, sink, offsets=None, horizon=DEFAULT_HORIZON, poll_interval=DEFAULT_POLL_INTERVAL,
+                 max_workers=4):
+        self.sink = sink
+        self.offsets = sorted(set(offsets or settings.REMINDER_MINUTES))
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.heap = []
+        # (event pk, offset) -> event start of the one valid heap entry
+        self.live = {}
+        self.counter = itertools.count()
+        self.loaded_until = None
+        self.last_indexed_at = None
+        self.failures = deque()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='reminder-sink')
+        self.stats = {'sent': 0, 'failed': 0, 'skipped': 0, 'max_drift': 0.0}
+
+    def _push(self, pk, offset, start):
+        fire_at = start - timedelta(minutes=offset)
+        self.live[(pk, offset)] = start
+        heapq.heappush(self.heap, (fire_at, next(self.counter), pk, offset, start))
+
+    def refill(self, now):
+        """Load every reminder firing in [loaded_until, now + horizon)."""
+        window_start = self.loaded_until or now
+        window_end = now + self.horizon
+        if window_end <= window_start:
+            return 0
+        if self.last_indexed_at is None:
+            # Changes before this point are covered by the initial load
+            self.last_indexed_at = timezone.now()
+        loaded = 0
+        for offset in self.offsets:
+            delta = timedelta(minutes=offset)
+            rows = IndexedEvent.objects.filter(
+                start__gte=window_start + delta, start__lt=window_end + delta,
+            ).values_list('pk', 'start')
+            for pk, start in rows.iterator(chunk_size=LOAD_CHUNK_SIZE):
+                self._push(pk, offset, start)
+                loaded += 1
+        self.loaded_until = window_end
+        return loaded
+
+    def poll_changes(self, now):
+        """Re-schedule events whose index row changed since the last poll."""
+        if self.loaded_until is None:
+            return 0
+        since = self.last_indexed_at - POLL_OVERLAP
+        rows = (
+            IndexedEvent.objects.filter(indexed_at__gt=since)
+            .order_by('indexed_at')
+            .values_list('pk', 'start', 'indexed_at')
+        )
+        changed = 0
+        for pk, start, indexed_at in rows.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            self.last_indexed_at = max(self.last_indexed_at, indexed_at)
+            for offset in self.offsets:
+                key = (pk, offset)
+                fire_at = start - timedelta(minutes=offset) if start else None
+                if fire_at is None or not (now <= fire_at < self.loaded_until):
+                    # Outside the loaded window: a later refill picks it up
+                    self.live.pop(key, None)
+                elif self.live.get(key) != start:
+                    self._push(pk, offset, start)
+                    changed += 1
+        return changed
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, _, pk, offset, start = heapq.heappop(self.heap)
+            if self.live.get((pk, offset)) != start:
+                continue
+            del self.live[(pk, offset)]
+            due.append((fire_at, pk, offset, start))
+        return due
+
+    def _claim(self, event, fire_at):
+        try:
+            with transaction.atomic():
+                return SentReminder.objects.create(
+                    user_id=event.user_id, calendar_id=event.calendar_id, event_id=event.event_id, remind_at=fire_at,
+                )
+        except IntegrityError:
+            return None
+
+    def _deliver(self, claim, event, offset, fire_at):
+        try:
+            self.sink.send(event, offset)
+        except Exception as error:
+            self.failures.append((claim.pk, str(error)))
+            return
+        drift = (timezone.now() - fire_at).total_seconds()
+        self.stats['max_drift'] = max(self.stats['max_drift'], drift)
+
+    def fire_due(self, now):
+        """Claim and hand every due reminder to the sink. Returns how many were sent."""
+        due = self._pop_due(now)
+        if not due:
+            return 0
+        events = IndexedEvent.objects.select_related('user').in_bulk([pk for _, pk, _, _ in due])
+        sent = 0
+        for fire_at, pk, offset, start in due:
+            event = events.get(pk)
+            # Deleted from the index, or moved since it was scheduled
+            if event is None or event.start != start:
+                self.stats['skipped'] += 1
+                continue
+            claim = self._claim(event, fire_at)
+            if claim is None:
+                self.stats['skipped'] += 1
+                continue
+            self.executor.submit(self._deliver, claim, event, offset, fire_at)
+            sent += 1
+        self.stats['sent'] += sent
+        return sent
+
+    def record_failures(self):
+        while self.failures:
+            claim_pk, message = self.failures.popleft()
+            SentReminder.objects.filter(pk=claim_pk).update(error=message[:1000])
+            self.stats['failed'] += 1
+            logger.warning("Reminder %s failed: %s", claim_pk, message)
+
+    def run(self, stop_event=None):
+        """Dispatch until `stop_event` is set."""
+        stop_event = stop_event or threading.Event()
+        next_poll = next_refill = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                now = timezone.now()
+                if time.monotonic() >= next_refill:
+                    self.refill(now)
+                    next_refill = time.monotonic() + self.horizon.total_seconds() / 2
+                if time.monotonic() >= next_poll:
+                    self.poll_changes(now)
+                    next_poll = time.monotonic() + self.poll_interval
+                self.fire_due(timezone.now())
+                self.record_failures()
+
+                wait = min(next_poll, next_refill) - time.monotonic()
+                if self.heap:
+                    wait = min(wait, (self.heap[0][0] - timezone.now()).total_seconds())
+                stop_event.wait(max(0.0, wait))
+        finally:
+            self.executor.shutdown(wait=True)
+            self.record_failures()
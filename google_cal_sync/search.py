@@ -0,0 +1,116 @@
+"""
+Local full-text index of event summary, description and location.
+
+SQLite uses an FTS5 table kept in step by triggers; PostgreSQL uses a generated
+tsvector column with a GIN index (both created in migration 0002). Any other
+backend falls back to case-insensitive substring matching.
+"""
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import IndexedEvent
+from .utils import parse_google_datetime
+
+
+TABLE = IndexedEvent._meta.db_table
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _event_fields(event):
+    """Extract indexable columns from a normalized event."""
+    raw = event.get('raw') or {}
+    start = raw.get('start', {}) or {}
+    end = raw.get('end', {}) or {}
+    return {
+        'summary': event.get('summary') or '',
+        'description': raw.get('description') or '',
+        'location': event.get('location') or '',
+        'start_text': (event.get('start_text') or '')[:64],
+        'start': parse_google_datetime(start.get('dateTime') or start.get('date')),
+        'end': parse_google_datetime(end.get('dateTime') or end.get('date')),
+        'updated': raw.get('updated') or '',
+    }
+
+
+def index_events(user, calendar_id, events):
+    """
+    Upsert normalized events into the index.
+    Rows whose Google 'updated' stamp hasn't changed are skipped, and
+    cancelled events are removed. Returns the number of rows written.
+    """
+    if not user or not events:
+        return 0
+
+    cancelled = [e['id'] for e in events if e.get('id') and e.get('status') == 'cancelled']
+    live = [e for e in events if e.get('id') and e.get('status') != 'cancelled']
+    if cancelled:
+        remove_events(user, calendar_id, cancelled)
+    if not live:
+        return 0
+
+    known = dict(
+        IndexedEvent.objects.filter(
+            user=user,
+            calendar_id=calendar_id,
+            event_id__in=[e['id'] for e in live],
+        ).values_list('event_id', 'updated')
+    )
+
+    rows = []
+    for event in live:
+        fields = _event_fields(event)
+        if fields['updated'] and known.get(event['id']) == fields['updated']:
+            continue
+        rows.append(IndexedEvent(user=user, calendar_id=calendar_id, event_id=event['id'], **fields))
+
+    if rows:
+        IndexedEvent.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user', 'calendar_id', 'event_id'],
+            update_fields=['summary', 'description', 'location', 'start_text', 'start', 'end', 'updated', 'indexed_at'],
+        )
+    return len(rows)
+
+
+def remove_events(user, calendar_id, event_ids):
+    """Drop events from the index (e.g. after a delete)."""
+    if not user or not event_ids:
+        return
+    IndexedEvent.objects.filter(user=user, calendar_id=calendar_id, event_id__in=list(event_ids)).delete()
+
+
+def search_events(user, query, limit=50):
+    """
+    Full-text search over the user's indexed events, best matches first.
+    Every term must match; the last term also matches as a prefix.
+    """
+    terms = TOKEN_RE.findall(query or '')
+    if not user or not terms:
+        return []
+
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"' for term in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        sql = (
+            f'SELECT e.* FROM {TABLE}_fts f JOIN {TABLE} e ON e.id = f.rowid '
+            f'WHERE {TABLE}_fts MATCH %s AND e.user_id = %s '
+            f'ORDER BY f.rank LIMIT %s'
+        )
+        return list(IndexedEvent.objects.raw(sql, [match, user.pk, limit]))
+
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        sql = (
+            f"SELECT * FROM {TABLE} "
+            f"WHERE user_id = %s AND search_vector @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, start "
+            f"LIMIT %s"
+        )
+        return list(IndexedEvent.objects.raw(sql, [user.pk, tsquery, tsquery, limit]))
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(summary__icontains=term) | Q(description__icontains=term) | Q(location__icontains=term)
+    return list(IndexedEvent.objects.filter(condition, user=user).order_by('start')[:limit])
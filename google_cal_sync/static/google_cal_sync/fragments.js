@@ -0,0 +1,32 @@
+// Loads the parts of a page that were rendered as placeholders because their
+// data wasn't cached yet. All fragments are requested at once and each is
+// swapped in as soon as it arrives, then announced with a 'fragmentloaded'
+// event on the document (detail: {name, ok}).
+(function () {
+    function settle(slot, html, ok) {
+        var name = slot.getAttribute('data-fragment');
+        var template = document.createElement('template');
+        template.innerHTML = html.trim();
+        slot.replaceWith(template.content);
+        document.querySelectorAll('[data-fragment-pending="' + name + '"]').forEach(function (node) {
+            if (ok) {
+                node.hidden = true;
+            } else {
+                node.textContent = 'Unavailable';
+            }
+        });
+        document.dispatchEvent(new CustomEvent('fragmentloaded', {detail: {name: name, ok: ok}}));
+    }
+
+    document.querySelectorAll('[data-fragment-url]').forEach(function (slot) {
+        fetch(slot.getAttribute('data-fragment-url'), {credentials: 'same-origin'})
+            .then(function (response) {
+                return response.text().then(function (html) {
+                    settle(slot, html, response.ok);
+                });
+            })
+            .catch(function () {
+                settle(slot, '<div class="fragment-error">Couldn\'t load this part. Reload the page to try again.</div>', false);
+            });
+    });
+})();
@@ -0,0 +1,89 @@
+// Applies live event changes (Server-Sent Events from /events/live/) to the
+// page's event list in place: cards are inserted in start order, replaced or
+// removed, and the dashboard's summary cards follow the list.
+(function start() {
+    var list = document.querySelector('[data-live-url]');
+    if (!list) {
+        // It may arrive later as a fragment (fragments.js)
+        document.addEventListener('fragmentloaded', function retry() {
+            if (document.querySelector('[data-live-url]')) {
+                document.removeEventListener('fragmentloaded', retry);
+                start();
+            }
+        });
+        return;
+    }
+    var limit = parseInt(list.getAttribute('data-live-limit'), 10) || 0;
+
+    function cards() {
+        return Array.prototype.slice.call(list.querySelectorAll('[data-event-id]'));
+    }
+
+    function setHidden(selector, hidden) {
+        document.querySelectorAll(selector).forEach(function (node) {
+            node.hidden = hidden;
+        });
+    }
+
+    function refreshSummary() {
+        var current = cards();
+        var next = current[0];
+        list.hidden = current.length === 0;
+        setHidden('[data-live-empty]', current.length > 0);
+        setHidden('[data-live-next]', !next);
+        setHidden('[data-live-none]', !!next);
+        document.querySelectorAll('[data-live-count]').forEach(function (node) {
+            node.textContent = current.length;
+        });
+        if (next) {
+            document.querySelectorAll('[data-live-next-title]').forEach(function (node) {
+                node.textContent = next.getAttribute('data-summary');
+            });
+            document.querySelectorAll('[data-live-next-time]').forEach(function (node) {
+                node.textContent = next.getAttribute('data-start-text');
+            });
+        }
+    }
+
+    function apply(change) {
+        cards().forEach(function (card) {
+            if (card.getAttribute('data-event-id') === change.id) {
+                card.remove();
+            }
+        });
+        if (change.action === 'upsert') {
+            var current = cards();
+            var before = null;
+            for (var i = 0; i < current.length; i++) {
+                if (Number(current[i].getAttribute('data-start')) > change.start) {
+                    before = current[i];
+                    break;
+                }
+            }
+            // After the last card of a full list it isn't among the events this page shows
+            if (before || !limit || current.length < limit) {
+                var template = document.createElement('template');
+                template.innerHTML = change.html.trim();
+                list.insertBefore(template.content.firstElementChild, before);
+                current = cards();
+                if (limit && current.length > limit) {
+                    current[current.length - 1].remove();
+                }
+            }
+        }
+        refreshSummary();
+    }
+
+    refreshSummary();
+    if (!window.EventSource) {
+        return;
+    }
+    var source = new EventSource(list.getAttribute('data-live-url'));
+    source.addEventListener('change', function (message) {
+        apply(JSON.parse(message.data));
+    });
+    source.addEventListener('reload', function () {
+        source.close();
+        window.location.reload();
+    });
+})();
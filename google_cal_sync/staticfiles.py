@@ -0,0 +1,37 @@
+"""
+WhiteNoise for an async middleware chain.
+
+WhiteNoiseMiddleware (6.6) is sync-only. Under ASGI, Django runs everything
+below a sync-only middleware through the request's thread-sensitive executor,
+which holds a thread until the response ends. For a Server-Sent Events
+stream that is its whole lifetime. This subclass is async-capable: a request
+for a known static file is served as before, and anything else goes on down
+the chain without leaving the event loop.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens the file; a short trip to a pool thread, not one held per response
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
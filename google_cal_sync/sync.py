@@ -0,0 +1,509 @@
+"""
+Calendar-to-calendar sync engine.
+
+A SyncPair mirrors every event of a source calendar into a target calendar,
+which may belong to another connected account. Each mirror carries private
+extendedProperties naming the pair, the origin event and a hash of the synced
+content. SyncLink rows keep the same mapping locally. A full run rebuilds the
+links from the properties, so a lost table never leads to duplicate mirrors.
+
+A run reads the origin calendar's changes and computes the smallest diff.
+Each changed event becomes one of:
+
+- an insert: events.import with a stable iCalUID, so a retried insert
+  updates the mirror instead of duplicating it
+- a patch
+- a delete
+
+Events whose content hash matches the link are skipped. The diff is sent in
+batch requests. The first run lists the whole calendar. Later runs list only
+what changed since the stored syncToken; a 410 from Google falls back to a
+full run. The token only advances when every write succeeded. Re-listing a
+change is harmless because unchanged hashes are skipped.
+
+Loop prevention:
+  * Mirrors of a pair are never treated as origins by that pair. In two-way
+    mode an edit to a mirror is written back to its origin instead. Our own
+    writes come back with the hash the link already has and are ignored.
+  * Mirrors record the calendars their content has passed through (the
+    gcsPath property). An event is never mirrored into a calendar on its path,
+    so chains such as A -> B plus B -> A as separate pairs stop after one hop.
+
+If both copies changed between runs, the source side wins: it is synced first
+and the target's later change notification matches the new hash.
+
+Attendees, reminders and colours are not copied, so mirrors never send
+invitations.
+"""
+import hashlib
+import json
+import time
+from collections import namedtuple
+from datetime import timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from . import google_client, live
+from .caching import bump_calendar_version, canonical_calendar_id
+from .importer import BATCH_SIZE, MAX_RETRIES, is_retryable
+from .models import SyncLink, SyncPair
+from .search import index_events, remove_events
+from .utils import get_calendar_service, normalize_event, parse_google_datetime
+
+
+SYNC_FIELDS = ('summary', 'description', 'location', 'start', 'end', 'recurrence', 'transparency', 'visibility')
+PAIR_PROPERTY = 'gcsSyncPair'
+ORIGIN_PROPERTY = 'gcsOrigin'
+HASH_PROPERTY = 'gcsHash'
+PATH_PROPERTY = 'gcsPath'
+# Google caps extended property values at 1024 characters
+MAX_PROPERTY_LENGTH = 1024
+MAX_REPORTED_ERRORS = 20
+
+SOURCE = SyncLink.SOURCE
+TARGET = SyncLink.TARGET
+
+# One write against the calendar opposite the origin.
+# on_done(response) runs on success; on_missing() may return a replacement op for a 404/410
+SyncOp = namedtuple('SyncOp', 'action event_id body on_done on_missing')
+
+
+class SyncError(Exception):
+    """A pair cannot be synced at all (e.g. an account needs to reconnect)."""
+
+
+def _private(event):
+    return ((event.get('extendedProperties') or {}).get('private')) or {}
+
+
+def _normalize_time(value, keep_zone):
+    if not value:
+        return None
+    if value.get('date'):
+        return {'date': value['date']}
+    parsed = parse_google_datetime(value.get('dateTime'))
+    normalized = {'dateTime': parsed.astimezone(dt_timezone.utc).isoformat() if parsed else value.get('dateTime')}
+    # Recurrence rules expand in the event's zone, so it is part of the content
+    if keep_zone and value.get('timeZone'):
+        normalized['timeZone'] = value['timeZone']
+    return normalized
+
+
+def event_content(event):
+    """The synced fields of an event, normalized so equal content compares equal."""
+    content = {}
+    for field in SYNC_FIELDS:
+        value = event.get(field)
+        if value in (None, '', []):
+            continue
+        if field in ('start', 'end'):
+            value = _normalize_time(value, keep_zone=bool(event.get('recurrence')))
+        content[field] = value
+    return content
+
+
+def content_hash(event):
+    return hashlib.sha256(json.dumps(event_content(event), sort_keys=True).encode()).hexdigest()
+
+
+def calendar_key(user_id, calendar_id):
+    return f'{user_id}/{calendar_id}'
+
+
+def _content_body(event):
+    # Fields missing from the event are sent as null so a patch clears them
+    return {field: event.get(field) for field in SYNC_FIELDS}
+
+
+def _instance_id(instance_id, master_id, new_master_id):
+    """Map 'master_20260101T100000Z' onto the same occurrence of another series."""
+    if not instance_id.startswith(master_id + '_'):
+        return None
+    return new_master_id + instance_id[len(master_id):]
+
+
+def _status(error):
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def list_changes(service, calendar_id, sync_token=None, page_size=250):
+    """
+    (events, next_sync_token, full) for a calendar. Without a token, or when
+    Google rejects it as expired, every live event is listed.
+    """
+    params = {'calendarId': calendar_id, 'maxResults': page_size}
+    if sync_token:
+        params['syncToken'] = sync_token
+    events = []
+    page_token = None
+    while True:
+        try:
+            response = service.events().list(pageToken=page_token, **params).execute()
+        except google_client.HttpError as error:
+            if _status(error) == 410 and 'syncToken' in params:
+                return list_changes(service, calendar_id, None, page_size)
+            raise
+        events.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events, response.get('nextSyncToken', ''), 'syncToken' not in params
+
+
+def list_mirrors(service, calendar_id, pair_id, page_size=250):
+    """Live events on a calendar that the given pair created."""
+    events = []
+    page_token = None
+    while True:
+        response = service.events().list(
+            calendarId=calendar_id,
+            privateExtendedProperty=f'{PAIR_PROPERTY}={pair_id}',
+            maxResults=page_size,
+            pageToken=page_token,
+        ).execute()
+        events.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+class PairSync:
+    """One sync run of a SyncPair; see the module docstring."""
+
+    def __init__(self, pair, full=False):
+        self.pair = pair
+        self.force_full = full
+        self.stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'written_back': 0, 'unchanged': 0,
+                      'loops_skipped': 0, 'failed': 0, 'errors': []}
+        self.users = {SOURCE: pair.source_user, TARGET: pair.target_user}
+        self.calendars = {SOURCE: pair.source_calendar_id, TARGET: pair.target_calendar_id}
+        self.services = {}
+        # Per origin side: origin event ID -> SyncLink (saved or not)
+        self.links = {SOURCE: {}, TARGET: {}}
+        self.touched = {SOURCE: set(), TARGET: set()}
+        for link in pair.links.all():
+            self.links[link.origin][link.origin_event_id] = link
+
+    @staticmethod
+    def other(side):
+        return TARGET if side == SOURCE else SOURCE
+
+    def service(self, side):
+        if side not in self.services:
+            service = get_calendar_service(self.users[side])
+            if not service:
+                raise SyncError(f"{self.users[side].username} needs to reconnect their Google account.")
+            self.services[side] = service
+        return self.services[side]
+
+    def key(self, side):
+        return calendar_key(self.users[side].pk, self.calendars[side])
+
+    def run(self):
+        self.sync_direction(SOURCE)
+        if self.pair.two_way:
+            self.sync_direction(TARGET)
+        return self.stats
+
+    # Diff
+
+    def sync_direction(self, origin):
+        """Mirror changes on the `origin` side onto the other side."""
+        mirror_side = self.other(origin)
+        token_field = f'{origin}_sync_token'
+        token = '' if self.force_full else getattr(self.pair, token_field)
+        events, next_token, full = list_changes(self.service(origin), self.calendars[origin], token or None)
+        if full:
+            self.rebuild_links(origin)
+
+        # Mirrors on this side of events that originate on the other side
+        mirror_index = {link.mirror_event_id: link for link in self.links[mirror_side].values()}
+        ops = []
+        seen = set()
+        for event in events:
+            if _private(event).get(PAIR_PROPERTY) == str(self.pair.pk) or event['id'] in mirror_index:
+                if self.pair.two_way:
+                    ops.extend(self.diff_mirror(event, mirror_index))
+                continue
+            seen.add(event['id'])
+            ops.extend(self.diff_origin(origin, event))
+        if full:
+            for origin_id in set(self.links[origin]) - seen:
+                ops.extend(self.delete_mirror(origin, origin_id))
+
+        failed_before = self.stats['failed']
+        written, removed = self.apply(mirror_side, ops)
+        self.record_writes(mirror_side, written, removed)
+        with transaction.atomic():
+            self.save_links()
+            if self.stats['failed'] == failed_before and next_token:
+                setattr(self.pair, token_field, next_token)
+                self.pair.save(update_fields=[token_field])
+
+    def rebuild_links(self, origin):
+        """Reconcile links with the mirrors that actually exist (full runs only)."""
+        mirror_side = self.other(origin)
+        known = self.links[origin]
+        rebuilt = {}
+        duplicates = []
+        for mirror in list_mirrors(self.service(mirror_side), self.calendars[mirror_side], self.pair.pk):
+            origin_id = _private(mirror).get(ORIGIN_PROPERTY)
+            if not origin_id:
+                continue
+            if origin_id in rebuilt:
+                duplicates.append(mirror['id'])
+                continue
+            link = known.get(origin_id)
+            if link is None or link.mirror_event_id != mirror['id']:
+                link = SyncLink(pair=self.pair, origin=origin, origin_event_id=origin_id, mirror_event_id=mirror['id'],
+                                content_hash=_private(mirror).get(HASH_PROPERTY, ''))
+            rebuilt[origin_id] = link
+        # Recurring instances aren't listed as mirrors; keep their links while the series lives
+        for origin_id, link in known.items():
+            if origin_id not in rebuilt and any(_instance_id(origin_id, master, master) for master in rebuilt):
+                rebuilt[origin_id] = link
+        self.touched[origin] |= set(known) | set(rebuilt)
+        self.links[origin] = rebuilt
+        if duplicates:
+            ops = [self.delete_op(event_id, lambda response: self.count('deleted')) for event_id in duplicates]
+            self.apply(mirror_side, ops)
+
+    def diff_origin(self, origin, event):
+        """Ops for one changed event on the origin side."""
+        event_id = event['id']
+        master_id = event.get('recurringEventId')
+        master = self.links[origin].get(master_id) if master_id else None
+        if event.get('status') == 'cancelled':
+            if event_id not in self.links[origin] and master:
+                # A single occurrence was cancelled: cancel the same one in the mirrored series
+                mirror_id = _instance_id(event_id, master_id, master.mirror_event_id)
+                return [self.delete_op(mirror_id, lambda response: self.count('deleted'))] if mirror_id else []
+            return self.delete_mirror(origin, event_id)
+
+        path = [part for part in _private(event).get(PATH_PROPERTY, '').split(',') if part]
+        if self.key(self.other(origin)) in path:
+            self.count('loops_skipped')
+            return []
+
+        digest = content_hash(event)
+        link = self.links[origin].get(event_id)
+        if link is not None and link.content_hash == digest:
+            self.count('unchanged')
+            return []
+
+        body = _content_body(event)
+        path_value = ','.join(path + [self.key(origin)])
+        while len(path_value) > MAX_PROPERTY_LENGTH and ',' in path_value:
+            path_value = path_value.split(',', 1)[1]
+        body['extendedProperties'] = {'private': {
+            PAIR_PROPERTY: str(self.pair.pk),
+            ORIGIN_PROPERTY: event_id,
+            HASH_PROPERTY: digest,
+            PATH_PROPERTY: path_value,
+        }}
+
+        if master_id:
+            body.pop('recurrence')
+        if master_id and link is None:
+            # A changed occurrence of a series: patch the same occurrence of the mirrored series
+            mirror_id = _instance_id(event_id, master_id, master.mirror_event_id) if master else None
+            if not mirror_id:
+                self.count('unchanged')
+                return []
+            link = SyncLink(pair=self.pair, origin=origin, origin_event_id=event_id, mirror_event_id=mirror_id,
+                            content_hash='')
+
+        def linked(response):
+            self.links[origin][event_id] = SyncLink(
+                pair=self.pair, origin=origin, origin_event_id=event_id, mirror_event_id=response['id'],
+                content_hash=digest,
+            )
+            self.touched[origin].add(event_id)
+
+        def inserted(response):
+            linked(response)
+            self.count('inserted')
+
+        def updated(response):
+            linked(response)
+            self.count('updated')
+
+        insert = SyncOp('import', None, dict(body, iCalUID=f'{event_id}.{self.pair.pk}@calendar-sync'), inserted, None)
+        if link is None:
+            return [insert]
+        return [SyncOp('patch', link.mirror_event_id, body, updated, None if master_id else lambda: insert)]
+
+    def delete_mirror(self, origin, origin_id):
+        link = self.links[origin].get(origin_id)
+        if link is None:
+            return []
+
+        def deleted(response):
+            self.drop_link(origin, origin_id)
+            self.count('deleted')
+
+        return [self.delete_op(link.mirror_event_id, deleted)]
+
+    def diff_mirror(self, event, mirror_index):
+        """
+        Two-way mode: a mirror changed on this side. Our own writes come back
+        unchanged and are skipped; user edits are written back to the origin.
+        """
+        link = mirror_index.get(event['id'])
+        if link is None:
+            # An occurrence of a mirrored series edited for the first time
+            master = mirror_index.get(event.get('recurringEventId') or '')
+            origin_id = master and _instance_id(event['id'], master.mirror_event_id, master.origin_event_id)
+            if not origin_id or event.get('status') == 'cancelled':
+                return []
+            link = SyncLink(pair=self.pair, origin=master.origin, origin_event_id=origin_id,
+                            mirror_event_id=event['id'], content_hash='')
+
+        origin = link.origin
+        if event.get('status') == 'cancelled':
+            def deleted(response):
+                self.drop_link(origin, link.origin_event_id)
+                self.count('written_back')
+            return [self.delete_op(link.origin_event_id, deleted)]
+
+        digest = content_hash(event)
+        if digest == link.content_hash:
+            self.count('unchanged')
+            return []
+
+        def written_back(response):
+            link.content_hash = digest
+            self.links[origin][link.origin_event_id] = link
+            self.touched[origin].add(link.origin_event_id)
+            self.count('written_back')
+
+        # The origin keeps its own extendedProperties; only content is copied back
+        return [SyncOp('patch', link.origin_event_id, _content_body(event), written_back, None)]
+
+    def delete_op(self, event_id, on_done):
+        # Already gone counts as done
+        return SyncOp('delete', event_id, None, on_done, lambda: on_done(None))
+
+    def drop_link(self, origin, origin_id):
+        self.links[origin].pop(origin_id, None)
+        self.touched[origin].add(origin_id)
+        # Occurrences go with their series
+        for instance_id in [key for key in self.links[origin] if key.startswith(origin_id + '_')]:
+            self.links[origin].pop(instance_id)
+            self.touched[origin].add(instance_id)
+
+    def count(self, name):
+        self.stats[name] += 1
+
+    # Apply
+
+    def request(self, side, op):
+        events = self.service(side).events()
+        calendar_id = self.calendars[side]
+        if op.action == 'import':
+            return events.import_(calendarId=calendar_id, body=op.body)
+        if op.action == 'patch':
+            return events.patch(calendarId=calendar_id, eventId=op.event_id, body=op.body)
+        return events.delete(calendarId=calendar_id, eventId=op.event_id)
+
+    def fail(self, op, error):
+        self.stats['failed'] += 1
+        if len(self.stats['errors']) < MAX_REPORTED_ERRORS:
+            self.stats['errors'].append(f"{op.action} {op.event_id or op.body.get('iCalUID')}: {error}")
+
+    def apply(self, side, ops):
+        """
+        Send ops in batches, retrying rate-limited calls with backoff.
+        Returns (written events, deleted event IDs) on that side.
+        """
+        written, removed = [], []
+        pending = list(ops)
+        attempt = 0
+        while pending:
+            retry = []
+            for start in range(0, len(pending), BATCH_SIZE):
+                chunk = pending[start:start + BATCH_SIZE]
+
+                def callback(request_id, response, exception, chunk=chunk):
+                    op = chunk[int(request_id)]
+                    if exception is None:
+                        if op.action == 'delete':
+                            removed.append(op.event_id)
+                        else:
+                            written.append(response)
+                        op.on_done(response)
+                    elif _status(exception) in (404, 410) and op.on_missing:
+                        replacement = op.on_missing()
+                        if replacement:
+                            retry.append(replacement)
+                        elif op.action == 'delete':
+                            removed.append(op.event_id)
+                    elif is_retryable(exception) and attempt < MAX_RETRIES:
+                        retry.append(op)
+                    else:
+                        self.fail(op, exception)
+
+                batch = self.service(side).new_batch_http_request(callback=callback)
+                for number, op in enumerate(chunk):
+                    batch.add(self.request(side, op), request_id=str(number))
+                try:
+                    batch.execute()
+                except google_client.HttpError as error:
+                    if is_retryable(error) and attempt < MAX_RETRIES:
+                        retry.extend(chunk)
+                    else:
+                        for op in chunk:
+                            self.fail(op, error)
+            pending = retry
+            if pending:
+                time.sleep(2 ** attempt)
+                attempt += 1
+        return written, removed
+
+    def record_writes(self, side, written, removed):
+        """Keep the written calendar's cache, search index and open pages current."""
+        if not written and not removed:
+            return
+        user, calendar_id = self.users[side], self.calendars[side]
+        canonical_id = canonical_calendar_id(user.pk, calendar_id)
+        bump_calendar_version(user.pk, canonical_id)
+        events = [normalize_event(event) for event in written]
+        index_events(user, calendar_id, events)
+        remove_events(user, calendar_id, removed)
+        live.publish(
+            user.pk, canonical_id,
+            [(event['id'], event) for event in events] + [(event_id, None) for event_id in removed],
+        )
+
+    def save_links(self):
+        for origin in (SOURCE, TARGET):
+            touched = self.touched[origin]
+            if not touched:
+                continue
+            self.pair.links.filter(origin=origin, origin_event_id__in=list(touched)).delete()
+            SyncLink.objects.bulk_create([
+                SyncLink(pair=self.pair, origin=origin, origin_event_id=origin_id,
+                         mirror_event_id=self.links[origin][origin_id].mirror_event_id,
+                         content_hash=self.links[origin][origin_id].content_hash)
+                for origin_id in touched if origin_id in self.links[origin]
+            ])
+            touched.clear()
+
+
+def sync_pair(pair, full=False):
+    """Run one pair, recording the outcome on it. Returns the stats dict."""
+    try:
+        stats = PairSync(pair, full=full).run()
+        error = ''
+    except (SyncError, google_client.HttpError) as exc:
+        stats = {'failed': 1, 'errors': [str(exc)]}
+        error = str(exc)
+    pair.last_synced_at = timezone.now()
+    pair.last_stats = stats
+    pair.last_error = error
+    pair.save(update_fields=['last_synced_at', 'last_stats', 'last_error'])
+    return stats
+
+
+def sync_all(full=False):
+    """Run every enabled pair; yields (pair, stats)."""
+    for pair in SyncPair.objects.filter(enabled=True).select_related('source_user', 'target_user'):
+        yield pair, sync_pair(pair, full=full)
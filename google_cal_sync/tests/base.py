@@ -0,0 +1,109 @@
+"""Shared test set-up: a fake Google server per test class and clean process state."""
+import os
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from google_cal_sync import circuit, google_client
+from google_cal_sync.fake_google import FakeCalendarStore, FaultInjector, make_server
+from google_cal_sync.metrics import health
+from google_cal_sync.models import GoogleToken
+
+
+# The manifest storage needs collectstatic; templates only need {% static %} to resolve
+STATIC_STORAGE = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+# Token refreshes need client credentials; the fake accepts any
+CLIENT_ENV = mock.patch.dict(os.environ, {'GOOGLE_CLIENT_ID': 'fake-client', 'GOOGLE_CLIENT_SECRET': 'fake-secret'})
+
+
+def reset_state():
+    """Forget cached data, breaker state and health samples left by other tests."""
+    cache.clear()
+    with circuit._breakers_lock:
+        circuit._breakers.clear()
+    with health.lock:
+        health.calls.clear()
+        health.lookups.clear()
+
+
+def make_event(summary, start, minutes=60, **fields):
+    """An event body starting at the aware datetime `start`."""
+    return dict(
+        summary=summary,
+        start={'dateTime': start.isoformat()},
+        end={'dateTime': (start + timedelta(minutes=minutes)).isoformat()},
+        **fields,
+    )
+
+
+class FakeGoogleMixin:
+    """
+    Runs fake_google on a free port for the test class and points the Google
+    client at it. Every test starts with fresh accounts without seeded events;
+    prefetching is off.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.store = FakeCalendarStore(seed_events=0, seed=1)
+        cls.server = make_server(port=0, store=cls.store)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls._base_url = override_settings(
+            GOOGLE_API_BASE_URL=f'http://127.0.0.1:{cls.server.server_address[1]}', PREFETCH_WORKERS=0,
+        )
+        cls._base_url.enable()
+        google_client._discovery_documents.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._base_url.disable()
+        google_client._discovery_documents.clear()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        reset_state()
+        # Each test starts with empty fake accounts and no injected faults
+        self.server.faults = FaultInjector()
+        with self.store.lock:
+            self.store.accounts.clear()
+            self.store.tokens.clear()
+
+    def connect(self, username, account=None):
+        """A user whose Google token maps to fake account `account` (default: the username)."""
+        account = account or username
+        user = User.objects.create(username=username, email=f'{username}@example.com')
+        access_token = f'fake-{username}'
+        with self.store.lock:
+            self.store.tokens[access_token] = account
+        GoogleToken.objects.create(
+            user=user, access_token=access_token, refresh_token=f'fake-rt-{account}',
+            token_expiry=timezone.now() + timedelta(hours=1),
+        )
+        return user
+
+    def primary(self, account):
+        with self.store.lock:
+            return self.store.account(account)['primary']
+
+    def add_event(self, account, body, calendar_id=None):
+        """Create an event directly in the fake, as if made in Google Calendar."""
+        with self.store.lock:
+            data = self.store.account(account)
+            return self.store.public(self.store._store_event(data, calendar_id or data['primary'], body))
+
+    def events_in(self, account, calendar_id=None, cancelled=False):
+        with self.store.lock:
+            data = self.store.account(account)
+            events = data['events'][calendar_id or data['primary']].values()
+            return [self.store.public(e) for e in events if cancelled or e.get('status') != 'cancelled']
@@ -0,0 +1,121 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import analytics
+from google_cal_sync.analytics import (
+    analytics_calendars,
+    busy_view,
+    compute_analytics,
+    get_calendar_analytics,
+    heatmap_rows,
+    overlap_stats,
+    union_intervals,
+)
+from google_cal_sync.utils import get_calendar_service, normalize_event
+from .base import FakeGoogleMixin, make_event
+
+
+GUESTS = [
+    {'email': 'me@example.com', 'self': True, 'responseStatus': 'declined'},
+    {'email': 'guest@example.com', 'responseStatus': 'accepted'},
+]
+
+
+def timed(start, minutes=60, **fields):
+    return normalize_event(make_event('Meeting', start, minutes, **fields))
+
+
+@override_settings(TIME_ZONE='UTC')
+class ComputeAnalyticsTests(SimpleTestCase):
+    def test_union_and_overlaps(self):
+        starts, ends = np.asarray([0, 10, 50]), np.asarray([20, 30, 60])
+        # Disjoint pieces, not merged ones
+        union_starts, union_ends = union_intervals(starts, ends)
+        self.assertEqual(list(zip(union_starts.tolist(), union_ends.tolist())), [(0, 20), (20, 30), (50, 60)])
+        self.assertEqual(overlap_stats(starts, ends), (2, 2))
+
+    def test_busy_time_counts_overlaps_once(self):
+        monday = datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc)
+        events = [
+            timed(monday),
+            timed(monday + timedelta(minutes=30)),
+            timed(monday + timedelta(days=1), transparency='transparent'),
+            timed(monday + timedelta(days=2), attendees=GUESTS),
+            normalize_event({'start': {'date': '2026-03-04'}, 'end': {'date': '2026-03-05'}}),
+        ]
+        result = compute_analytics([events], ['Work'], date(2026, 3, 2), 7)
+        self.assertEqual(result['event_count'], 2)
+        self.assertEqual(result['all_day_count'], 1)
+        self.assertEqual(result['busy_hours'], 1.5)
+        self.assertEqual(result['double_booked_hours'], 0.5)
+        self.assertEqual(result['peak_concurrent'], 2)
+        self.assertEqual(result['busiest_slot'], {'weekday': 'Mon', 'hour': 9})
+        self.assertEqual(result['calendars'], [{'name': 'Work', 'hours': 2.0, 'events': 2}])
+
+    def test_heatmap_buckets_busy_minutes_by_weekday_and_hour(self):
+        monday = datetime(2026, 3, 2, 9, 30, tzinfo=dt_timezone.utc)
+        result = compute_analytics([[timed(monday, 90), timed(monday + timedelta(days=2), 30)]], ['Work'],
+                                   date(2026, 3, 2), 7)
+        self.assertEqual(result['heatmap'][0][9:12], [30.0, 60.0, 0.0])
+        self.assertEqual(result['heatmap'][2][9], 30.0)
+        self.assertEqual(sum(map(sum, result['heatmap'])), 120.0)
+        rows = heatmap_rows(result)
+        self.assertEqual(rows[0][0], 'Mon')
+        self.assertEqual(rows[0][1][9:11], [(30.0, 2), (60.0, 4)])
+        self.assertEqual(rows[1][1][9], (0.0, 0))
+
+
+class BusyViewTests(SimpleTestCase):
+    def test_normalized_events_keep_only_the_users_attendee_entry(self):
+        event = timed(datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc), attendees=GUESTS, organizer={'email': 'x'})
+        self.assertEqual(event['raw']['attendees'], GUESTS[:1])
+        self.assertEqual(set(event['raw']), {'start', 'end', 'attendees'})
+        self.assertNotIn('attendees', timed(datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc), attendees=GUESTS[1:])['raw'])
+
+    def test_busy_view_keeps_only_what_analytics_reads(self):
+        event = timed(datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc), attendees=GUESTS, description='x' * 1000)
+        view = busy_view(event)
+        self.assertEqual(view['raw']['attendees'], GUESTS[:1])
+        self.assertEqual(set(view['raw']), {'start', 'end', 'transparency', 'attendees'})
+
+
+class CalendarAnalyticsTests(FakeGoogleMixin, TestCase):
+    def test_declined_meetings_are_not_busy(self):
+        user = self.connect('ann')
+        service = get_calendar_service(user)
+        today = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.add_event('ann', make_event('Standup', today - timedelta(days=1)))
+        self.add_event('ann', make_event('Skipped', today - timedelta(days=2), attendees=[
+            {'email': 'ann@fake.example.com', 'self': True, 'responseStatus': 'declined'},
+            {'email': 'bob@example.com', 'responseStatus': 'accepted'},
+        ]))
+        calendars = analytics_calendars(service.calendarList().list().execute()['items'])
+        result = get_calendar_analytics(user, service, calendars, 'week')
+        self.assertEqual(result['event_count'], 1)
+        self.assertEqual(result['busy_hours'], 1.0)
+
+
+class AnalyticsViewTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.connect('ann'))
+        self.add_event('ann', make_event('Standup', timezone.now() - timedelta(days=1)))
+        self.url = reverse('google_cal_sync:analytics')
+
+    def test_json_is_computed_once_per_range(self):
+        response = self.client.get(self.url, {'range': 'month'})
+        self.assertEqual(response.json()['range'], 'month')
+        self.assertEqual(response.json()['event_count'], 1)
+        self.assertEqual(len(response.json()['heatmap']), 7)
+        with mock.patch.object(analytics, 'compute_analytics') as compute:
+            cached = self.client.get(self.url, {'range': 'month'})
+        compute.assert_not_called()
+        self.assertEqual(cached.json(), response.json())
+
+    def test_bad_range_and_login(self):
+        self.assertEqual(self.client.get(self.url, {'range': 'decade'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
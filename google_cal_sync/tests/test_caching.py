@@ -0,0 +1,141 @@
+import time
+from datetime import timedelta
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from google_cal_sync.caching import (
+    StaleDataMiddleware,
+    _apply_to_entry,
+    _mark_stale,
+    _shareable,
+    apply_event_change,
+    get_upcoming_events,
+    stale_since,
+)
+from google_cal_sync.fake_google import FaultInjector
+from google_cal_sync.utils import get_calendar_service, normalize_event
+from .base import FakeGoogleMixin, make_event
+
+
+def event(event_id, hours, minutes=60):
+    start = timezone.now().replace(microsecond=0) + timedelta(hours=hours)
+    return normalize_event(dict(make_event(event_id, start, minutes), id=event_id))
+
+
+def ids(events):
+    return None if events is None else [item['id'] for item in events]
+
+
+class ApplyToEntryTests(TestCase):
+    def setUp(self):
+        self.events = [event('e0', 1), event('e1', 2), event('e2', 3)]
+
+    def test_insert_in_start_order(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 10), 'new', event('new', 2.5))), ['e0', 'e1', 'new', 'e2'])
+
+    def test_move_within_a_list_that_is_not_full(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 10), 'e1', event('e1', 100))), ['e0', 'e2', 'e1'])
+
+    def test_delete(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 10), 'e1', None)), ['e0', 'e2'])
+        cancelled = dict(event('e1', 2), status='cancelled')
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 10), 'e1', cancelled)), ['e0', 'e2'])
+
+    def test_full_list_drops_an_event_moved_past_its_end(self):
+        # e3 at +4h was never cached; [e0, e2, e1] would skip it
+        self.assertIsNone(_apply_to_entry(self.events, ('upcoming', 3), 'e1', event('e1', 100)))
+
+    def test_full_list_losing_an_event_is_dropped(self):
+        self.assertIsNone(_apply_to_entry(self.events, ('upcoming', 3), 'e1', None))
+
+    def test_full_list_keeps_moves_inside_it(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 3), 'e2', event('e2', 0.5))), ['e2', 'e0', 'e1'])
+
+    def test_full_list_ignores_new_events_past_its_end(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 3), 'new', event('new', 100))), ['e0', 'e1', 'e2'])
+
+    def test_full_list_pushes_out_its_last_event(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 3), 'new', event('new', 0))), ['new', 'e0', 'e1'])
+
+    def test_full_list_whose_last_event_has_no_start(self):
+        events = self.events[:2] + [normalize_event({'id': 'odd', 'start': {}})]
+        self.assertEqual(ids(_apply_to_entry(events, ('upcoming', 3), 'new', event('new', 5))), ['e0', 'e1', 'odd'])
+        self.assertIsNone(_apply_to_entry(events, ('upcoming', 3), 'e0', event('e0', 5)))
+
+    def test_finished_events_leave_upcoming_lists(self):
+        self.assertEqual(ids(_apply_to_entry(self.events, ('upcoming', 10), 'e1', event('e1', -5))), ['e0', 'e2'])
+
+    def test_window(self):
+        now = timezone.now()
+        spec = ('window', (now + timedelta(hours=1.5)).isoformat(), (now + timedelta(hours=10)).isoformat())
+        self.assertEqual(ids(_apply_to_entry(self.events, spec, 'new', event('new', 20))), ['e0', 'e1', 'e2'])
+        self.assertEqual(ids(_apply_to_entry(self.events, spec, 'new', event('new', 5))), ['e0', 'e1', 'e2', 'new'])
+
+
+class ShareableTests(TestCase):
+    def test_shared_copies_keep_guests_but_not_self(self):
+        shared = event('e0', 1)
+        shared['raw']['attendees'] = [{'email': 'me@example.com', 'self': True}, {'email': 'guest@example.com'}]
+        [copy] = _shareable([shared])
+        self.assertEqual(copy['raw']['attendees'], [{'email': 'me@example.com'}, {'email': 'guest@example.com'}])
+        self.assertTrue(shared['raw']['attendees'][0]['self'])
+
+
+class StaleDataMiddlewareTests(SimpleTestCase):
+    def stale_view(self, request):
+        _mark_stale(time.time())
+        return HttpResponse(str(stale_since() is not None))
+
+    def test_sync_chain(self):
+        middleware = StaleDataMiddleware(self.stale_view)
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(RequestFactory().get('/')).content, b'True')
+        self.assertIsNone(stale_since())
+
+    async def test_async_chain(self):
+        async def view(request):
+            return self.stale_view(request)
+
+        middleware = StaleDataMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual((await middleware(RequestFactory().get('/'))).content, b'True')
+        self.assertIsNone(stale_since())
+
+
+class WriteThroughTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.service = get_calendar_service(self.user)
+        now = timezone.now().replace(microsecond=0)
+        self.created = [self.add_event('ann', make_event(f'e{number}', now + timedelta(hours=number + 1))) for number in range(4)]
+
+    def upcoming(self, max_results=3):
+        return [item['summary'] for item in get_upcoming_events(self.user, self.service, 'primary', max_results)]
+
+    def test_update_is_applied_to_the_cached_list(self):
+        self.assertEqual(self.upcoming(10), ['e0', 'e1', 'e2', 'e3'])
+        changed = self.service.events().patch(
+            calendarId='primary', eventId=self.created[3]['id'], body={'summary': 'e3 renamed'},
+        ).execute()
+        apply_event_change(self.user, 'primary', changed['id'], normalize_event(changed))
+        # Served from the updated entry: Google isn't asked again
+        self.server.faults = FaultInjector(error_rate=1.0)
+        self.assertEqual(self.upcoming(10), ['e0', 'e1', 'e2', 'e3 renamed'])
+
+    def test_move_out_of_a_full_list_refetches_it(self):
+        self.assertEqual(self.upcoming(), ['e0', 'e1', 'e2'])
+        moved = self.created[1]
+        later = timezone.now().replace(microsecond=0) + timedelta(hours=100)
+        changed = self.service.events().patch(calendarId='primary', eventId=moved['id'], body={
+            'start': {'dateTime': later.isoformat()}, 'end': {'dateTime': (later + timedelta(hours=1)).isoformat()},
+        }).execute()
+        apply_event_change(self.user, 'primary', changed['id'], normalize_event(changed))
+        self.assertEqual(self.upcoming(), ['e0', 'e2', 'e3'])
+
+    def test_delete_from_a_full_list_refetches_it(self):
+        self.assertEqual(self.upcoming(), ['e0', 'e1', 'e2'])
+        self.service.events().delete(calendarId='primary', eventId=self.created[0]['id']).execute()
+        apply_event_change(self.user, 'primary', self.created[0]['id'])
+        self.assertEqual(self.upcoming(), ['e1', 'e2', 'e3'])
@@ -0,0 +1,153 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import changes
+from google_cal_sync.changes import CursorError, poll
+from google_cal_sync.models import CalendarSyncState, EventChange
+from .base import FakeGoogleMixin, make_event
+
+
+@override_settings(CHANGE_FEED_CHECK_SECONDS=0)
+class ChangeFeedTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.now = timezone.now().replace(microsecond=0)
+
+    def add(self, summary, hours=1):
+        return self.add_event('ann', make_event(summary, self.now + timedelta(hours=hours)))
+
+    def drain(self, cursor):
+        """Every change after `cursor`, polling while has_more; (changes, cursor, polls)."""
+        seen = []
+        polls = 0
+        while True:
+            page = poll(self.user, cursor)
+            polls += 1
+            seen.extend(page['changes'])
+            cursor = page['cursor']
+            if not page['has_more']:
+                return seen, cursor, polls
+
+    def test_first_poll_starts_now(self):
+        self.add('Before')
+        page = poll(self.user)
+        self.assertEqual(page['changes'], [])
+        self.assertFalse(page['has_more'])
+        self.assertEqual(CalendarSyncState.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(poll(self.user, page['cursor'])['changes'], [])
+
+    def test_changes_and_tombstones(self):
+        cursor = poll(self.user)['cursor']
+        created = self.add('Lunch')
+        page = poll(self.user, cursor)
+        self.assertEqual([(change['event_id'], change['deleted']) for change in page['changes']], [(created['id'], False)])
+        self.assertEqual(page['changes'][0]['event']['summary'], 'Lunch')
+
+        calendar_id = self.primary('ann')
+        with self.store.lock:
+            self.store.delete_event(self.store.account('ann'), calendar_id, created['id'])
+        page = poll(self.user, page['cursor'])
+        # The primary calendar is logged under its alias
+        self.assertEqual(page['changes'], [
+            {'calendar_id': 'primary', 'event_id': created['id'], 'deleted': True, 'event': None},
+        ])
+
+    @mock.patch.object(changes, 'PAGE_SIZE', 2)
+    def test_paging_has_no_gaps_or_duplicates(self):
+        cursor = poll(self.user)['cursor']
+        ids = [self.add(f'Event {number}')['id'] for number in range(3)]
+        page = poll(self.user, cursor)
+        self.assertTrue(page['has_more'])
+        # More arrive while the client is still paging
+        ids.extend(self.add(f'Event {number}')['id'] for number in range(3, 6))
+        seen, cursor, _ = self.drain(page['cursor'])
+        self.assertEqual([change['event_id'] for change in page['changes'] + seen], ids)
+        self.assertEqual(poll(self.user, cursor)['changes'], [])
+
+    @mock.patch.object(changes, 'PAGE_SIZE', 2)
+    def test_every_client_reads_the_log_with_its_own_cursor(self):
+        first = poll(self.user)['cursor']
+        second = poll(self.user)['cursor']
+        ids = [self.add(f'Event {number}')['id'] for number in range(5)]
+        seen, _, polls = self.drain(first)
+        self.assertEqual([change['event_id'] for change in seen], ids)
+        self.assertEqual(polls, 3)
+        seen, _, _ = self.drain(second)
+        self.assertEqual([change['event_id'] for change in seen], ids)
+        self.assertEqual(EventChange.objects.filter(user=self.user).count(), 5)
+
+    def test_unchanged_poll_leaves_google_alone(self):
+        cursor = poll(self.user)['cursor']
+        with override_settings(CHANGE_FEED_CHECK_SECONDS=60), mock.patch.object(changes, 'read_changes') as read:
+            self.add('Unseen')
+            self.assertEqual(poll(self.user, cursor)['changes'], [])
+        read.assert_not_called()
+
+    def test_busy_lease_skips_the_read(self):
+        cursor = poll(self.user)['cursor']
+        self.add('Later')
+        cache.add(changes._lease_key(self.user.pk), 1)
+        with mock.patch.object(changes, 'read_changes') as read:
+            self.assertEqual(poll(self.user, cursor)['changes'], [])
+        read.assert_not_called()
+        cache.delete(changes._lease_key(self.user.pk))
+        self.assertEqual(len(poll(self.user, cursor)['changes']), 1)
+        self.assertTrue(cache.add(changes._lease_key(self.user.pk), 1))
+
+    def test_reads_overtaken_by_another_worker_are_dropped(self):
+        cursor = poll(self.user)['cursor']
+        self.add('Lunch')
+        read_changes = changes.read_changes
+
+        def overtaken(service, calendar_id, *args):
+            result = read_changes(service, calendar_id, *args)
+            CalendarSyncState.objects.filter(user=self.user, calendar_id=calendar_id).update(
+                checked_at=self.now + timedelta(seconds=1),
+            )
+            return result
+
+        with mock.patch.object(changes, 'read_changes', side_effect=overtaken):
+            self.assertEqual(poll(self.user, cursor)['changes'], [])
+        self.assertFalse(EventChange.objects.filter(user=self.user).exists())
+
+    def test_cursor_of_another_user_is_rejected(self):
+        cursor = poll(self.user)['cursor']
+        other = self.connect('bob')
+        with self.assertRaises(CursorError):
+            poll(other, cursor)
+        with self.assertRaises(CursorError):
+            poll(self.user, 'garbage')
+
+    def test_view(self):
+        url = reverse('google_cal_sync:event_changes')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.user)
+        cursor = self.client.get(url).json()['cursor']
+        self.add('Lunch')
+        body = self.client.get(url, {'cursor': cursor}).json()
+        self.assertEqual([change['event']['summary'] for change in body['changes']], ['Lunch'])
+        self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, 400)
+
+
+@override_settings(CHANGE_FEED_CHECK_SECONDS=0)
+class GoogleReadTransactionTests(FakeGoogleMixin, TransactionTestCase):
+    def test_google_is_read_outside_a_transaction(self):
+        user = self.connect('ann')
+        cursor = poll(user)['cursor']
+        self.add_event('ann', make_event('Lunch', timezone.now() + timedelta(hours=1)))
+        read_changes = changes.read_changes
+        in_transaction = []
+
+        def read(*args):
+            in_transaction.append(connection.in_atomic_block)
+            return read_changes(*args)
+
+        with mock.patch.object(changes, 'read_changes', side_effect=read):
+            page = poll(user, cursor)
+        self.assertEqual([change['event']['summary'] for change in page['changes']], ['Lunch'])
+        self.assertEqual(set(in_transaction), {False})
@@ -0,0 +1,129 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import circuit, google_client
+from google_cal_sync.caching import bump_calendar_version
+from google_cal_sync.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, endpoint_class
+from google_cal_sync.fake_google import FaultInjector
+from google_cal_sync.utils import get_calendar_service
+from .base import STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = mock.patch.object(circuit.time, 'monotonic', return_value=100.0)
+        self.monotonic = self.clock.start()
+        self.addCleanup(self.clock.stop)
+        self.breaker = CircuitBreaker('events_read', failure_threshold=3, reset_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.snapshot()['rejected'], 1)
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.monotonic.return_value = 130.0
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.monotonic.return_value = 160.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_endpoint_class(self):
+        base = 'https://www.googleapis.com/calendar/v3'
+        self.assertEqual(endpoint_class('GET', f'{base}/calendars/primary/events'), 'events_read')
+        self.assertEqual(endpoint_class('POST', f'{base}/calendars/primary/events'), 'events_write')
+        self.assertEqual(endpoint_class('GET', f'{base}/users/me/calendarList'), 'calendar_list')
+        self.assertEqual(endpoint_class('POST', f'{base}/freeBusy'), 'freebusy')
+        self.assertEqual(endpoint_class('POST', 'https://www.googleapis.com/batch/calendar/v3'), 'batch')
+        self.assertEqual(endpoint_class('POST', 'https://oauth2.googleapis.com/token'), 'oauth')
+
+
+@override_settings(GOOGLE_CIRCUIT_FAILURE_THRESHOLD=3)
+class GuardedCallTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = get_calendar_service(self.connect('ann'))
+
+    def list_events(self):
+        return self.service.events().list(calendarId='primary').execute(num_retries=0)
+
+    def fail_calls(self, **faults):
+        self.server.faults = FaultInjector(seed=1, **faults)
+        for _ in range(5):
+            with self.assertRaises(google_client.HttpError):
+                self.list_events()
+        self.server.faults = FaultInjector()
+
+    def test_server_errors_open_the_circuit(self):
+        self.fail_calls(error_rate=1.0)
+        self.assertEqual(circuit.get_breaker('events_read').state, OPEN)
+        with self.assertRaises(google_client.HttpError) as raised:
+            self.list_events()
+        self.assertEqual(raised.exception.resp.status, 503)
+        self.assertEqual(raised.exception.resp[google_client.UNAVAILABLE_HEADER], 'events_read')
+
+    def test_rate_limits_leave_the_circuit_closed(self):
+        self.fail_calls(quota_error_rate=1.0)
+        breaker = circuit.get_breaker('events_read')
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.snapshot()['failures'], 0)
+        self.list_events()
+
+
+    @override_settings(GOOGLE_API_READ_TIMEOUT=0.05)
+    def test_timeouts_become_unavailable_responses(self):
+        self.server.faults = FaultInjector(latency_ms=300)
+        with self.assertRaises(google_client.HttpError) as raised:
+            self.list_events()
+        self.assertEqual(raised.exception.resp.status, 503)
+        self.assertEqual(circuit.get_breaker('events_read').snapshot()['failures'], 1)
+
+
+@STATIC_STORAGE
+class StaleFallbackTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.client.force_login(self.user)
+        self.add_event('ann', make_event('Standup', timezone.now() + timedelta(days=1)))
+        self.url = reverse('google_cal_sync:upcoming_events')
+        self.client.get(self.url)
+        # The next read misses the cache and has to ask Google
+        bump_calendar_version(self.user.pk, 'primary')
+
+    def test_last_good_copy_is_served_while_google_fails(self):
+        self.server.faults = FaultInjector(error_rate=1.0)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Standup')
+        self.assertContains(response, "Google Calendar isn't responding")
+        # A fallback page must not be revalidated as current
+        self.assertFalse(response.has_header('ETag'))
+
+        self.server.faults = FaultInjector()
+        self.assertNotContains(self.client.get(self.url), "isn't responding")
+
+    def test_other_errors_are_not_masked(self):
+        primary = self.primary('ann')
+        with self.store.lock:
+            del self.store.account('ann')['calendars'][primary]
+        response = self.client.get(self.url)
+        self.assertNotContains(response, "isn't responding")
+        self.assertNotContains(response, 'Standup')
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync.caching import bump_calendar_version
+from .base import STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+@STATIC_STORAGE
+class ConditionalPageTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.client.force_login(self.user)
+        self.add_event('ann', make_event('Standup', timezone.now() + timedelta(days=1)))
+        self.url = reverse('google_cal_sync:upcoming_events')
+
+    def warm(self, url=None, **params):
+        """Render until the page carries validators; returns the last response."""
+        for _ in range(2):
+            response = self.client.get(url or self.url, params)
+            if response.has_header('ETag'):
+                return response
+        self.fail(f"No ETag on {url or self.url}")
+
+    def test_matching_etag_gets_304(self):
+        response = self.warm()
+        self.assertContains(response, 'Standup')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_changed_calendar_renders_again(self):
+        etag = self.warm()['ETag']
+        self.add_event('ann', make_event('Retro', timezone.now() + timedelta(days=2)))
+        bump_calendar_version(self.user.pk, 'primary')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Retro')
+        self.assertNotEqual(response.get('ETag'), etag)
+
+    def test_etag_is_per_path(self):
+        etag = self.warm()['ETag']
+        other = self.warm(self.url + '?calendar_id=primary')
+        self.assertNotEqual(other['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, {'calendar_id': 'primary'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cold_cache_sends_no_validators(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_pending_messages_skip_validators(self):
+        etag = self.warm()['ETag']
+        request = RequestFactory().get('/')
+        storage = CookieStorage(request)
+        storage.add(messages.SUCCESS, 'Event created')
+        carrier = HttpResponse()
+        storage.update(carrier)
+        self.client.cookies[storage.cookie_name] = carrier.cookies[storage.cookie_name].value
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Event created')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_dashboard_and_settings(self):
+        # Both shells leave the Google reads to their fragments
+        for fragment in ('calendars', 'events'):
+            self.client.get(reverse('google_cal_sync:dashboard_fragment', args=[fragment]))
+        self.client.get(reverse('google_cal_sync:settings_analytics'))
+        for name in ('dashboard', 'settings'):
+            url = reverse(f'google_cal_sync:{name}')
+            etag = self.warm(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304, name)
+
+    def test_anonymous_requests_are_not_conditional(self):
+        etag = self.warm()['ETag']
+        self.client.logout()
+        self.assertNotEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
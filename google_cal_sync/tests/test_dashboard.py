@@ -0,0 +1,50 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import views
+from google_cal_sync.fake_google import FaultInjector
+from .base import STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+@STATIC_STORAGE
+class DashboardShellTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.client.force_login(self.user)
+        self.add_event('ann', make_event('Standup', timezone.now() + timedelta(hours=2)))
+        self.url = reverse('google_cal_sync:dashboard')
+
+    def fragment_url(self, name):
+        return reverse('google_cal_sync:dashboard_fragment', args=[name])
+
+    def test_shell_does_not_wait_for_google(self):
+        with mock.patch.object(views, 'authenticate_with_google') as authenticate:
+            response = self.client.get(self.url)
+        authenticate.assert_not_called()
+        self.assertContains(response, f'data-fragment-url="{self.fragment_url("calendars")}"')
+        self.assertContains(response, f'data-fragment-url="{self.fragment_url("events")}"')
+        self.assertNotContains(response, 'Standup')
+
+    def test_fragments_fill_the_cache_for_the_next_shell(self):
+        self.assertContains(self.client.get(self.fragment_url('events')), 'Standup')
+        self.client.get(self.fragment_url('calendars'))
+        with mock.patch.object(views, 'authenticate_with_google') as authenticate:
+            response = self.client.get(self.url)
+        authenticate.assert_not_called()
+        self.assertContains(response, 'Standup')
+        self.assertNotContains(response, 'data-fragment-url')
+
+    def test_inline_loads_everything_on_the_page(self):
+        response = self.client.get(self.url, {'inline': 1})
+        self.assertContains(response, 'Standup')
+        self.assertNotContains(response, 'data-fragment-url')
+
+    def test_fragment_errors(self):
+        self.assertEqual(self.client.get(reverse('google_cal_sync:dashboard_fragment', args=['nope'])).status_code, 404)
+        self.server.faults = FaultInjector(error_rate=1.0)
+        self.assertContains(self.client.get(self.fragment_url('events')), 'Google API error', status_code=502)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.fragment_url('events')).status_code, 401)
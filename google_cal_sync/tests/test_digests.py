@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from google_cal_sync import digests
+from google_cal_sync.digests import DigestRun, _agenda_item, render_digests
+from google_cal_sync.models import DigestDelivery, GoogleToken
+from google_cal_sync.utils import normalize_event
+from .base import FakeGoogleMixin, make_event
+
+
+class DigestRunTests(FakeGoogleMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.nine = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=9)
+        self.ann, self.bob = self.connect('ann'), self.connect('bob')
+
+    def run_digests(self, **options):
+        return DigestRun(self.day, fetch_workers=2, render_processes=0, batch_size=1, **options).run()
+
+    def statuses(self):
+        return dict(DigestDelivery.objects.filter(day=self.day).values_list('user__username', 'status'))
+
+    def test_agendas_are_sent_once(self):
+        self.add_event('ann', make_event('Planning', self.nine + timedelta(hours=2), location='Room A'))
+        self.add_event('ann', make_event('Standup', self.nine))
+        self.add_event('ann', make_event('Next day', self.nine + timedelta(days=1)))
+        stats = self.run_digests(site_url='https://cal.example.com')
+        self.assertEqual((stats['users'], stats['sent'], stats['empty'], stats['failed']), (2, 1, 1, 0))
+        self.assertEqual(self.statuses(), {'ann': 'sent', 'bob': 'empty'})
+
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['ann@example.com'])
+        self.assertIn(': 2 events', message.subject)
+        self.assertLess(message.body.index('Standup'), message.body.index('Planning'))
+        self.assertIn('Room A', message.body)
+        self.assertNotIn('Next day', message.body)
+        self.assertIn('https://cal.example.com', message.alternatives[0][0])
+
+        # A rerun has nobody left to do
+        self.assertEqual(self.run_digests()['users'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failures_are_retried_on_the_next_run(self):
+        self.add_event('ann', make_event('Standup', self.nine))
+        self.add_event('bob', make_event('Review', self.nine))
+        # Expired, and no client credentials to refresh it with
+        GoogleToken.objects.filter(user=self.bob).update(token_expiry=timezone.now() - timedelta(minutes=1))
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP down')):
+            self.assertEqual(self.run_digests()['failed'], 2)
+        self.assertIn('SMTP down', DigestDelivery.objects.get(user=self.ann).error)
+        self.assertIn('reconnected', DigestDelivery.objects.get(user=self.bob).error)
+
+        GoogleToken.objects.filter(user=self.bob).update(token_expiry=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.run_digests()['sent'], 2)
+        self.assertEqual(self.statuses(), {'ann': 'sent', 'bob': 'sent'})
+
+    def test_fetch_threads_close_their_connections(self):
+        with mock.patch.object(digests, 'db_connection') as db_connection:
+            self.run_digests()
+        self.assertEqual(db_connection.close.call_count, 2)
+
+    def test_render(self):
+        agenda = {'user_id': 1, 'email': 'ann@example.com', 'name': 'ann', 'day': self.day,
+                  'events': [{'when': 'All day', 'summary': 'Offsite', 'location': '', 'calendar': 'Team'}]}
+        (subject, text, html), = render_digests([agenda])
+        self.assertEqual(subject, f"Your agenda for {self.day:%A, %B} {self.day.day}: 1 events")
+        self.assertIn('All day', text)
+        self.assertIn('Offsite', html)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('send_digests', '--date', self.day.isoformat(), '--render-processes', '0', stdout=out)
+        self.assertIn(f'Digests for {self.day}: 0 sent, 2 with nothing scheduled', out.getvalue())
+
+
+@override_settings(TIME_ZONE='UTC')
+class AgendaItemTests(SimpleTestCase):
+    calendar = {'id': 'team@example.com', 'summary': 'Team'}
+
+    def item(self, start, end=None):
+        return _agenda_item(normalize_event({'id': 'e', 'summary': 'Offsite', 'start': start, 'end': end}), self.calendar)
+
+    def test_times(self):
+        item = self.item({'dateTime': '2026-03-02T09:00:00Z'}, {'dateTime': '2026-03-02T09:30:00Z'})
+        self.assertEqual((item['when'], item['calendar']), ('09:00–09:30', 'Team'))
+        self.assertEqual(self.item({'dateTime': '2026-03-02T09:00:00Z'})['when'], '09:00')
+
+    def test_date_only_starts_are_all_day(self):
+        item = self.item({'date': '2026-03-02'}, {'date': '2026-03-03'})
+        self.assertEqual((item['when'], item['sort']), ('All day', ''))
+
+    def test_unreadable_starts_are_skipped(self):
+        with self.assertLogs('google_cal_sync.digests', 'WARNING'):
+            self.assertIsNone(self.item({'dateTime': 'soon'}))
+        with self.assertLogs('google_cal_sync.digests', 'WARNING'):
+            self.assertIsNone(self.item(None))
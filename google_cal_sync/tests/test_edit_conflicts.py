@@ -0,0 +1,66 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import views
+from .base import STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+@STATIC_STORAGE
+class UpdateEventConflictTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.client.force_login(self.user)
+        start = timezone.localtime().replace(second=0, microsecond=0) + timedelta(days=1)
+        self.event = self.add_event('ann', make_event('Standup', start, location='Room A'))
+        self.url = reverse('google_cal_sync:update_event')
+
+    def form(self, **changes):
+        response = self.client.get(self.url, {'event_id': self.event['id']})
+        data = dict(response.context['form_values'], event_id=self.event['id'], calendar_id='primary',
+                    etag=response.context['etag'])
+        data.update(changes)
+        return data
+
+    def edit_in_google(self, **fields):
+        with self.store.lock:
+            account = self.store.account('ann')
+            self.store._store_event(account, account['primary'], fields, event_id=self.event['id'])
+
+    def test_form_carries_the_event_etag(self):
+        data = self.form()
+        self.assertEqual(data['etag'], self.event['etag'])
+        self.assertEqual(data['title'], 'Standup')
+
+    def test_form_is_filled_from_the_cache(self):
+        self.client.get(reverse('google_cal_sync:upcoming_events'))
+        with mock.patch.object(views, 'get_calendar_event') as fetch:
+            response = self.client.get(self.url, {'event_id': self.event['id']})
+        fetch.assert_not_called()
+        self.assertEqual(response.context['form_values']['title'], 'Standup')
+
+    def test_unchanged_event_is_patched(self):
+        response = self.client.post(self.url, self.form(title='Daily standup'))
+        self.assertRedirects(response, reverse('google_cal_sync:upcoming_events'), fetch_redirect_response=False)
+        self.assertEqual(self.events_in('ann')[0]['summary'], 'Daily standup')
+
+    def test_concurrent_change_shows_a_merge_prompt(self):
+        data = self.form(title='Daily standup')
+        self.edit_in_google(location='Room B')
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['conflict'])
+        self.assertEqual(
+            [(field['label'], field['mine'], field['theirs']) for field in response.context['conflict_fields']],
+            [('Event Name', 'Daily standup', 'Standup'), ('Location', 'Room A', 'Room B')],
+        )
+        # Nothing was overwritten
+        self.assertEqual(self.events_in('ann')[0]['location'], 'Room B')
+
+        # Submitting again with the new etag is a deliberate overwrite
+        data['etag'] = response.context['etag']
+        self.assertEqual(self.client.post(self.url, data).status_code, 302)
+        event = self.events_in('ann')[0]
+        self.assertEqual((event['summary'], event['location']), ('Daily standup', 'Room A'))
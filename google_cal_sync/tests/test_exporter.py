@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from django.test import SimpleTestCase, TestCase
+from google_cal_sync.exporter import _buffered, stream_export
+from google_cal_sync.ical import events_to_vevents, iter_vevents
+from google_cal_sync.importer import import_events, iter_upload_rows
+from google_cal_sync.utils import get_calendar_service
+from .base import FakeGoogleMixin, make_event
+
+
+def vevents(ics):
+    """{(UID, RECURRENCE-ID or None): {property: [values]}} of an ICS document, asserting keys are unique."""
+    keys = []
+    components = {}
+    for _, properties in iter_vevents(ics.splitlines(keepends=True)):
+        key = (properties['UID'][0][1], properties['RECURRENCE-ID'][0][1] if 'RECURRENCE-ID' in properties else None)
+        keys.append(key)
+        components[key] = {name: [value for _, value in values] for name, values in properties.items()}
+    duplicates = [key for key, count in Counter(keys).items() if count > 1]
+    assert not duplicates, f"duplicate components {duplicates}"
+    return components, keys
+
+
+# A weekly series as Google lists it without singleEvents: the master, one
+# moved and one cancelled occurrence, plus a one-off event and a deleted one
+MASTER = {
+    'id': 'series', 'iCalUID': 'series@google.com', 'summary': 'Weekly sync', 'status': 'confirmed',
+    'start': {'dateTime': '2026-03-02T09:00:00Z'}, 'end': {'dateTime': '2026-03-02T10:00:00Z'},
+    'recurrence': ['RRULE:FREQ=WEEKLY;COUNT=4'],
+}
+MOVED = {
+    'id': 'series_20260309T090000Z', 'iCalUID': 'series@google.com', 'summary': 'Weekly sync (moved)',
+    'status': 'confirmed', 'recurringEventId': 'series', 'originalStartTime': {'dateTime': '2026-03-09T09:00:00Z'},
+    'start': {'dateTime': '2026-03-09T11:00:00Z'}, 'end': {'dateTime': '2026-03-09T12:00:00Z'},
+}
+CANCELLED = {
+    'id': 'series_20260316T090000Z', 'iCalUID': 'series@google.com', 'status': 'cancelled',
+    'recurringEventId': 'series', 'originalStartTime': {'dateTime': '2026-03-16T09:00:00Z'},
+}
+SINGLE = {
+    'id': 'dentist', 'iCalUID': 'dentist@google.com', 'summary': 'Dentist, 3rd floor', 'status': 'confirmed',
+    'start': {'dateTime': '2026-03-04T15:00:00Z'}, 'end': {'dateTime': '2026-03-04T16:00:00Z'},
+}
+GONE = dict(SINGLE, id='gone', iCalUID='gone@google.com', status='cancelled')
+
+
+def write(events):
+    return ''.join(events_to_vevents(events, lambda event: '20260301T000000Z'))
+
+
+class IcsWriterTests(SimpleTestCase):
+    def test_exdate_and_recurrence_id(self):
+        # Overrides may be listed before their master
+        components, keys = vevents(write([MOVED, SINGLE, CANCELLED, GONE, MASTER]))
+        self.assertEqual(keys, [
+            ('dentist@google.com', None), ('series@google.com', None), ('series@google.com', '20260309T090000Z'),
+        ])
+        master = components[('series@google.com', None)]
+        self.assertEqual(master['RRULE'], ['FREQ=WEEKLY;COUNT=4'])
+        self.assertEqual(master['EXDATE'], ['20260316T090000Z'])
+        moved = components[('series@google.com', '20260309T090000Z')]
+        self.assertEqual(moved['DTSTART'], ['20260309T110000Z'])
+        self.assertEqual(moved['SUMMARY'], ['Weekly sync (moved)'])
+
+    def test_modified_occurrence_without_its_master_stands_alone(self):
+        components, keys = vevents(write([MOVED, CANCELLED]))
+        self.assertEqual(keys, [('series_20260309T090000Z@google.com', None)])
+
+    def test_round_trip_through_the_import_parser(self):
+        rows = list(iter_upload_rows(write([MASTER, MOVED, CANCELLED, SINGLE]).splitlines(keepends=True), 'ics'))
+        bodies = {body['summary']: body for _, body, _ in rows if body}
+        self.assertEqual(bodies['Weekly sync']['recurrence'], ['RRULE:FREQ=WEEKLY;COUNT=4', 'EXDATE:20260316T090000Z'])
+        self.assertEqual(bodies['Dentist, 3rd floor']['start'], SINGLE['start'])
+        self.assertEqual([error for _, _, error in rows if error], [
+            "modified occurrences of recurring events (RECURRENCE-ID) can't be imported",
+        ])
+
+    def test_chunks_are_coalesced(self):
+        self.assertEqual(list(_buffered(['ab', '', 'cd', 'é'], size=3)), [b'abcd', 'é'.encode()])
+
+
+class ExportTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.service = get_calendar_service(self.user)
+        start = datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc)
+        self.master = self.add_event('ann', make_event('Weekly sync', start, recurrence=['RRULE:FREQ=WEEKLY;COUNT=4']))
+        uid = self.master['iCalUID']
+        self.add_event('ann', make_event(
+            'Weekly sync (moved)', datetime(2026, 3, 9, 11, tzinfo=dt_timezone.utc), iCalUID=uid,
+            recurringEventId=self.master['id'], originalStartTime={'dateTime': '2026-03-09T09:00:00Z'},
+        ))
+        self.add_event('ann', {
+            'status': 'cancelled', 'iCalUID': uid, 'recurringEventId': self.master['id'],
+            'originalStartTime': {'dateTime': '2026-03-16T09:00:00Z'},
+        })
+        self.single = self.add_event('ann', make_event('Dentist', datetime(2026, 3, 4, 15, tzinfo=dt_timezone.utc)))
+        self.add_event('ann', dict(make_event('Gone', datetime(2026, 3, 5, 15, tzinfo=dt_timezone.utc)), status='cancelled'))
+
+    def export(self, export_format, account='ann'):
+        return b''.join(stream_export(self.service, [self.primary(account)], export_format, calendar_name='Ann')).decode()
+
+    def test_ics_writes_exdate_and_recurrence_id(self):
+        components, keys = vevents(self.export('ics'))
+        uid = self.master['iCalUID']
+        self.assertEqual(sorted(keys, key=str), sorted([
+            (uid, None), (uid, '20260309T090000Z'), (self.single['iCalUID'], None),
+        ], key=str))
+        master = components[(uid, None)]
+        self.assertEqual(master['RRULE'], ['FREQ=WEEKLY;COUNT=4'])
+        self.assertEqual(master['EXDATE'], ['20260316T090000Z'])
+        moved = components[(uid, '20260309T090000Z')]
+        self.assertEqual(moved['DTSTART'], ['20260309T110000Z'])
+        self.assertEqual(moved['SUMMARY'], ['Weekly sync (moved)'])
+        # The master comes before its overrides
+        self.assertLess(keys.index((uid, None)), keys.index((uid, '20260309T090000Z')))
+
+    def test_ics_round_trip_through_import(self):
+        ics = self.export('ics')
+        rows = list(iter_upload_rows(ics.splitlines(keepends=True), 'ics'))
+        bodies = {body['summary']: body for _, body, _ in rows if body}
+        self.assertEqual(bodies['Weekly sync']['recurrence'], ['RRULE:FREQ=WEEKLY;COUNT=4', 'EXDATE:20260316T090000Z'])
+        self.assertEqual([error for _, body, error in rows if error], [
+            "modified occurrences of recurring events (RECURRENCE-ID) can't be imported",
+        ])
+
+        bob = self.connect('bob')
+        bob_service = get_calendar_service(bob)
+        report = import_events(lambda: bob_service, 'primary', iter(rows), max_workers=1)
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        imported = {event['summary']: event for event in self.events_in('bob')}
+        # The override didn't replace the series it belongs to
+        self.assertEqual(set(imported), {'Weekly sync', 'Dentist'})
+        self.assertIn('EXDATE:20260316T090000Z', imported['Weekly sync']['recurrence'])
+
+        again, _ = vevents(b''.join(stream_export(bob_service, ['primary'], 'ics')).decode())
+        self.assertEqual(again[(self.master['iCalUID'], None)]['EXDATE'], ['20260316T090000Z'])
+
+    def test_modified_occurrence_without_its_master_stands_alone(self):
+        calendar_id = self.primary('ann')
+        with self.store.lock:
+            del self.store.account('ann')['events'][calendar_id][self.master['id']]
+        components, keys = vevents(self.export('ics'))
+        self.assertEqual(len(keys), 2)
+        self.assertTrue(all(recurrence_id is None for _, recurrence_id in keys))
+        self.assertNotIn(self.master['iCalUID'], [uid for uid, _ in keys])
+
+    def test_csv_lists_cancelled_occurrences(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        by_status = Counter((row['status'], row['recurring_event_id'] == self.master['id']) for row in rows)
+        self.assertEqual(by_status, {('confirmed', False): 2, ('confirmed', True): 1, ('cancelled', True): 1})
+        cancelled = next(row for row in rows if row['status'] == 'cancelled')
+        self.assertEqual(cancelled['original_start'], '2026-03-16T09:00:00Z')
+
+    def test_ndjson(self):
+        lines = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(all(line['calendarId'] == self.primary('ann') for line in lines))
+        self.assertNotIn('Gone', [line.get('summary') for line in lines])
+
+    def test_export_view_streams_an_attachment(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/events/export/', {'format': 'ics', 'calendar_id': 'primary'})
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="primary.ics"')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+
+    def test_attachment_name_is_sanitised(self):
+        self.client.force_login(self.user)
+        calendar_id = 'Équipe "A" #1@group.calendar.google.com'
+        response = self.client.get('/events/export/', {'format': 'csv', 'calendar_id': calendar_id})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="equipe-a-1.csv"')
+        response = self.client.get('/events/export/', {'format': 'csv', 'calendar_id': '"#@example.com'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="calendar.csv"')
@@ -0,0 +1,126 @@
+import socket
+import struct
+import time
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase
+from django.utils import timezone
+from google_cal_sync import google_client
+from google_cal_sync.fake_google import FakeApiError, FakeCalendarStore, FaultInjector
+from google_cal_sync.models import GoogleToken
+from google_cal_sync.utils import get_calendar_service
+from .base import CLIENT_ENV, STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+class FakeCalendarStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = FakeCalendarStore(seed_events=3, seed=1)
+        self.account = self.store.account('ann')
+        self.primary = self.account['primary']
+
+    def test_accounts_are_seeded_once(self):
+        self.assertEqual(len(self.account['calendars']), 3)
+        self.assertEqual(len(self.account['events'][self.primary]), 3)
+        self.assertIs(self.store.account('ann'), self.account)
+
+    def test_sync_tokens_return_only_later_changes(self):
+        token = self.store.list_events(self.account, 'primary', {})['nextSyncToken']
+        event = self.store.insert_event(self.account, 'primary', make_event('New', timezone.now()))
+        self.store.delete_event(self.account, 'primary', event['id'])
+        changes = self.store.list_events(self.account, 'primary', {'syncToken': token})
+        self.assertEqual([(item['id'], item['status']) for item in changes['items']], [(event['id'], 'cancelled')])
+        with self.assertRaises(FakeApiError) as raised:
+            self.store.list_events(self.account, 'primary', {'syncToken': 'garbage'})
+        self.assertEqual(raised.exception.status, 410)
+
+    def test_pages_and_if_match(self):
+        first = self.store.list_events(self.account, 'primary', {'maxResults': 2})
+        second = self.store.list_events(self.account, 'primary', {'maxResults': 2, 'pageToken': first['nextPageToken']})
+        self.assertEqual(len(first['items']) + len(second['items']), 3)
+        self.assertNotIn('nextPageToken', second)
+        event = first['items'][0]
+        with self.assertRaises(FakeApiError) as raised:
+            self.store.patch_event(self.account, 'primary', event['id'], {'summary': 'x'}, if_match='"stale"')
+        self.assertEqual(raised.exception.status, 412)
+        patched = self.store.patch_event(self.account, 'primary', event['id'], {'summary': 'x'}, if_match=event['etag'])
+        self.assertNotEqual(patched['etag'], event['etag'])
+
+    def test_read_only_calendars_reject_writes(self):
+        with self.assertRaises(FakeApiError) as raised:
+            self.store.insert_event(self.account, 'en.usa#holiday@group.v.calendar.google.com',
+                                    make_event('Nope', timezone.now()))
+        self.assertEqual(raised.exception.status, 403)
+
+    def test_fault_injection(self):
+        with self.assertRaises(FakeApiError) as raised:
+            FaultInjector(error_rate=1.0, seed=1).apply()
+        self.assertEqual(raised.exception.status, 503)
+        with self.assertRaises(FakeApiError) as raised:
+            FaultInjector(quota_error_rate=1.0, seed=1).apply()
+        self.assertIn(raised.exception.status, (403, 429))
+        FaultInjector().apply()
+
+
+class FakeServerTests(FakeGoogleMixin, TestCase):
+    def test_client_round_trip_and_batch(self):
+        service = get_calendar_service(self.connect('ann'))
+        created = service.events().insert(
+            calendarId='primary', body=make_event('Standup', timezone.now() + timedelta(days=1)),
+        ).execute()
+        responses = {}
+        batch = service.new_batch_http_request(callback=lambda request_id, response, error: responses.update(
+            {request_id: error.resp.status if error else response['summary']}))
+        batch.add(service.events().patch(calendarId='primary', eventId=created['id'], body={'summary': 'Retro'}),
+                  request_id='patch')
+        batch.add(service.events().get(calendarId='primary', eventId='missing'), request_id='get')
+        batch.execute()
+        self.assertEqual(responses, {'patch': 'Retro', 'get': 404})
+        self.assertEqual([event['summary'] for event in self.events_in('ann')], ['Retro'])
+
+    @CLIENT_ENV
+    def test_expired_tokens_refresh_through_the_fake(self):
+        user = self.connect('ann')
+        GoogleToken.objects.filter(user=user).update(token_expiry=timezone.now() - timedelta(minutes=1))
+        service = get_calendar_service(user)
+        calendars = service.calendarList().list().execute()['items']
+        self.assertIn('ann@fake.example.com', [calendar['id'] for calendar in calendars])
+        self.assertGreater(GoogleToken.objects.get(user=user).token_expiry, timezone.now())
+
+    def test_server_errors_surface_as_http_errors(self):
+        service = get_calendar_service(self.connect('ann'))
+        self.server.faults = FaultInjector(error_rate=1.0)
+        with self.assertRaises(google_client.HttpError):
+            service.events().list(calendarId='primary').execute(num_retries=0)
+
+    def test_clients_that_hang_up_are_not_reported(self):
+        self.server.faults = FaultInjector(latency_ms=100)
+        with mock.patch.object(ThreadingHTTPServer, 'handle_error') as handle_error:
+            client = socket.create_connection(self.server.server_address)
+            client.sendall(b'GET /calendar/v3/users/me/calendarList HTTP/1.1\r\nHost: fake\r\n\r\n')
+            # Reset instead of a clean close, as a client timing out does
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            client.close()
+            time.sleep(0.3)
+        handle_error.assert_not_called()
+
+        service = get_calendar_service(self.connect('ann'))
+        self.server.faults = FaultInjector()
+        self.assertTrue(service.calendarList().list().execute()['items'])
+
+
+@STATIC_STORAGE
+class LoadTestCommandTests(FakeGoogleMixin, LiveServerTestCase):
+    @CLIENT_ENV
+    def test_reports_latency_per_path(self):
+        out = StringIO()
+        call_command('loadtest', '--url', self.live_server_url, '--requests', '4', '--concurrency', '2',
+                     '--users', '2', '--path', '/events/upcoming/', stdout=out)
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines() if line.startswith('/')}
+        # count and errors columns
+        self.assertEqual(rows['/events/upcoming/'][1:3], ['4', '0'])
+        self.assertIn('requests/s', out.getvalue())
+        # Every loadtest user's expired token was refreshed through the fake
+        self.assertFalse(GoogleToken.objects.filter(token_expiry__lt=timezone.now()).exists())
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone as dt_timezone
+from django.test import TestCase
+from django.urls import reverse
+from google_cal_sync.caching import bump_calendar_version
+from google_cal_sync.models import CalendarFeed
+from .base import FakeGoogleMixin, make_event
+from .test_exporter import vevents
+
+
+class FeedTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.calendar_id = self.primary('ann')
+        self.feed = CalendarFeed.objects.create(user=self.user, calendar_id=self.calendar_id, name='Ann', token='t' * 43)
+        self.url = reverse('google_cal_sync:calendar_feed', args=[self.feed.token])
+        start = datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc)
+        self.master = self.add_event('ann', make_event('Weekly sync', start, recurrence=['RRULE:FREQ=WEEKLY;COUNT=4']))
+        self.add_event('ann', {
+            'status': 'cancelled', 'iCalUID': self.master['iCalUID'], 'recurringEventId': self.master['id'],
+            'originalStartTime': {'dateTime': '2026-03-16T09:00:00Z'},
+        })
+        self.add_event('ann', make_event('Dentist', datetime(2026, 3, 4, 15, tzinfo=dt_timezone.utc)))
+
+    def test_feed_writes_cancelled_occurrences_as_exdate(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        components, keys = vevents(response.content.decode())
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(components[(self.master['iCalUID'], None)]['EXDATE'], ['20260316T090000Z'])
+
+    def test_conditional_requests_get_304(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_gzip_copy_has_its_own_etag(self):
+        plain = self.client.get(self.url)
+        zipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(zipped['Content-Encoding'], 'gzip')
+        self.assertEqual(zipped['ETag'], plain['ETag'][:-1] + '-gz"')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=plain['ETag'], HTTP_ACCEPT_ENCODING='gzip').status_code, 200)
+
+    def test_changes_in_google_give_a_new_body(self):
+        etag = self.client.get(self.url)['ETag']
+        self.add_event('ann', make_event('Lunch', datetime(2026, 3, 6, 12, tzinfo=dt_timezone.utc)))
+        # Same version and still fresh: served from the cache
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        bump_calendar_version(self.user.pk, self.calendar_id)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'SUMMARY:Lunch', response.content)
+
+    def test_unknown_token_is_404(self):
+        self.assertEqual(self.client.get(reverse('google_cal_sync:calendar_feed', args=['nope'])).status_code, 404)
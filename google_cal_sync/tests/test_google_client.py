@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.test import SimpleTestCase
+from google_cal_sync import google_client
+
+
+CHECK_IMPORTS = """
+import json, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+lazy = ('googleapiclient', 'google_auth_oauthlib', 'google.auth')
+loaded = [name for name in lazy if name in sys.modules]
+from google_cal_sync import google_client
+if sys.argv[1] == 'preload':
+    google_client.preload()
+print(json.dumps({'before': loaded, 'after': [name for name in lazy if name in sys.modules]}))
+"""
+
+
+def imported_modules(mode):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='OJT_project.settings')
+    output = subprocess.run(
+        [sys.executable, '-c', CHECK_IMPORTS, mode], cwd=settings.BASE_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_urlconf_does_not_import_the_google_stack(self):
+        modules = imported_modules('lazy')
+        self.assertEqual(modules, {'before': [], 'after': []})
+
+    def test_preload_imports_everything(self):
+        self.assertEqual(imported_modules('preload')['after'], ['googleapiclient', 'google_auth_oauthlib', 'google.auth'])
+
+    def test_names_resolve_on_first_use(self):
+        from googleapiclient.errors import HttpError
+        self.assertIs(google_client.HttpError, HttpError)
+        with self.assertRaises(AttributeError):
+            google_client.NotAName
+
+    def test_discovery_document_is_read_once(self):
+        google_client._discovery_documents.clear()
+        self.addCleanup(google_client._discovery_documents.clear)
+        document = google_client.discovery_document()
+        self.assertIs(google_client.discovery_document(), document)
+        self.assertEqual(json.loads(document)['name'], 'calendar')
+
+    def test_discovery_document_points_at_the_configured_server(self):
+        google_client._discovery_documents.clear()
+        self.addCleanup(google_client._discovery_documents.clear)
+        with self.settings(GOOGLE_API_BASE_URL='http://127.0.0.1:9'):
+            document = json.loads(google_client.discovery_document())
+        self.assertEqual(document['rootUrl'], 'http://127.0.0.1:9/')
+        self.assertTrue(document['baseUrl'].startswith('http://127.0.0.1:9/calendar/'))
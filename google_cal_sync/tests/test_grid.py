@@ -0,0 +1,60 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync.grid import adjacent_anchors, bucket_events_by_day, window_bounds, window_time_range
+from google_cal_sync.utils import normalize_event
+from .base import STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+@override_settings(TIME_ZONE='UTC')
+class GridLayoutTests(SimpleTestCase):
+    def test_windows_start_on_monday(self):
+        wednesday = date(2026, 4, 15)
+        self.assertEqual(window_bounds('week', wednesday), (date(2026, 4, 13), date(2026, 4, 20)))
+        # April 2026 starts on a Wednesday and ends on a Thursday
+        self.assertEqual(window_bounds('month', wednesday), (date(2026, 3, 30), date(2026, 5, 4)))
+        self.assertEqual(adjacent_anchors('month', date(2026, 1, 31)), (date(2025, 12, 1), date(2026, 2, 1)))
+        self.assertEqual(window_time_range(date(2026, 4, 13), date(2026, 4, 20)),
+                         ('2026-04-13T00:00:00+00:00', '2026-04-20T00:00:00+00:00'))
+
+    def test_events_land_in_their_days(self):
+        monday = date(2026, 4, 13)
+        nine = datetime(2026, 4, 13, 9, tzinfo=dt_timezone.utc)
+        lunch = normalize_event(make_event('Lunch', nine + timedelta(days=1)))
+        late = normalize_event(make_event('Late', nine + timedelta(hours=14), minutes=15 * 60))
+        offsite = normalize_event({'summary': 'Offsite', 'start': {'date': '2026-04-16'}, 'end': {'date': '2026-04-18'}})
+        until_midnight = normalize_event(make_event('Until midnight', nine + timedelta(days=4, hours=14), minutes=60))
+        weeks = bucket_events_by_day([lunch, late, offsite, until_midnight], monday, monday + timedelta(days=7))
+        days = weeks[0]
+        self.assertEqual(len(weeks), 1)
+        self.assertEqual([entry['event']['summary'] for entry in days[1]['events']], ['Lunch'])
+        # Crossing midnight makes a span over both days
+        self.assertEqual([(entry['starts_here'], entry['ends_here']) for entry in days[0]['spans']], [(True, False)])
+        self.assertEqual([(entry['starts_here'], entry['ends_here']) for entry in days[1]['spans']], [(False, True)])
+        # All-day end dates are exclusive
+        self.assertEqual([bool(day['spans']) for day in days[3:6]], [True, True, False])
+        self.assertEqual([entry['event']['summary'] for entry in days[4]['events']], ['Until midnight'])
+
+
+@STATIC_STORAGE
+class CalendarGridViewTests(FakeGoogleMixin, TestCase):
+    def test_week_grid_from_google(self):
+        user = self.connect('ann')
+        self.client.force_login(user)
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(today, datetime.min.time())) + timedelta(hours=10)
+        self.add_event('ann', make_event('Planning', start))
+        self.add_event('ann', make_event('Next month', start + timedelta(days=40)))
+        response = self.client.get(reverse('google_cal_sync:calendar_grid'), {'view': 'week'})
+        self.assertContains(response, 'Planning')
+        self.assertNotContains(response, 'Next month')
+        cells = [cell for week in response.context['weeks'] for cell in week]
+        self.assertEqual(len(cells), 7)
+        self.assertEqual([cell['date'] for cell in cells if cell['is_today']], [today])
+
+    def test_bad_date_falls_back_to_today(self):
+        self.client.force_login(self.connect('ann'))
+        response = self.client.get(reverse('google_cal_sync:calendar_grid'), {'view': 'month', 'date': 'soon'})
+        self.assertEqual(response.context['anchor'], timezone.localdate())
+        self.assertEqual(response.context['view'], 'month')
@@ -0,0 +1,145 @@
+import os
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, TransactionTestCase
+from google_cal_sync import importer
+from google_cal_sync.caching import calendar_version
+from google_cal_sync.ical import iter_vevents, parse_ical_datetime, vevent_to_event_body
+from google_cal_sync.importer import csv_row_to_event_body, import_events, iter_upload_rows, run_import_job
+from google_cal_sync.models import ImportJob, IndexedEvent
+from google_cal_sync.utils import get_calendar_service
+from .base import FakeGoogleMixin
+
+
+ICS = """BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:utc-1@example.com
+SUMMARY:Standup\\, daily
+DTSTART:20260302T090000Z
+DTEND:20260302T091500Z
+END:VEVENT
+BEGIN:VEVENT
+UID:floating-1@example.com
+SUMMARY:Floating lunch
+DTSTART:20260302T120000
+DURATION:PT45M
+BEGIN:VALARM
+TRIGGER:-PT5M
+END:VALARM
+END:VEVENT
+BEGIN:VEVENT
+UID:zoned-1@example.com
+SUMMARY:Berlin call
+DTSTART;TZID=Europe/Berlin:20260303T100000
+DTEND;TZID=Europe/Berlin:20260303T110000
+END:VEVENT
+BEGIN:VEVENT
+UID:day-1@example.com
+SUMMARY:Offsite
+DTSTART;VALUE=DATE:20260305
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:No start
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def ics_rows(text=ICS, default_timezone='America/New_York'):
+    return list(iter_upload_rows(text.splitlines(keepends=True), 'ics', default_timezone))
+
+
+class IcalParsingTests(SimpleTestCase):
+    def test_floating_times_take_the_default_timezone(self):
+        self.assertEqual(
+            parse_ical_datetime('20260302T120000', {}, 'Asia/Tokyo'),
+            {'dateTime': '2026-03-02T12:00:00', 'timeZone': 'Asia/Tokyo'},
+        )
+
+    def test_tzid_and_utc_times_keep_their_zone(self):
+        self.assertEqual(
+            parse_ical_datetime('20260302T120000', {'TZID': 'Europe/Berlin'}, 'Asia/Tokyo'),
+            {'dateTime': '2026-03-02T12:00:00', 'timeZone': 'Europe/Berlin'},
+        )
+        self.assertEqual(parse_ical_datetime('20260302T120000Z', {}, 'Asia/Tokyo'), {'dateTime': '2026-03-02T12:00:00Z'})
+        self.assertEqual(parse_ical_datetime('20260302', {'VALUE': 'DATE'}, 'Asia/Tokyo'), {'date': '2026-03-02'})
+
+    def test_rows(self):
+        rows = ics_rows()
+        self.assertEqual([number for number, _, _ in rows], [3, 9, 18, 24, 29])
+        standup, lunch, berlin, offsite = (body for _, body, _ in rows[:4])
+        self.assertEqual(standup['summary'], 'Standup, daily')
+        self.assertEqual(standup['iCalUID'], 'utc-1@example.com')
+        self.assertEqual(lunch['start'], {'dateTime': '2026-03-02T12:00:00', 'timeZone': 'America/New_York'})
+        self.assertEqual(lunch['end'], {'dateTime': '2026-03-02T12:45:00', 'timeZone': 'America/New_York'})
+        self.assertEqual(berlin['end']['timeZone'], 'Europe/Berlin')
+        self.assertEqual(offsite['end'], {'date': '2026-03-06'})
+        self.assertEqual(rows[4][1:], (None, 'DTSTART is required'))
+
+    def test_folded_lines_and_recurrence(self):
+        text = "BEGIN:VEVENT\r\nSUMMARY:A very long\r\n  title\r\nDTSTART:20260302T090000Z\r\nRRULE:FREQ=WEEKLY;COUNT=3\r\nEND:VEVENT\r\n"
+        (_, properties), = iter_vevents(text.splitlines(keepends=True))
+        body = vevent_to_event_body(properties)
+        self.assertEqual(body['summary'], 'A very long title')
+        self.assertEqual(body['recurrence'], ['RRULE:FREQ=WEEKLY;COUNT=3'])
+        self.assertEqual(body['end'], {'dateTime': '2026-03-02T10:00:00Z'})
+
+
+class CsvRowTests(SimpleTestCase):
+    def test_naive_times_take_the_default_timezone(self):
+        body = csv_row_to_event_body({'title': 'Review', 'start': '2026-03-02 09:00'}, 'Europe/Paris')
+        self.assertEqual(body['start'], {'dateTime': '2026-03-02T09:00:00', 'timeZone': 'Europe/Paris'})
+        self.assertEqual(body['end'], {'dateTime': '2026-03-02T10:00:00', 'timeZone': 'Europe/Paris'})
+
+    def test_invalid_rows(self):
+        cases = [
+            ({'start': '2026-03-02'}, 'title is required'),
+            ({'title': 'x', 'start': 'soon'}, 'invalid start'),
+            ({'title': 'x', 'start': '2026-03-02', 'end': '2026-03-02T10:00'}, 'both be dates'),
+            ({'title': 'x', 'start': '2026-03-02T10:00', 'end': '2026-03-02T09:00'}, 'end is before start'),
+        ]
+        for row, message in cases:
+            with self.subTest(row=row), self.assertRaisesRegex(ValueError, message):
+                csv_row_to_event_body(row, 'UTC')
+
+    def test_header_names_are_case_insensitive(self):
+        rows = list(iter_upload_rows(['Title,Start,Location\n', 'Demo,2026-03-02,Room 1\n', ',2026-03-02,\n'], 'csv'))
+        self.assertEqual(rows[0][1]['location'], 'Room 1')
+        self.assertEqual(rows[1], (3, None, 'title is required'))
+
+
+class ImportTests(FakeGoogleMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+
+    def test_import_creates_events_and_is_idempotent(self):
+        valid = [row for row in ics_rows() if row[1] is not None]
+        for _ in range(2):
+            report = import_events(lambda: get_calendar_service(self.user), 'primary', iter(valid), batch_size=2)
+            self.assertEqual((report['processed'], report['created'], report['failed']), (4, 4, 0))
+        events = {event['summary']: event for event in self.events_in('ann')}
+        self.assertEqual(len(events), 4)
+        self.assertEqual(events['Floating lunch']['start']['timeZone'], 'America/New_York')
+
+    def test_worker_threads_close_their_connections(self):
+        valid = [row for row in ics_rows() if row[1] is not None]
+        with mock.patch.object(importer, 'connection') as connection:
+            import_events(lambda: get_calendar_service(self.user), 'primary', iter(valid), batch_size=1, max_workers=2)
+        self.assertEqual(connection.close.call_count, 4)
+
+    def test_run_import_job(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ics', delete=False) as upload:
+            upload.write(ICS)
+        job = ImportJob.objects.create(user=self.user, calendar_id='primary', filename='x.ics', file_format='ics')
+        version = calendar_version(self.user.pk, 'primary')
+        run_import_job(job, upload.name)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.processed, job.created, job.failed), (5, 4, 1))
+        self.assertEqual(job.failures, [[29, 'DTSTART is required']])
+        self.assertFalse(os.path.exists(upload.name))
+        self.assertEqual(IndexedEvent.objects.filter(user=self.user).count(), 4)
+        # Cached pages, feeds and the change feed see the new events
+        self.assertNotEqual(calendar_version(self.user.pk, 'primary'), version)
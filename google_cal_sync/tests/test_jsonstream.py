@@ -0,0 +1,74 @@
+import json
+import tracemalloc
+from datetime import timedelta
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from google_cal_sync import google_client
+from google_cal_sync.jsonstream import iter_items
+from google_cal_sync.management.commands.bench_parsing import parse_stream, parse_tree, synthetic_page
+from google_cal_sync.utils import fetch_events_window, get_calendar_service, iter_response_items
+from .base import FakeGoogleMixin, make_event
+
+
+class IterItemsTests(SimpleTestCase):
+    def test_items_and_meta_match_json_loads(self):
+        page = {
+            'kind': 'calendar#events',
+            'items': [{'id': 'a', 'attendees': [{'email': 'x@example.com'}], 'summary': 'Brace } in "text" ]'},
+                      {'id': 'b', 'nested': {'items': [1, 2]}}],
+            'nextPageToken': 'p2',
+            'count': 2,
+        }
+        for text in (json.dumps(page), json.dumps(page, indent=2)):
+            meta = {}
+            self.assertEqual(list(iter_items(text, meta)), page['items'])
+            self.assertEqual(meta, {'kind': 'calendar#events', 'nextPageToken': 'p2', 'count': 2})
+
+    def test_items_are_yielded_before_the_rest_is_decoded(self):
+        items = iter_items('{"items": [{"id": "a"}, {"id": "b"} oops', {})
+        self.assertEqual(next(items), {'id': 'a'})
+        with self.assertRaises(json.JSONDecodeError):
+            list(items)
+
+    def test_empty_and_missing_items(self):
+        meta = {}
+        self.assertEqual(list(iter_items('{}', meta)), [])
+        self.assertEqual(list(iter_items('{"items": [], "nextSyncToken": "s"}', meta)), [])
+        self.assertEqual(meta, {'nextSyncToken': 's'})
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_items('[]', {}))
+
+    def test_streaming_holds_less_than_the_decoded_page(self):
+        content = synthetic_page(200, 30)
+
+        def traced_peak(parse):
+            tracemalloc.start()
+            try:
+                events, _ = parse(content)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        # Normalized events mustn't keep each decoded item (and its guest list) alive
+        self.assertLess(traced_peak(parse_stream) * 2, traced_peak(parse_tree))
+
+
+class IterResponseItemsTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = get_calendar_service(self.connect('ann'))
+
+    def test_pages_are_followed(self):
+        start = timezone.now() + timedelta(days=1)
+        for index in range(5):
+            self.add_event('ann', make_event(f'Event {index}', start + timedelta(hours=index)))
+        events = fetch_events_window(self.service, 'primary', timezone.now().isoformat(),
+                                     (start + timedelta(days=1)).isoformat(), page_size=2)
+        self.assertEqual([event['summary'] for event in events], [f'Event {index}' for index in range(5)])
+
+    def test_meta_and_errors(self):
+        meta = {}
+        self.assertEqual(list(iter_response_items(self.service.events().list(calendarId='primary'), meta)), [])
+        self.assertIn('nextSyncToken', meta)
+        with self.assertRaises(google_client.HttpError):
+            iter_response_items(self.service.events().list(calendarId='missing@example.com'))
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import live
+from google_cal_sync.utils import normalize_event
+from OJT_project.asgi import application
+from .base import STATIC_STORAGE, make_event, reset_state
+
+
+@STATIC_STORAGE
+class LiveEventsViewTests(TransactionTestCase):
+    def setUp(self):
+        reset_state()
+        self.user = User.objects.create(username='ann')
+        self.url = reverse('google_cal_sync:live_events')
+
+    def test_needs_login_and_a_known_page(self):
+        self.assertEqual(self.client.get(self.url, {'page': 'upcoming'}).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url, {'page': 'nope'}).status_code, 400)
+        # Not under ASGI: no endless stream
+        self.assertEqual(self.client.get(self.url, {'page': 'upcoming'}).status_code, 204)
+
+    async def test_stream_sends_published_changes(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'page': 'upcoming'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertIn(b'retry:', await anext(chunks))
+
+        start = timezone.now() + timedelta(hours=1)
+        event = normalize_event(dict(make_event('Lunch', start), id='lunch'))
+        other = normalize_event(dict(make_event('Elsewhere', start), id='other'))
+        await sync_to_async(live.publish)(self.user.pk, 'team@example.com', [('other', other)])
+        await sync_to_async(live.publish)(self.user.pk, 'primary', [('lunch', event), ('gone', None)])
+
+        messages = [(await asyncio.wait_for(anext(chunks), 5)).decode() for _ in range(3)]
+        # Changes to other calendars only move the client's Last-Event-ID on
+        self.assertNotIn('data:', messages[0])
+        self.assertIn('event: change', messages[1])
+        self.assertIn('"action": "upsert"', messages[1])
+        self.assertIn('Lunch', messages[1])
+        self.assertIn('"action": "remove"', messages[2])
+        # The test client never closes the stream; let the hub's poller stop
+        hub = live.hub()
+        for connection in [connection for connections in hub.connections.values() for connection in connections]:
+            hub.unsubscribe(connection)
+        hub.wakeup.set()
+        await asyncio.sleep(0)
+
+
+class LiveStreamThreadTests(TransactionTestCase):
+    """Streams opened through the project's ASGI application, as a server would."""
+
+    def setUp(self):
+        reset_state()
+        self.user = User.objects.create(username='ann')
+
+    async def open_stream(self, cookie):
+        path = reverse('google_cal_sync:live_events')
+        stream = ApplicationCommunicator(application, {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'page=upcoming',
+            'root_path': '', 'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        })
+        await stream.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await stream.receive_output(5))['status'], 200)
+        self.assertIn(b'retry:', (await stream.receive_output(5))['body'])
+        return stream
+
+    async def test_idle_streams_hold_no_threads(self):
+        await self.async_client.aforce_login(self.user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.async_client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        # The first streams start the hub and any pool threads that are shared
+        streams = [await self.open_stream(cookie) for _ in range(2)]
+        threads = threading.active_count()
+        streams += [await self.open_stream(cookie) for _ in range(10)]
+        self.assertLessEqual(threading.active_count(), threads + 1)
+
+        for stream in streams:
+            await stream.send_input({'type': 'http.disconnect'})
+        for stream in streams:
+            await stream.wait(5)
+        self.assertEqual(live.hub().connections, {})
+        live.hub().wakeup.set()
+        await asyncio.sleep(0)
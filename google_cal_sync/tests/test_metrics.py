@@ -0,0 +1,61 @@
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from google_cal_sync import metrics
+from google_cal_sync.metrics import ERROR, OK, THROTTLED, UNAVAILABLE, HealthMetrics, classify, percentile
+from .base import STATIC_STORAGE, FakeGoogleMixin
+
+
+class HealthMetricsTests(SimpleTestCase):
+    def test_percentile_and_classify(self):
+        self.assertEqual(percentile([10, 20, 30, 40], 0.5), 20)
+        self.assertEqual(percentile([10, 20, 30, 40], 0.99), 40)
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(classify(429), THROTTLED)
+        self.assertEqual(classify(403, b'{"reason": "rateLimitExceeded"}'), THROTTLED)
+        self.assertEqual(classify(403, b'{"reason": "forbidden"}'), OK)
+        self.assertEqual(classify(503), ERROR)
+
+    def test_summary_per_scope(self):
+        health = HealthMetrics()
+        health.record_call('events_read', 0.1, OK, user_id=1)
+        health.record_call('events_read', 0.3, UNAVAILABLE, user_id=1)
+        health.record_call('freebusy', 0.2, THROTTLED, user_id=2)
+        health.record_lookup(True, user_id=1)
+        health.record_lookup(False, user_id=1)
+        summary = health.summary('user:1')
+        self.assertEqual((summary['calls'], summary['p50_ms'], summary['max_ms']), (2, 100.0, 300.0))
+        self.assertEqual((summary['errors'], summary['throttled'], summary['cache_hit_rate']), (1, 0, 0.5))
+        self.assertEqual(health.summary()['calls'], 3)
+        self.assertEqual(list(health.endpoint_summaries()), ['events_read', 'freebusy'])
+        self.assertEqual(health.generation('user:2'), 1)
+
+    def test_old_samples_and_scopes_fall_out(self):
+        health = HealthMetrics(size=2)
+        with mock.patch.object(metrics.time, 'time', return_value=1000.0):
+            health.record_call('events_read', 0.1, OK)
+        self.assertEqual(health.summary()['calls'], 0)
+        for _ in range(3):
+            health.record_call('events_read', 0.1, OK)
+        self.assertEqual(health.summary()['calls'], 2)
+
+        health = HealthMetrics(max_scopes=2)
+        for user_id in (1, 2):
+            health.record_lookup(True, user_id=user_id)
+        self.assertEqual(list(health.lookups), ['all', 'user:2'])
+
+
+@STATIC_STORAGE
+class SettingsHealthPanelTests(FakeGoogleMixin, TestCase):
+    def test_panel_shows_the_users_calls(self):
+        user = self.connect('ann')
+        self.client.force_login(user)
+        response = self.client.get(reverse('google_cal_sync:settings'), {'inline': 1})
+        self.assertContains(response, 'Sync Health')
+        self.assertGreater(response.context['upstream_health']['calls'], 0)
+        self.assertNotIn('endpoint_health', response.context)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('google_cal_sync:settings'), {'inline': 1})
+        self.assertIn('calendar_list', response.context['endpoint_health'])
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from google_cal_sync import prefetch
+from google_cal_sync.caching import bump_calendar_version, get_upcoming_events, peek_cached
+from google_cal_sync.prefetch import Prefetcher
+from google_cal_sync.utils import get_calendar_service
+from .base import FakeGoogleMixin, make_event
+
+
+TEAM = 'team-ann@group.fake.example.com'
+SPEC = ('upcoming', 20)
+
+
+class PrefetcherTests(FakeGoogleMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.add_event('ann', make_event('Team sync', timezone.now() + timedelta(days=1)), calendar_id=TEAM)
+        settings = override_settings(PREFETCH_WORKERS=1, PREFETCH_USER_BUDGET=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.prefetcher = Prefetcher()
+
+    def drain(self):
+        self.prefetcher.executor.shutdown(wait=True)
+
+    def test_fills_the_cache_and_counts_the_hit(self):
+        self.prefetcher.schedule(self.user, [(TEAM, SPEC)])
+        self.drain()
+        self.assertEqual([event['summary'] for event in peek_cached(self.user, TEAM, SPEC)], ['Team sync'])
+        # The page then reads the warm entry
+        get_upcoming_events(self.user, get_calendar_service(self.user), TEAM, 20)
+        self.prefetcher.record_use(self.user, TEAM, SPEC)
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats['scheduled'], stats['filled'], stats['used'], stats['hit_rate']), (1, 1, 1, 1.0))
+
+    def test_workers_close_their_connections(self):
+        with mock.patch.object(prefetch, 'connection') as connection:
+            self.prefetcher.schedule(self.user, [(TEAM, SPEC)])
+            self.drain()
+        connection.close.assert_called_once_with()
+
+    def test_changed_calendar_is_not_a_hit(self):
+        self.prefetcher.schedule(self.user, [(TEAM, SPEC)])
+        self.drain()
+        bump_calendar_version(self.user.pk, TEAM)
+        self.prefetcher.record_use(self.user, TEAM, SPEC)
+        self.assertEqual(self.prefetcher.stats()['used'], 0)
+
+    def test_cached_entries_and_budget_skip_fetches(self):
+        self.prefetcher.schedule(self.user, [(TEAM, SPEC), ('primary', SPEC), (TEAM, ('upcoming', 5))])
+        self.drain()
+        self.prefetcher = Prefetcher()
+        self.prefetcher.schedule(self.user, [(TEAM, SPEC), (TEAM, ('upcoming', 1))])
+        self.drain()
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats['filled'], stats['cached'], stats['over_budget']), (2, 1, 2))
+
+    def test_nothing_is_queued_under_load(self):
+        with mock.patch.object(prefetch, 'under_load', return_value=True):
+            self.prefetcher.schedule(self.user, [(TEAM, SPEC)])
+        self.assertEqual(self.prefetcher.stats()['scheduled'], 0)
+        self.assertIsNone(self.prefetcher.executor)
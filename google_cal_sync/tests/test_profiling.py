@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from google_cal_sync.profiling import make_profile_token, profile_path, sweep_profiles
+from .base import STATIC_STORAGE, reset_state
+
+
+@STATIC_STORAGE
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        reset_state()
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = profile_dir.name
+        settings = override_settings(PROFILING_ENABLED=True, PROFILE_DIR=self.profile_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff = User.objects.create(username='admin', is_staff=True)
+        self.url = reverse('google_cal_sync:search_events')
+
+    def test_staff_request_writes_a_report(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'q': 'standup', '_profile': 1})
+        self.assertEqual(response.status_code, 200)
+        report_url = response['Link'].split(';')[0].strip('<>')
+        self.assertEqual(len(os.listdir(self.profile_dir)), 2)
+
+        report = self.client.get(report_url)
+        self.assertContains(report, 'Self time by area:')
+        self.assertContains(report, 'SQL queries:')
+        download = self.client.get(report_url, {'download': 1})
+        self.assertEqual(download['Content-Disposition'].split(';')[0], 'attachment')
+
+    async def test_async_chain_profiles_in_a_thread(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(self.url, {'q': 'standup', '_profile': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('rel="profile"', response['Link'])
+        self.assertFalse((await self.async_client.get(self.url, {'q': 'standup'})).has_header('Link'))
+
+    def test_signed_token_profiles_without_a_session(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE_TOKEN=make_profile_token())
+        self.assertIn('rel="profile"', response['Link'])
+        self.assertFalse(self.client.get(self.url, HTTP_X_PROFILE_TOKEN='forged').has_header('Link'))
+
+    def test_tokens_are_single_use(self):
+        token = make_profile_token()
+        self.assertTrue(self.client.get(self.url, HTTP_X_PROFILE_TOKEN=token).has_header('Link'))
+        replay = self.client.get(self.url, HTTP_X_PROFILE_TOKEN=token)
+        self.assertFalse(replay.has_header('Link'))
+        self.assertEqual(len(os.listdir(self.profile_dir)), 2)
+
+    def test_sweep_keeps_the_newest_reports(self):
+        now = time.time()
+        for age, name in enumerate('abcd'):
+            for extension in ('prof', 'txt'):
+                path = profile_path(name * 32, extension)
+                open(path, 'w').close()
+                os.utime(path, (now - age * 60, now - age * 60))
+        open(os.path.join(self.profile_dir, 'notes.txt'), 'w').close()
+
+        with self.settings(PROFILE_MAX_FILES=2, PROFILE_MAX_AGE=3600):
+            sweep_profiles()
+        self.assertEqual(sorted(os.listdir(self.profile_dir)), [
+            'a' * 32 + '.prof', 'a' * 32 + '.txt', 'b' * 32 + '.prof', 'b' * 32 + '.txt', 'notes.txt',
+        ])
+        with self.settings(PROFILE_MAX_FILES=2, PROFILE_MAX_AGE=30):
+            sweep_profiles()
+        self.assertEqual(sorted(os.listdir(self.profile_dir)), ['a' * 32 + '.prof', 'a' * 32 + '.txt', 'notes.txt'])
+
+    def test_other_users_are_not_profiled(self):
+        self.client.force_login(User.objects.create(username='ann'))
+        response = self.client.get(self.url, {'_profile': 1})
+        self.assertFalse(response.has_header('Link'))
+        self.assertEqual(os.listdir(self.profile_dir), [])
+        self.assertEqual(self.client.get(reverse('google_cal_sync:profile_report', args=['0' * 32])).status_code, 404)
+
+    def test_disabled_middleware_is_dropped(self):
+        with self.settings(PROFILING_ENABLED=False):
+            self.client.force_login(self.staff)
+            response = self.client.get(self.url, {'_profile': 1})
+        self.assertFalse(response.has_header('Link'))
@@ -0,0 +1,104 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+from google_cal_sync.models import IndexedEvent, SentReminder
+from google_cal_sync.reminders import EmailReminderSink, ReminderScheduler, ReminderSink
+
+
+class RecordingSink(ReminderSink):
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    def send(self, event, minutes_before):
+        if self.error:
+            raise self.error
+        self.sent.append((event.event_id, minutes_before))
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='ann', email='ann@example.com')
+        self.now = timezone.now()
+
+    def index(self, event_id, minutes_from_now, **fields):
+        return IndexedEvent.objects.create(
+            user=self.user, calendar_id='primary', event_id=event_id, summary=event_id.title(),
+            start=self.now + timedelta(minutes=minutes_from_now), **fields,
+        )
+
+    def scheduler(self, sink=None, offsets=(10,)):
+        scheduler = ReminderScheduler(sink or RecordingSink(), offsets=list(offsets), horizon=timedelta(minutes=30),
+                                      max_workers=1)
+        self.addCleanup(scheduler.executor.shutdown)
+        return scheduler
+
+    def fire(self, scheduler, minutes_from_now):
+        sent = scheduler.fire_due(self.now + timedelta(minutes=minutes_from_now))
+        # One worker runs deliveries in order, so this waits for all of them
+        scheduler.executor.submit(int).result()
+        scheduler.record_failures()
+        return sent
+
+    def test_only_the_horizon_is_held_in_memory(self):
+        self.index('soon', 20)
+        self.index('later', 20 + 60)
+        scheduler = self.scheduler(offsets=(10, 5))
+        self.assertEqual(scheduler.refill(self.now), 2)
+        self.assertEqual(sorted(offset for _, _, _, offset, _ in scheduler.heap), [5, 10])
+        # The horizon slides over the later event
+        self.assertEqual(scheduler.refill(self.now + timedelta(minutes=60)), 2)
+
+    def test_fires_once_at_the_offset(self):
+        self.index('standup', 15)
+        scheduler = self.scheduler()
+        scheduler.refill(self.now)
+        self.assertEqual(scheduler.fire_due(self.now + timedelta(minutes=4)), 0)
+        self.assertEqual(self.fire(scheduler, 5), 1)
+        self.assertEqual(scheduler.sink.sent, [('standup', 10)])
+        self.assertEqual(SentReminder.objects.get().event_id, 'standup')
+
+        # A restarted dispatcher finds the claim and doesn't resend
+        restarted = self.scheduler()
+        restarted.refill(self.now)
+        self.assertEqual(self.fire(restarted, 5), 0)
+        self.assertEqual(restarted.stats['skipped'], 1)
+
+    def test_moved_events_fire_at_their_new_time(self):
+        event = self.index('review', 15)
+        scheduler = self.scheduler()
+        scheduler.refill(self.now)
+        IndexedEvent.objects.filter(pk=event.pk).update(start=self.now + timedelta(minutes=25), indexed_at=timezone.now())
+        self.assertEqual(scheduler.poll_changes(self.now), 1)
+        # The superseded entry is dropped when it reaches the top of the heap
+        self.assertEqual(self.fire(scheduler, 5), 0)
+        self.assertEqual(scheduler.stats['skipped'], 0)
+        self.assertEqual(self.fire(scheduler, 15), 1)
+        self.assertEqual(scheduler.sink.sent, [('review', 10)])
+
+    def test_deleted_events_are_skipped(self):
+        event = self.index('cancelled', 15)
+        scheduler = self.scheduler()
+        scheduler.refill(self.now)
+        event.delete()
+        self.assertEqual(self.fire(scheduler, 5), 0)
+        self.assertEqual(scheduler.stats['skipped'], 1)
+        self.assertFalse(SentReminder.objects.exists())
+
+    def test_sink_failures_are_recorded_on_the_claim(self):
+        self.index('standup', 15)
+        scheduler = self.scheduler(RecordingSink(error=OSError('mail server down')))
+        scheduler.refill(self.now)
+        with self.assertLogs('google_cal_sync.reminders', 'WARNING'):
+            self.fire(scheduler, 5)
+        self.assertEqual(scheduler.stats['failed'], 1)
+        self.assertEqual(SentReminder.objects.get().error, 'mail server down')
+
+    def test_email_sink(self):
+        event = self.index('standup', 15, location='Room A')
+        EmailReminderSink().send(event, 10)
+        self.assertEqual(mail.outbox[0].subject, 'Reminder: Standup in 10 min')
+        self.assertIn('Location: Room A', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].to, ['ann@example.com'])
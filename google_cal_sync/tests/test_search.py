@@ -0,0 +1,77 @@
+from datetime import datetime, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.test import TestCase
+from google_cal_sync.models import IndexedEvent
+from google_cal_sync.search import index_events, remove_events, search_events
+from google_cal_sync.utils import normalize_event
+from .base import STATIC_STORAGE
+
+
+def event(event_id, summary, updated='2026-01-01T00:00:00Z', **fields):
+    return normalize_event(dict(
+        id=event_id, summary=summary, updated=updated, status='confirmed',
+        start={'dateTime': '2026-03-02T09:00:00Z'}, end={'dateTime': '2026-03-02T10:00:00Z'}, **fields,
+    ))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='ann')
+        self.other = User.objects.create(username='bob')
+        index_events(self.user, 'primary', [
+            event('a', 'Quarterly planning', description='Budget review', location='Room A'),
+            event('b', 'Lunch with Sam', location='Cafe'),
+            event('c', 'Planning retro'),
+        ])
+        index_events(self.other, 'primary', [event('z', 'Planning for bob')])
+
+    def ids(self, query):
+        return sorted(row.event_id for row in search_events(self.user, query))
+
+    def test_matches_summary_description_and_location(self):
+        self.assertEqual(self.ids('planning'), ['a', 'c'])
+        self.assertEqual(self.ids('budget'), ['a'])
+        self.assertEqual(self.ids('cafe'), ['b'])
+
+    def test_every_term_must_match_and_last_is_a_prefix(self):
+        self.assertEqual(self.ids('planning quart'), ['a'])
+        self.assertEqual(self.ids('plan'), ['a', 'c'])
+        self.assertEqual(self.ids('planning lunch'), [])
+
+    def test_results_are_per_user(self):
+        self.assertNotIn('z', self.ids('bob'))
+
+    def test_unchanged_events_are_skipped_and_cancelled_removed(self):
+        self.assertEqual(index_events(self.user, 'primary', [event('a', 'Quarterly planning')]), 0)
+        written = index_events(self.user, 'primary', [
+            event('a', 'Annual planning', updated='2026-01-02T00:00:00Z'),
+            dict(event('b', 'Lunch with Sam'), status='cancelled'),
+        ])
+        self.assertEqual(written, 1)
+        self.assertEqual(self.ids('annual'), ['a'])
+        self.assertEqual(self.ids('lunch'), [])
+
+    def test_remove_events(self):
+        remove_events(self.user, 'primary', ['a', 'c'])
+        self.assertEqual(self.ids('planning'), [])
+        self.assertEqual(IndexedEvent.objects.filter(user=self.user).count(), 1)
+
+    def test_indexed_fields(self):
+        row = IndexedEvent.objects.get(user=self.user, event_id='a')
+        self.assertEqual(row.start, datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc))
+        self.assertEqual(row.location, 'Room A')
+
+
+@STATIC_STORAGE
+class SearchViewTests(TestCase):
+    def test_view_searches_the_index_without_google(self):
+        user = User.objects.create(username='ann')
+        index_events(user, 'primary', [event('a', 'Quarterly planning')])
+        self.client.force_login(user)
+        response = self.client.get('/events/search/', {'q': 'quarterly'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row.event_id for row in response.context['results']], ['a'])
+
+    def test_view_requires_login(self):
+        response = self.client.get('/events/search/', {'q': 'x'})
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
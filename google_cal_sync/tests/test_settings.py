@@ -0,0 +1,44 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from google_cal_sync import views
+from .base import STATIC_STORAGE, FakeGoogleMixin, make_event
+
+
+@STATIC_STORAGE
+class SettingsAnalyticsTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.connect('ann')
+        self.client.force_login(self.user)
+        self.add_event('ann', make_event('Standup', timezone.now() - timedelta(days=1)))
+        self.url = reverse('google_cal_sync:settings')
+        self.fragment_url = reverse('google_cal_sync:settings_analytics')
+
+    def test_page_leaves_uncached_analytics_to_the_fragment(self):
+        with mock.patch.object(views, 'get_calendar_analytics') as compute:
+            response = self.client.get(self.url, {'range': 'week'})
+        compute.assert_not_called()
+        self.assertContains(response, f'data-fragment-url="{self.fragment_url}?range=week"')
+        self.assertNotContains(response, 'Meeting Load')
+
+    def test_fragment_then_page_from_cache(self):
+        response = self.client.get(self.fragment_url, {'range': 'week'})
+        self.assertContains(response, 'Meeting Load')
+        self.assertContains(response, 'last 7 days')
+        with mock.patch.object(views, 'get_calendar_analytics') as compute:
+            response = self.client.get(self.url, {'range': 'week'})
+        compute.assert_not_called()
+        self.assertContains(response, 'Meeting Load')
+        self.assertNotContains(response, 'data-fragment-url')
+
+    def test_inline_computes_on_the_page(self):
+        response = self.client.get(self.url, {'inline': 1})
+        self.assertContains(response, 'Meeting Load')
+        self.assertNotContains(response, 'data-fragment-url')
+
+    def test_fragment_needs_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.fragment_url).status_code, 401)
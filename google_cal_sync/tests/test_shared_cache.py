@@ -0,0 +1,56 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from google_cal_sync import live
+from google_cal_sync.caching import bump_calendar_version, calendar_health, get_calendar_list, get_upcoming_events
+from google_cal_sync.metrics import health
+from google_cal_sync.utils import get_calendar_service
+from .base import FakeGoogleMixin, make_event
+
+
+HOLIDAYS = 'en.usa#holiday@group.v.calendar.google.com'
+
+
+class SharedCacheTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.ann, self.bob = self.connect('ann'), self.connect('bob')
+        self.services = {user: get_calendar_service(user) for user in (self.ann, self.bob)}
+        start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        for account in ('ann', 'bob'):
+            self.add_event(account, make_event('Holiday', start), calendar_id=HOLIDAYS)
+        for user, service in self.services.items():
+            get_calendar_list(user, service)
+        with health.lock:
+            health.lookups.clear()
+
+    def upcoming(self, user):
+        return [event['summary'] for event in get_upcoming_events(user, self.services[user], HOLIDAYS, 10)]
+
+    def test_read_only_calendars_are_fetched_once(self):
+        self.add_event('ann', make_event('Only in ann', timezone.now() + timedelta(days=2)), calendar_id=HOLIDAYS)
+        self.assertEqual(self.upcoming(self.ann), ['Holiday', 'Only in ann'])
+        # Served from the entry ann loaded
+        self.assertEqual(self.upcoming(self.bob), ['Holiday', 'Only in ann'])
+
+    def test_lookups_and_health_belong_to_the_reader(self):
+        self.upcoming(self.ann)
+        self.upcoming(self.bob)
+        self.assertEqual(health.summary(f'user:{self.ann.pk}')['cache_hit_rate'], 0.0)
+        self.assertEqual(health.summary(f'user:{self.bob.pk}')['cache_hit_rate'], 1.0)
+        self.assertNotIn('user:shared-reader', health.lookups)
+        self.assertIn('refreshed_at', calendar_health(self.ann, [HOLIDAYS])[HOLIDAYS])
+        self.assertEqual(calendar_health(self.bob, [HOLIDAYS]), {})
+
+    def test_refresh_is_published_to_the_reader(self):
+        self.upcoming(self.ann)
+        bump_calendar_version(self.ann.pk, HOLIDAYS)
+        self.add_event('bob', make_event('New holiday', timezone.now() + timedelta(days=3)), calendar_id=HOLIDAYS)
+        cache.set(live._presence_key(self.bob.pk), 1, live.PRESENCE_TTL)
+        self.assertEqual(self.upcoming(self.bob), ['Holiday', 'New holiday'])
+        last = cache.get(live._sequence_key(self.bob.pk))
+        entries = [cache.get(live._log_key(self.bob.pk, seq)) for seq in range(last - 2, last + 1)]
+        self.assertEqual({entry['calendar_id'] for entry in entries}, {HOLIDAYS})
+        self.assertIn('New holiday', [entry['event']['summary'] for entry in entries if entry['event']])
+        self.assertIsNone(cache.get(live._sequence_key('shared-reader')))
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from google_cal_sync.utils import SingleFlight, coalesced, single_flight
+
+
+def take_lease(key, seconds):
+    """Hold the cross-worker lease for `key` as another worker would."""
+    cache.add(f'gcs:sf:lease:{hashlib.sha1(key.encode()).hexdigest()}', 'other-worker', seconds)
+
+
+class SlowCall:
+    """Blocks until released, so followers pile up behind the leader."""
+
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.result = result
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def run_together(flight, key, call, count, **kwargs):
+    """Start `count` identical calls while the first is in flight; returns their outcomes."""
+    def attempt():
+        try:
+            return flight.do(key, call, **kwargs)
+        except Exception as error:
+            return error
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(attempt)]
+        call.started.wait(5)
+        futures += [executor.submit(attempt) for _ in range(count - 1)]
+        while flight.stats()['calls'] < count:
+            time.sleep(0.01)
+        call.release.set()
+        return [future.result() for future in futures]
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_followers_share_one_call_and_get_copies(self):
+        flight = SingleFlight()
+        call = SlowCall(result=[{'id': 'a'}])
+        results = run_together(flight, 'list', call, 4)
+        self.assertEqual(call.calls, 1)
+        self.assertEqual(results, [[{'id': 'a'}]] * 4)
+        self.assertEqual(len({id(result[0]) for result in results}), 4)
+        self.assertEqual(flight.stats(), {'calls': 4, 'leaders': 1, 'coalesced': 3, 'coalesced_remote': 0,
+                                          'in_flight': 0})
+
+    def test_leader_errors_reach_followers(self):
+        error = ValueError('upstream failed')
+        results = run_together(SingleFlight(), 'list', SlowCall(error=error), 3)
+        self.assertEqual(results, [error] * 3)
+
+    def test_later_calls_fetch_again(self):
+        flight = SingleFlight()
+        self.assertEqual([flight.do('list', lambda: n) for n in range(2)], [0, 1])
+
+    def test_result_published_by_another_worker(self):
+        flight = SingleFlight()
+        flight.do('list', lambda: 'first', lease_seconds=1)
+        # Another worker holds the lease; its published result is reused
+        take_lease('list', 1)
+        self.assertEqual(flight.do('list', lambda: 'second', lease_seconds=1), 'first')
+        self.assertEqual(flight.stats()['coalesced_remote'], 1)
+
+    def test_lapsed_lease_fetches_itself(self):
+        flight = SingleFlight()
+        flight.POLL_INTERVAL = 0.01
+        take_lease('list', 5)
+        self.assertEqual(flight.do('list', lambda: 'mine', lease_seconds=0.05), 'mine')
+        self.assertEqual(flight.stats()['leaders'], 1)
+
+
+@override_settings(SINGLE_FLIGHT_LEASE_SECONDS=0)
+class CoalescedFetchTests(SimpleTestCase):
+    def test_only_tagged_services_are_coalesced(self):
+        @coalesced
+        def fetch(service, calendar_id):
+            return calendar_id
+
+        ann = SimpleNamespace(_http=SimpleNamespace(user_id=1))
+        before = single_flight.stats()['calls']
+        self.assertEqual(fetch(ann, 'primary'), 'primary')
+        self.assertEqual(single_flight.stats()['calls'], before + 1)
+        # No tagged transport: not coalesced
+        self.assertEqual(fetch(SimpleNamespace(), 'team'), 'team')
+        self.assertEqual(single_flight.stats()['calls'], before + 1)
@@ -0,0 +1,27 @@
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from google_cal_sync.staticfiles import StaticFilesMiddleware
+
+
+@override_settings(WHITENOISE_AUTOREFRESH=True, WHITENOISE_USE_FINDERS=True)
+class StaticFilesMiddlewareTests(SimpleTestCase):
+    async def test_async_chain_serves_files_and_passes_the_rest_on(self):
+        async def view(request):
+            return HttpResponse('view')
+
+        middleware = StaticFilesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/static/google_cal_sync/live.js'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('javascript', response['Content-Type'])
+        response.close()
+        self.assertEqual((await middleware(RequestFactory().get('/events/'))).content, b'view')
+
+    def test_sync_chain(self):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse('view'))
+        self.assertFalse(iscoroutinefunction(middleware))
+        response = middleware(RequestFactory().get('/static/google_cal_sync/live.js'))
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertEqual(middleware(RequestFactory().get('/events/')).content, b'view')
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from google_cal_sync.models import SyncLink, SyncPair
+from google_cal_sync.sync import ORIGIN_PROPERTY, PAIR_PROPERTY, sync_pair
+from .base import FakeGoogleMixin, make_event
+
+
+class SyncPairTests(FakeGoogleMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.ann, self.bob = self.connect('ann'), self.connect('bob')
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def pair(self, two_way=False, source=None, target=None):
+        return SyncPair.objects.create(
+            source_user=source or self.ann, source_calendar_id='primary',
+            target_user=target or self.bob, target_calendar_id='primary', two_way=two_way,
+        )
+
+    def edit(self, account, event_id, **fields):
+        with self.store.lock:
+            data = self.store.account(account)
+            self.store._store_event(data, data['primary'], fields, event_id=event_id)
+
+    def delete(self, account, event_id):
+        with self.store.lock:
+            data = self.store.account(account)
+            self.store.delete_event(data, data['primary'], event_id)
+
+    def summaries(self, account):
+        return sorted(event['summary'] for event in self.events_in(account))
+
+    def test_one_way_converges(self):
+        standup = self.add_event('ann', make_event('Standup', self.start))
+        self.add_event('ann', make_event('Review', self.start + timedelta(hours=2), attendees=[{'email': 'x@example.com'}]))
+        pair = self.pair()
+        stats = sync_pair(pair)
+        self.assertEqual((stats['inserted'], stats['failed']), (2, 0))
+        self.assertEqual(self.summaries('bob'), ['Review', 'Standup'])
+        mirrors = self.events_in('bob')
+        self.assertTrue(all(mirror['extendedProperties']['private'][PAIR_PROPERTY] == str(pair.pk) for mirror in mirrors))
+        # Mirrors never send invitations
+        self.assertFalse(any(mirror.get('attendees') for mirror in mirrors))
+        self.assertEqual(pair.links.count(), 2)
+        self.assertTrue(pair.source_sync_token)
+
+        self.edit('ann', standup['id'], summary='Daily standup')
+        stats = sync_pair(pair)
+        self.assertEqual((stats['inserted'], stats['updated']), (0, 1))
+        self.assertEqual(self.summaries('bob'), ['Daily standup', 'Review'])
+        self.assertEqual(self.summaries('ann'), ['Daily standup', 'Review'])
+
+    def test_deletes_propagate(self):
+        standup = self.add_event('ann', make_event('Standup', self.start))
+        self.add_event('ann', make_event('Review', self.start + timedelta(hours=2)))
+        pair = self.pair()
+        sync_pair(pair)
+        self.delete('ann', standup['id'])
+        stats = sync_pair(pair)
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(self.summaries('bob'), ['Review'])
+        self.assertFalse(pair.links.filter(origin_event_id=standup['id']).exists())
+
+    def test_full_run_rebuilds_lost_links_without_duplicates(self):
+        standup = self.add_event('ann', make_event('Standup', self.start))
+        pair = self.pair()
+        sync_pair(pair)
+        SyncLink.objects.all().delete()
+        stats = sync_pair(pair, full=True)
+        self.assertEqual((stats['inserted'], stats['unchanged']), (0, 1))
+        self.assertEqual(self.summaries('bob'), ['Standup'])
+        self.assertEqual(pair.links.get().origin_event_id, standup['id'])
+
+        # A full run also catches deletes it missed
+        self.delete('ann', standup['id'])
+        pair.source_sync_token = 'sync-expired'
+        pair.save()
+        self.assertEqual(sync_pair(pair)['deleted'], 1)
+        self.assertEqual(self.summaries('bob'), [])
+
+    def test_two_way_writes_mirror_edits_back(self):
+        standup = self.add_event('ann', make_event('Standup', self.start))
+        pair = self.pair(two_way=True)
+        sync_pair(pair)
+        mirror = self.events_in('bob')[0]
+        self.assertEqual(mirror['extendedProperties']['private'][ORIGIN_PROPERTY], standup['id'])
+
+        self.edit('bob', mirror['id'], summary='Moved standup')
+        stats = sync_pair(pair)
+        self.assertEqual(stats['written_back'], 1)
+        self.assertEqual(self.summaries('ann'), ['Moved standup'])
+        self.assertEqual(self.summaries('bob'), ['Moved standup'])
+
+        # Our own writes come back unchanged and settle
+        stats = sync_pair(pair)
+        self.assertEqual((stats['inserted'], stats['updated'], stats['written_back']), (0, 0, 0))
+
+        self.delete('bob', mirror['id'])
+        sync_pair(pair)
+        self.assertEqual(self.summaries('ann'), [])
+
+    def test_opposite_pairs_stop_after_one_hop(self):
+        self.add_event('ann', make_event('Standup', self.start))
+        self.add_event('bob', make_event('Lunch', self.start + timedelta(hours=3)))
+        forward, backward = self.pair(), self.pair(source=self.bob, target=self.ann)
+        skipped = 0
+        for _ in range(2):
+            skipped += sync_pair(forward)['loops_skipped'] + sync_pair(backward)['loops_skipped']
+        self.assertEqual(skipped, 2)
+        self.assertEqual(self.summaries('ann'), ['Lunch', 'Standup'])
+        self.assertEqual(self.summaries('bob'), ['Lunch', 'Standup'])
+
+    def test_missing_token_is_recorded_on_the_pair(self):
+        pair = self.pair()
+        self.bob.google_token.delete()
+        stats = sync_pair(pair)
+        pair.refresh_from_db()
+        self.assertEqual(stats['failed'], 1)
+        self.assertIn('reconnect', pair.last_error)
+
+    def test_command_creates_and_runs_a_pair(self):
+        self.add_event('ann', make_event('Standup', self.start))
+        out = StringIO()
+        call_command('sync_calendars', '--source', 'ann:primary', '--target', 'bob:primary', stdout=out)
+        self.assertIn('Created pair', out.getvalue())
+        self.assertIn('inserted 1', out.getvalue())
+        self.assertEqual(self.summaries('bob'), ['Standup'])
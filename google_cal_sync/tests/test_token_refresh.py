@@ -0,0 +1,88 @@
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from google_cal_sync import google_client, token_refresh
+from google_cal_sync.models import GoogleToken
+from google_cal_sync.token_refresh import refresh_due_tokens, tokens_due
+from .base import CLIENT_ENV, FakeGoogleMixin
+
+
+class ExpiringTokensMixin(FakeGoogleMixin):
+    def expiring(self, username, minutes, **fields):
+        user = self.connect(username)
+        GoogleToken.objects.filter(user=user).update(token_expiry=timezone.now() + timedelta(minutes=minutes), **fields)
+        return GoogleToken.objects.get(user=user)
+
+
+@CLIENT_ENV
+class TokenRefreshSweepTests(ExpiringTokensMixin, TestCase):
+    def test_refreshes_only_tokens_in_the_window(self):
+        soon = self.expiring('ann', 5)
+        later = self.expiring('bob', 120)
+        stats = refresh_due_tokens(batch_size=1)
+        self.assertEqual(stats, {'refreshed': 1, 'failed': 0, 'flagged': 0})
+        soon.refresh_from_db()
+        self.assertGreater(soon.token_expiry, timezone.now() + timedelta(minutes=30))
+        self.assertNotEqual(soon.access_token, 'fake-ann')
+        self.assertEqual(GoogleToken.objects.get(pk=later.pk).access_token, 'fake-bob')
+
+    def test_revoked_tokens_are_flagged_and_skipped(self):
+        token = self.expiring('ann', -5, refresh_token='revoked-ann')
+        self.assertEqual(refresh_due_tokens()['flagged'], 1)
+        token.refresh_from_db()
+        self.assertTrue(token.needs_reauth)
+        self.assertIn('invalid_grant', token.last_refresh_error)
+        self.assertEqual(list(tokens_due()), [])
+
+    def test_transient_failures_back_off(self):
+        token = self.expiring('ann', 5)
+        with mock.patch.object(token_refresh, 'refresh_google_credentials',
+                               side_effect=google_client.TransportError('timed out')):
+            self.assertEqual(refresh_due_tokens()['failed'], 1)
+        token.refresh_from_db()
+        self.assertEqual((token.refresh_failures, token.needs_reauth), (1, False))
+        self.assertEqual(list(tokens_due()), [])
+        self.assertEqual(list(tokens_due(now=timezone.now() + token_refresh.RETRY_BACKOFF)), [token])
+
+    def test_command_reports_counts(self):
+        self.expiring('ann', 5)
+        out = StringIO()
+        call_command('refresh_tokens', stdout=out)
+        self.assertIn('Refreshed 1 tokens, 0 failed', out.getvalue())
+        with mock.patch.dict(os.environ, {'GOOGLE_CLIENT_ID': ''}), self.assertRaises(CommandError):
+            call_command('refresh_tokens', stdout=out)
+
+
+@CLIENT_ENV
+class ConcurrentWriteTests(ExpiringTokensMixin, TransactionTestCase):
+    """Rows written by another connection while Google is being called."""
+
+    def test_failures_keep_credentials_written_meanwhile(self):
+        token = self.expiring('ann', 5)
+
+        def request_path_refresh(token):
+            GoogleToken.objects.filter(pk=token.pk).update(access_token='from-a-request')
+            raise google_client.TransportError('timed out')
+
+        with mock.patch.object(token_refresh, 'refresh_google_credentials', side_effect=request_path_refresh):
+            self.assertEqual(refresh_due_tokens()['failed'], 1)
+        token.refresh_from_db()
+        self.assertEqual((token.access_token, token.refresh_failures), ('from-a-request', 1))
+
+    def test_reconnected_tokens_are_left_alone(self):
+        token = self.expiring('ann', 5)
+        original = token_refresh.refresh_google_credentials
+
+        def reconnect_meanwhile(token):
+            original(token)
+            GoogleToken.objects.filter(pk=token.pk).update(access_token='reconnected', refresh_token='new-grant')
+
+        with mock.patch.object(token_refresh, 'refresh_google_credentials', side_effect=reconnect_meanwhile):
+            self.assertEqual(refresh_due_tokens(), {'refreshed': 0, 'failed': 0, 'flagged': 0})
+        token.refresh_from_db()
+        self.assertEqual((token.access_token, token.refresh_token), ('reconnected', 'new-grant'))
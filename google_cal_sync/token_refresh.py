@@ -0,0 +1,117 @@
+"""
+Proactive refresh of Google access tokens.
+
+refresh_token_if_needed() only runs inside a user's request, so the first
+request after expiry waits on the token endpoint. The sweep here refreshes
+tokens that expire within a window ahead of time. Network calls run in a
+bounded thread pool and the results are written back with bulk_update, one
+chunk at a time. Only refreshed tokens have their credentials written; failures
+are recorded on a fresh copy of the row, read under select_for_update, so a
+reconnect or request-path refresh made meanwhile isn't overwritten.
+
+Failed tokens back off exponentially. Revoked tokens, and tokens that keep
+failing for days (see record_refresh_failure), get needs_reauth and are
+skipped until the user reconnects.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import GoogleToken
+from .utils import record_refresh_failure, refresh_google_credentials
+
+
+DEFAULT_WINDOW = timedelta(minutes=15)
+RETRY_BACKOFF = timedelta(minutes=1)
+MAX_RETRY_BACKOFF = timedelta(hours=1)
+FAILURE_FIELDS = ['needs_reauth', 'refresh_failures', 'last_refresh_attempt', 'last_refresh_error', 'updated_at']
+REFRESHED_FIELDS = ['access_token', 'refresh_token', 'token_expiry'] + FAILURE_FIELDS
+
+
+def _backoff(failures):
+    return min(RETRY_BACKOFF * (2 ** max(failures - 1, 0)), MAX_RETRY_BACKOFF)
+
+
+def tokens_due(window=DEFAULT_WINDOW, now=None):
+    """Live tokens expiring within `window` whose retry backoff has passed."""
+    now = now or timezone.now()
+    candidates = (
+        GoogleToken.objects.filter(needs_reauth=False, token_expiry__lt=now + window)
+        .exclude(refresh_token='')
+        .order_by('token_expiry')
+    )
+    for token in candidates.iterator(chunk_size=500):
+        if token.refresh_failures and token.last_refresh_attempt:
+            if token.last_refresh_attempt + _backoff(token.refresh_failures) > now:
+                continue
+        yield token
+
+
+def _refresh(token):
+    """Refresh one token in a worker thread; returns the error or None."""
+    try:
+        refresh_google_credentials(token)
+    except Exception as error:
+        return error
+    return None
+
+
+def _save_results(batch, sent, errors):
+    """
+    Write one chunk of outcomes. Rows whose refresh token changed while Google
+    was being called (the user reconnected) are left alone. Returns the saved
+    (refreshed, failed) tokens; failed ones as re-read from the database.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        current = GoogleToken.objects.select_for_update().in_bulk(sent)
+        refreshed, failed = [], []
+        for token, error in zip(batch, errors):
+            row = current.get(token.pk)
+            if row is None or row.refresh_token != sent[token.pk]:
+                continue
+            if error is None:
+                refreshed.append(token)
+            else:
+                record_refresh_failure(row, error)
+                failed.append(row)
+        # bulk_update skips auto_now
+        for token in refreshed + failed:
+            token.updated_at = now
+        GoogleToken.objects.bulk_update(refreshed, REFRESHED_FIELDS)
+        GoogleToken.objects.bulk_update(failed, FAILURE_FIELDS)
+    return refreshed, failed
+
+
+def refresh_due_tokens(window=DEFAULT_WINDOW, max_workers=8, batch_size=200, on_batch=None):
+    """
+    Refresh every due token. Returns counts:
+    {'refreshed', 'failed', 'flagged'} where 'flagged' tokens now need reauth.
+    """
+    # Without client credentials every refresh fails; don't count that against users
+    if not os.getenv('GOOGLE_CLIENT_ID') or not os.getenv('GOOGLE_CLIENT_SECRET'):
+        raise ValueError("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET must be set in environment variables")
+
+    stats = {'refreshed': 0, 'failed': 0, 'flagged': 0}
+    batch = []
+
+    def flush(executor):
+        sent = {token.pk: token.refresh_token for token in batch}
+        errors = list(executor.map(_refresh, batch))
+        refreshed, failed = _save_results(batch, sent, errors)
+        stats['refreshed'] += len(refreshed)
+        for token in failed:
+            stats['flagged' if token.needs_reauth else 'failed'] += 1
+        if on_batch:
+            on_batch(stats)
+        batch.clear()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='token-refresh') as executor:
+        for token in tokens_due(window):
+            batch.append(token)
+            if len(batch) >= batch_size:
+                flush(executor)
+        if batch:
+            flush(executor)
+    return stats
@@ -10,11 +10,25 @@ urlpatterns = [
     path("auth/google/login/", views.google_oauth_login, name="google_oauth_login"),
     path("auth/google/callback/", views.google_oauth_callback, name="google_oauth_callback"),
     path("dashboard/", views.dashboard_view, name="dashboard"),
+    path("dashboard/fragments/<str:name>/", views.dashboard_fragment_view, name="dashboard_fragment"),
     path("events/create/", views.create_event_view, name="create_event"),
     path("events/update/", views.update_event_view, name="update_event"),
     path("events/delete/", views.delete_event_view, name="delete_event"),
+    path("events/import/", views.import_events_view, name="import_events"),
+    path("events/import/<int:job_id>/", views.import_status_view, name="import_status"),
+    path("events/export/", views.export_events_view, name="export_events"),
     path("events/upcoming/", views.upcoming_events_view, name="upcoming_events"),
+    path("events/calendar/", views.calendar_grid_view, name="calendar_grid"),
+    path("events/search/", views.search_view, name="search_events"),
+    path("events/analytics/", views.analytics_view, name="analytics"),
+    path("settings/analytics/", views.settings_analytics_view, name="settings_analytics"),
+    path("events/live/", views.live_events_view, name="live_events"),
+    path("events/changes/", views.changes_view, name="event_changes"),
     path("settings/", views.settings_view, name="settings"),
+    path("profiles/<str:name>/", views.profile_report_view, name="profile_report"),
+    path("status/google/", views.google_status_view, name="google_status"),
     path("settings/switch-account/", views.switch_account_view, name="switch_account"),
+    path("settings/feeds/", views.calendar_feeds_view, name="calendar_feeds"),
+    path("feeds/<str:token>.ics", views.calendar_feed_view, name="calendar_feed"),
 ]
 
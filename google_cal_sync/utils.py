@@ -1,20 +1,35 @@
 """
 Utility functions for Google OAuth2 and Calendar API operations.
 """
+import copy
+import functools
+import hashlib
 import os
-from datetime import timedelta
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from . import google_client
+from .jsonstream import iter_items
 
 
 # OAuth2 scopes required for Google Calendar access
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 
+def get_oauth_endpoints():
+    """
+    Return (auth_uri, token_uri), honouring settings.GOOGLE_API_BASE_URL.
+    """
+    base_url = getattr(settings, 'GOOGLE_API_BASE_URL', '')
+    if base_url:
+        return f"{base_url}/o/oauth2/auth", f"{base_url}/token"
+    return "https://accounts.google.com/o/oauth2/auth", "https://oauth2.googleapis.com/token"
+
+
 def get_google_oauth_flow(request):
     """
     Create and configure Google OAuth2 flow.
@@ -40,13 +55,14 @@ def get_google_oauth_flow(request):
     if '127.0.0.1' in redirect_uri:
         redirect_uri = redirect_uri.replace('127.0.0.1', 'localhost')
     
-    flow = Flow.from_client_config(
+    auth_uri, token_uri = get_oauth_endpoints()
+    flow = google_client.Flow.from_client_config(
         {
             "web": {
                 "client_id": client_id,
                 "client_secret": client_secret,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "auth_uri": auth_uri,
+                "token_uri": token_uri,
                 "redirect_uris": [redirect_uri]
             }
         },
@@ -61,16 +77,68 @@ def get_credentials_from_token(google_token):
     """
     Convert stored GoogleToken model to Google Credentials object.
     """
-    credentials = Credentials(
+    credentials = google_client.Credentials(
         token=google_token.access_token,
         refresh_token=google_token.refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
+        token_uri=get_oauth_endpoints()[1],
         client_id=os.getenv('GOOGLE_CLIENT_ID'),
         client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
     )
     return credentials
 
 
+# A token that keeps failing transiently is only treated as dead after this many
+# consecutive failures *and* once it has been expired for DEAD_TOKEN_AGE, so a
+# Google outage doesn't flag everyone
+MAX_REFRESH_FAILURES = 5
+DEAD_TOKEN_AGE = timedelta(days=7)
+
+
+def refresh_google_credentials(google_token):
+    """
+    Exchange the refresh token for a new access token and copy the result
+    onto `google_token` without saving it.
+    Raises RefreshError (e.g. revoked) or TransportError (network) on failure,
+    and ValueError if the app's client credentials aren't configured.
+    """
+    if not os.getenv('GOOGLE_CLIENT_ID') or not os.getenv('GOOGLE_CLIENT_SECRET'):
+        raise ValueError("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET must be set in environment variables")
+
+    credentials = get_credentials_from_token(google_token)
+    credentials.refresh(google_client.GuardedRequest())
+
+    google_token.access_token = credentials.token
+    if credentials.refresh_token:
+        google_token.refresh_token = credentials.refresh_token
+    # google-auth reports expiry as naive UTC
+    if credentials.expiry:
+        google_token.token_expiry = timezone.make_aware(credentials.expiry, dt_timezone.utc)
+    else:
+        google_token.token_expiry = timezone.now() + timedelta(hours=1)
+    google_token.needs_reauth = False
+    google_token.refresh_failures = 0
+    google_token.last_refresh_error = ''
+    google_token.last_refresh_attempt = timezone.now()
+
+
+def record_refresh_failure(google_token, error):
+    """
+    Note a failed refresh on `google_token` (not saved). Permanent errors
+    (revoked or invalid grant) and long-standing transient ones set needs_reauth.
+    """
+    now = timezone.now()
+    permanent = isinstance(error, google_client.RefreshError) and not getattr(error, 'retryable', False)
+    google_token.refresh_failures += 1
+    google_token.last_refresh_attempt = now
+    google_token.last_refresh_error = f"{type(error).__name__}: {error}"[:1000]
+    long_dead = (
+        google_token.refresh_failures >= MAX_REFRESH_FAILURES
+        and google_token.token_expiry and google_token.token_expiry < now - DEAD_TOKEN_AGE
+    )
+    if permanent or long_dead:
+        google_token.needs_reauth = True
+
+
 def refresh_token_if_needed(google_token):
     """
     Check if token is expired and refresh it if needed.
@@ -86,21 +154,17 @@ def refresh_token_if_needed(google_token):
     if google_token.token_expiry and google_token.token_expiry > buffer_time:
         return False  # Token still valid
     
-    credentials = get_credentials_from_token(google_token)
-    
     # Refresh the token - this may raise TransportError if network is unavailable
     try:
-        credentials.refresh(Request())
-    except Exception as e:
+        refresh_google_credentials(google_token)
+    except (google_client.RefreshError, google_client.TransportError) as e:
+        record_refresh_failure(google_token, e)
+        google_token.save(update_fields=[
+            'needs_reauth', 'refresh_failures', 'last_refresh_attempt', 'last_refresh_error', 'updated_at',
+        ])
         # Re-raise the exception so callers can handle it
         raise
     
-    # Update the model
-    google_token.access_token = credentials.token
-    if credentials.refresh_token:
-        google_token.refresh_token = credentials.refresh_token
-    credentials_expiry = credentials.expiry or (timezone.now() + timedelta(hours=1))
-    google_token.token_expiry = credentials_expiry
     google_token.save()
     
     return True
@@ -118,6 +182,10 @@ def get_calendar_service(user):
         google_token = GoogleToken.objects.get(user=user)
     except GoogleToken.DoesNotExist:
         return None
+
+    # Revoked or dead tokens need the user to reconnect; don't keep retrying
+    if google_token.needs_reauth:
+        return None
     
     # Refresh token if needed - catch network errors
     try:
@@ -132,7 +200,7 @@ def get_calendar_service(user):
     
     # Build and return the service
     try:
-        service = build('calendar', 'v3', credentials=credentials)
+        service = google_client.build_calendar_service(credentials, user_id=user.pk)
         return service
     except Exception:
         # If service build fails, return None
@@ -146,6 +214,142 @@ def authenticate_with_google(user):
     return get_calendar_service(user)
 
 
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Let concurrent identical reads share one upstream call.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight wait and get a deep copy of its result, or its
+    exception. With a lease_seconds > 0 and a shared cache, a leader in
+    another worker is detected through a cache lease. This worker then polls
+    for the result it publishes, and fetches itself if the lease lapses
+    without one.
+    """
+
+    POLL_INTERVAL = 0.05
+    # How long a published result stays readable for waiting workers
+    RESULT_TTL = 5
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.counters = {'calls': 0, 'leaders': 0, 'coalesced': 0, 'coalesced_remote': 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, in_flight=len(self.flights))
+
+    def do(self, key, call, lease_seconds=0):
+        with self.lock:
+            self.counters['calls'] += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            self._count('coalesced')
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = self._lead(key, call, lease_seconds)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result
+
+    def _lead(self, key, call, lease_seconds):
+        if lease_seconds <= 0:
+            self._count('leaders')
+            return call()
+
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        lease_key, result_key = f'gcs:sf:lease:{digest}', f'gcs:sf:result:{digest}'
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + lease_seconds
+        waited = False
+        while not cache.add(lease_key, owner, lease_seconds):
+            # Another worker is fetching: wait for its result or for the lease to go
+            waited = True
+            published = cache.get(result_key)
+            if published is not None:
+                self._count('coalesced_remote')
+                return published[0]
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(self.POLL_INTERVAL)
+
+        try:
+            # The other leader may have published and released between two polls
+            published = cache.get(result_key) if waited else None
+            if published is not None:
+                self._count('coalesced_remote')
+                return published[0]
+            self._count('leaders')
+            result = call()
+            cache.set(result_key, (result,), self.RESULT_TTL)
+            return result
+        finally:
+            if cache.get(lease_key) == owner:
+                cache.delete(lease_key)
+
+
+single_flight = SingleFlight()
+
+
+def _service_user(service):
+    # build_calendar_service tags its transport with the user (see ResilientHttp)
+    return getattr(getattr(service, '_http', None), 'user_id', None)
+
+
+def coalesced(fetch):
+    """Route identical concurrent reads of one user through single_flight."""
+    @functools.wraps(fetch)
+    def wrapper(service, *args, **kwargs):
+        user_id = _service_user(service)
+        if user_id is None:
+            return fetch(service, *args, **kwargs)
+        key = f"{fetch.__name__}:{user_id}:{args!r}:{sorted(kwargs.items())!r}"
+        return single_flight.do(
+            key, lambda: fetch(service, *args, **kwargs), lease_seconds=settings.SINGLE_FLIGHT_LEASE_SECONDS,
+        )
+    return wrapper
+
+
+def iter_response_items(request, meta=None):
+    """
+    Execute a list request and yield its items one at a time as they are
+    decoded from the response body, instead of building the whole page as a
+    dict first. Other top-level fields (nextPageToken, nextSyncToken) go into
+    `meta`. HTTP errors still raise HttpError from execute().
+    """
+    # postproc only runs for successful responses; keep the body undecoded
+    request.postproc = lambda resp, content: content
+    content = request.execute()
+    text = content.decode('utf-8') if isinstance(content, bytes) else content
+    del content
+    return iter_items(text, {} if meta is None else meta)
+
+
+@coalesced
 def fetch_calendar_list(service):
     """
     Fetch the user's calendar list.
@@ -153,8 +357,7 @@ def fetch_calendar_list(service):
     if not service:
         return []
 
-    response = service.calendarList().list().execute()
-    return response.get('items', [])
+    return list(iter_response_items(service.calendarList().list()))
 
 
 def get_writable_calendars(service):
@@ -162,9 +365,15 @@ def get_writable_calendars(service):
     Fetch only calendars where the user has write access (owner or writer).
     Filters out read-only calendars like public holiday calendars.
     """
-    all_calendars = fetch_calendar_list(service)
+    return filter_writable_calendars(fetch_calendar_list(service))
+
+
+def filter_writable_calendars(all_calendars):
+    """
+    Keep calendars where the user has owner or writer access.
+    """
     writable_calendars = []
-    
+
     for calendar in all_calendars:
         access_role = calendar.get('accessRole', '').lower()
         # Only include calendars where user can write
@@ -174,6 +383,7 @@ def get_writable_calendars(service):
     return writable_calendars
 
 
+@coalesced
 def fetch_calendar_events(service, calendar_id='primary', time_min=None, max_results=10):
     """
     Fetch upcoming events for the specified calendar.
@@ -184,24 +394,61 @@ def fetch_calendar_events(service, calendar_id='primary', time_min=None, max_res
     if not time_min:
         time_min = timezone.now().isoformat()
 
-    events_response = service.events().list(
+    request = service.events().list(
         calendarId=calendar_id,
         timeMin=time_min,
         maxResults=max_results,
         singleEvents=True,
         orderBy='startTime'
-    ).execute()
+    )
+    return [normalize_event(event) for event in iter_response_items(request)]
 
-    events = events_response.get('items', [])
-    return [normalize_event(event) for event in events]
+
+@coalesced
+def fetch_events_window(service, calendar_id, time_min, time_max, page_size=250):
+    """
+    Fetch every event overlapping [time_min, time_max), following all pages.
+    Recurring events are expanded into single instances.
+    """
+    if not service:
+        return []
+
+    events = []
+    page_token = None
+    while True:
+        request = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            maxResults=page_size,
+            singleEvents=True,
+            orderBy='startTime',
+            pageToken=page_token,
+        )
+        page = {}
+        events.extend(normalize_event(event) for event in iter_response_items(request, page))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+# The parts of a Google event resource that are read back from 'raw'
+RAW_FIELDS = ('start', 'end', 'description', 'location', 'updated', 'etag', 'transparency')
 
 
 def normalize_event(event):
     """
     Prepare event dictionary with safe fields for templates.
+    'raw' keeps only RAW_FIELDS and the user's own attendee entry, not the
+    whole resource: guest lists can be most of a page, and normalized events
+    are what the caches hold.
     """
     start = event.get('start', {}) or {}
     end = event.get('end', {}) or {}
+    raw = {field: event[field] for field in RAW_FIELDS if field in event}
+    own = [attendee for attendee in event.get('attendees') or () if attendee.get('self')]
+    if own:
+        raw['attendees'] = own
 
     return {
         'id': event.get('id'),
@@ -210,10 +457,30 @@ def normalize_event(event):
         'end_text': end.get('dateTime') or end.get('date'),
         'location': event.get('location'),
         'status': event.get('status'),
-        'raw': event,
+        'etag': event.get('etag'),
+        'raw': raw,
     }
 
 
+def parse_google_datetime(value):
+    """
+    Parse a Google 'dateTime' or all-day 'date' string into an aware datetime.
+    Returns None for missing or malformed values.
+    """
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            dt = datetime.strptime(value, '%Y-%m-%d')
+        else:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone.get_current_timezone())
+    return dt
+
+
 def create_calendar_event(service, calendar_id, summary, description, start_iso, end_iso, location=None):
     """
     Create a new calendar event for the user.
@@ -255,9 +522,12 @@ def get_calendar_event(service, calendar_id, event_id):
     return normalize_event(event)
 
 
-def update_calendar_event(service, calendar_id, event_id, summary, description, start_iso, end_iso, location=None):
+def update_calendar_event(service, calendar_id, event_id, summary, description, start_iso, end_iso, location=None,
+                          etag=None):
     """
     Update an existing calendar event.
+    With `etag`, the patch is conditional (If-Match): Google answers 412 if
+    the event changed since that version was read.
     """
     if not service:
         raise ValueError("Google Calendar service is not available.")
@@ -279,11 +549,14 @@ def update_calendar_event(service, calendar_id, event_id, summary, description,
     if location:
         event_body['location'] = location
 
-    updated_event = service.events().patch(
+    patch_request = service.events().patch(
         calendarId=calendar_id,
         eventId=event_id,
         body=event_body
-    ).execute()
+    )
+    if etag:
+        patch_request.headers['If-Match'] = etag
+    updated_event = patch_request.execute()
 
     return normalize_event(updated_event)
 
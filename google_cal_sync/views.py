@@ -1,24 +1,67 @@
-from django.shortcuts import render, redirect
+import os
+import tempfile
+import time
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.template.loader import render_to_string
+from django.middleware.csrf import get_token
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.urls import reverse
 from django.conf import settings
 from django.utils import timezone
-from datetime import datetime, timedelta
-from googleapiclient.errors import HttpError
-from .models import GoogleToken
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
+from datetime import datetime, timedelta, timezone as dt_timezone
+from . import google_client, live
+from django.core.cache import cache
+from .analytics import (
+    ANALYTICS_RANGES,
+    DEFAULT_RANGE,
+    analytics_cache_key,
+    analytics_calendars,
+    get_calendar_analytics,
+    heatmap_rows,
+    peek_calendar_analytics,
+)
+from .caching import (
+    CALENDAR_LIST,
+    apply_event_change,
+    calendar_health,
+    canonical_calendar_id,
+    find_cached_event,
+    get_calendar_list,
+    get_events_window,
+    get_upcoming_events,
+    get_writable_calendar_list,
+    peek_cached,
+    still_upcoming,
+)
+from .changes import ChangeFeedUnavailable, CursorError, CursorExpired, poll as poll_changes
+from .circuit import breaker_metrics
+from .conditional import conditional_page, content_tag
+from .exporter import EXPORT_FORMATS, stream_export
+from .feeds import feed_response, lookup_feed, new_feed_token, revoke_feed
+from .grid import GRID_VIEWS, adjacent_anchors, bucket_events_by_day, window_bounds, window_time_range
+from .importer import detect_format, start_import_job
+from .metrics import SUMMARY_WINDOW, health
+from .models import CalendarFeed, GoogleToken, ImportJob
+from .prefetch import prefetcher
+from .profiling import PROFILE_NAME_RE, profile_path
 from .utils import (
     get_google_oauth_flow,
     authenticate_with_google,
-    fetch_calendar_list,
-    get_writable_calendars,
-    fetch_calendar_events,
     create_calendar_event,
     get_calendar_event,
+    parse_google_datetime,
+    single_flight,
     update_calendar_event,
     delete_calendar_event,
 )
+from .search import search_events
 
 
 def parse_event_datetime(value):
@@ -154,6 +197,9 @@ def google_oauth_callback(request):
                 'access_token': credentials.token,
                 'refresh_token': credentials.refresh_token,
                 'token_expiry': token_expiry,
+                'needs_reauth': False,
+                'refresh_failures': 0,
+                'last_refresh_error': '',
             }
         )
         
@@ -173,71 +219,128 @@ def google_oauth_callback(request):
         return redirect('google_cal_sync:login')
 
 
+def _token_state(user):
+    """Validator parts for the connection state shown on every page."""
+    state = GoogleToken.objects.filter(user=user).values_list('needs_reauth', 'token_expiry').first()
+    if state is None:
+        return None
+    needs_reauth, token_expiry = state
+    return [needs_reauth, token_expiry > timezone.now()]
+
+
+def _events_page_validator(calendar_id, max_results):
+    def validator(request):
+        token_state = _token_state(request.user)
+        if token_state is None:
+            return ['not connected']
+        calendars = peek_cached(request.user, CALENDAR_LIST, ('list',))
+        selected = request.GET.get('calendar_id', 'primary') if calendar_id is None else calendar_id
+        events = peek_cached(request.user, selected, ('upcoming', max_results))
+        if calendars is None or events is None:
+            return None
+        return token_state + [content_tag(calendars), content_tag(still_upcoming(events))]
+    return validator
+
+
+def _settings_validator(request):
+    token_state = _token_state(request.user)
+    if token_state is None:
+        return ['not connected']
+    calendars = peek_cached(request.user, CALENDAR_LIST, ('list',))
+    if calendars is None:
+        return None
+    range_name = request.GET.get('range') if request.GET.get('range') in ANALYTICS_RANGES else DEFAULT_RANGE
+    key, _, _ = analytics_cache_key(request.user, analytics_calendars(calendars), range_name)
+    if cache.get(key) is None:
+        return None
+    # The health panel changes with new upstream calls and its "ago" times once a minute
+    feeds = list(CalendarFeed.objects.filter(user=request.user).values_list('calendar_id', 'token'))
+    return token_state + [
+        content_tag(calendars), content_tag(feeds), key, health.generation(f'user:{request.user.pk}'), int(time.time() // 60),
+        health.generation('all') if request.user.is_staff else 0,
+    ]
+
+
+def _add_start_dt(events):
+    """Set 'start_dt' (local time, or None) on normalized events for the date badges."""
+    for event in events:
+        start = (event.get('raw') or {}).get('start') or {}
+        start_dt = parse_google_datetime(start.get('dateTime') or start.get('date'))
+        event['start_dt'] = timezone.localtime(start_dt) if start_dt else None
+    return events
+
+
+DASHBOARD_EVENTS = 5
+UPCOMING_EVENTS = 20
+DASHBOARD_FRAGMENTS = ('calendars', 'events')
+
+
+def _load_dashboard_part(user, service, name):
+    """Context for one dashboard fragment; may call Google."""
+    if name == 'calendars':
+        return {'calendars': get_calendar_list(user, service)}
+    return {'events': _add_start_dt(get_upcoming_events(user, service, 'primary', DASHBOARD_EVENTS))}
+
+
+@conditional_page(_events_page_validator('primary', DASHBOARD_EVENTS))
 def dashboard_view(request):
-    """Render the dashboard with live calendar data."""
-    calendars = []
-    events = []
-    has_token = False
-    api_error = None
+    """
+    Render the dashboard without waiting for Google. Parts whose data isn't
+    cached yet are placeholders that fragments.js loads from
+    dashboard_fragment_view; ?inline=1 (the no-JS link) loads them here.
+    """
+    context = {'has_token': False, 'calendars': None, 'events': None, 'api_error': None}
 
     if request.user.is_authenticated:
-        has_token = GoogleToken.objects.filter(user=request.user).exists()
-        if has_token:
-            service = authenticate_with_google(request.user)
-            if service:
-                try:
-                    calendars = fetch_calendar_list(service)
-                    primary_calendar = next((cal for cal in calendars if cal.get('primary')), None)
-                    calendar_id = primary_calendar.get('id') if primary_calendar else 'primary'
-                    events = fetch_calendar_events(service, calendar_id=calendar_id, max_results=5)
-
-                    # Pre-process events to add parsed datetime objects for template
-                    for event in events:
-                        start = event.get('start', {})
-                        # Parse start time
-                        if start.get('dateTime'):
-                            try:
-                                dt = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                        elif start.get('date'):
-                            try:
-                                dt = datetime.strptime(start['date'], '%Y-%m-%d')
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                    
-                    # Pre-process events to add parsed datetime objects for template
-                    for event in events:
-                        start = event.get('start', {})
-                        # Parse start time
-                        if start.get('dateTime'):
-                            try:
-                                dt = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                        elif start.get('date'):
-                            try:
-                                dt = datetime.strptime(start['date'], '%Y-%m-%d')
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                except HttpError as error:
-                    api_error = f"Google API error: {error}"
-            else:
-                api_error = "Connect your Google account to view calendars."
+        token_state = _token_state(request.user)
+        context['has_token'] = token_state is not None
+        if token_state is not None and token_state[0]:
+            context['api_error'] = "Connect your Google account to view calendars."
+        elif token_state is not None:
+            context['calendars'] = peek_cached(request.user, CALENDAR_LIST, ('list',))
+            events = peek_cached(request.user, 'primary', ('upcoming', DASHBOARD_EVENTS))
+            if events is not None:
+                context['events'] = _add_start_dt(still_upcoming(events))
+
+            missing = [name for name in DASHBOARD_FRAGMENTS if context[name] is None]
+            if missing and request.GET.get('inline'):
+                service = authenticate_with_google(request.user)
+                if service:
+                    try:
+                        for name in missing:
+                            context.update(_load_dashboard_part(request.user, service, name))
+                    except google_client.HttpError as error:
+                        context['api_error'] = f"Google API error: {error}"
+                else:
+                    context['api_error'] = "Connect your Google account to view calendars."
+                for name in missing:
+                    if context[name] is None:
+                        context[name] = []
 
-    context = {
-        'has_token': has_token,
-        'calendars': calendars,
-        'events': events,
-        'api_error': api_error,
-    }
     return render(request, "google_cal_sync/dashboard.html", context)
 
 
+def dashboard_fragment_view(request, name):
+    """One dashboard part as an HTML fragment, loaded after the page itself."""
+    if name not in DASHBOARD_FRAGMENTS:
+        raise Http404("Fragment not found")
+    if not request.user.is_authenticated:
+        return render(request, "google_cal_sync/_fragment_error.html", {'error': "Please login first."}, status=401)
+
+    service = authenticate_with_google(request.user)
+    if not service:
+        return render(
+            request, "google_cal_sync/_fragment_error.html",
+            {'error': "Connect your Google account to view calendars."}, status=403,
+        )
+    try:
+        context = _load_dashboard_part(request.user, service, name)
+    except google_client.HttpError as error:
+        return render(request, "google_cal_sync/_fragment_error.html", {'error': f"Google API error: {error}"}, status=502)
+    context['fragment'] = True
+    return render(request, f"google_cal_sync/_dashboard_{name}.html", context)
+
+
 def create_event_view(request):
     """Render the create event form and handle submissions."""
     if not request.user.is_authenticated:
@@ -262,10 +365,10 @@ def create_event_view(request):
 
     try:
         # Only show calendars where user can write events
-        calendars = get_writable_calendars(service)
+        calendars = get_writable_calendar_list(request.user, service)
         if not calendars:
             api_error = "No writable calendars found. Please ensure you have at least one calendar with write access."
-    except HttpError as error:
+    except google_client.HttpError as error:
         error_str = str(error)
         # Check for specific permission errors
         if 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
@@ -293,12 +396,13 @@ def create_event_view(request):
                     end_iso,
                     location,
                 )
+                apply_event_change(request.user, selected_calendar or 'primary', created_event['id'], created_event)
                 messages.success(
                     request,
                     f"Event '{created_event['summary']}' created successfully."
                 )
                 return redirect('google_cal_sync:create_event')
-            except HttpError as error:
+            except google_client.HttpError as error:
                 error_str = str(error)
                 # Provide user-friendly error messages
                 if 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
@@ -320,8 +424,25 @@ def create_event_view(request):
     return render(request, "google_cal_sync/create_event.html", context)
 
 
+def event_form_values(event):
+    """Edit-form values for a normalized event."""
+    raw = event.get('raw') or {}
+    return {
+        'title': event.get('summary') or '',
+        'description': raw.get('description', ''),
+        'start_time': format_datetime_for_input((raw.get('start') or {}).get('dateTime')),
+        'end_time': format_datetime_for_input((raw.get('end') or {}).get('dateTime')),
+        'location': raw.get('location', ''),
+    }
+
+
 def update_event_view(request):
-    """Allow editing an existing Google Calendar event."""
+    """
+    Allow editing an existing Google Calendar event.
+    The form is filled from cached event lists where possible and carries the
+    event's ETag; the patch is sent with If-Match, so a concurrent change
+    shows a merge prompt instead of being overwritten.
+    """
     if not request.user.is_authenticated:
         messages.error(request, "Please login to update events.")
         return redirect('google_cal_sync:login')
@@ -338,8 +459,10 @@ def update_event_view(request):
         messages.error(request, "Connect your Google account before updating events.")
         return redirect('google_cal_sync:login')
 
-    calendars = []
     api_error = None
+    conflict = False
+    conflict_fields = []
+    etag = request.POST.get('etag', '')
     form_values = {
         'title': '',
         'description': '',
@@ -348,37 +471,7 @@ def update_event_view(request):
         'location': '',
     }
 
-    try:
-        # Only show calendars where user can write events
-        calendars = get_writable_calendars(service)
-        if not calendars:
-            api_error = "No writable calendars found. Please ensure you have at least one calendar with write access."
-    except HttpError as error:
-        error_str = str(error)
-        if 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
-            api_error = "You don't have permission to write to this calendar. Please select a calendar you own or have write access to."
-        else:
-            api_error = f"Google API error: {error}"
-
-    if not api_error:
-        try:
-            existing_event = get_calendar_event(service, calendar_id, event_id)
-            if request.method == 'GET':
-                form_values = {
-                    'title': existing_event['summary'],
-                    'description': existing_event['raw'].get('description', ''),
-                    'start_time': format_datetime_for_input(existing_event['raw']['start'].get('dateTime')),
-                    'end_time': format_datetime_for_input(existing_event['raw']['end'].get('dateTime')),
-                    'location': existing_event['raw'].get('location', ''),
-                }
-        except HttpError as error:
-            error_str = str(error)
-            if 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
-                api_error = "You don't have permission to read this event. Please select a calendar you own or have write access to."
-            else:
-                api_error = f"Google API error: {error}"
-
-    if request.method == 'POST' and not api_error:
+    if request.method == 'POST':
         form_values = {
             'title': request.POST.get('title', ''),
             'description': request.POST.get('description', ''),
@@ -397,7 +490,7 @@ def update_event_view(request):
             messages.error(request, "Title, start time, and end time are required.")
         else:
             try:
-                update_calendar_event(
+                updated_event = update_calendar_event(
                     service,
                     calendar_id,
                     event_id,
@@ -406,12 +499,32 @@ def update_event_view(request):
                     start_iso,
                     end_iso,
                     location,
+                    etag=etag or None,
                 )
+                apply_event_change(request.user, calendar_id, event_id, updated_event)
                 messages.success(request, "Event updated successfully.")
                 return redirect('google_cal_sync:upcoming_events')
-            except HttpError as error:
+            except google_client.HttpError as error:
                 error_str = str(error)
-                if 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
+                if error.resp.status == 412:
+                    # Someone changed the event since the form was loaded
+                    try:
+                        current_event = get_calendar_event(service, calendar_id, event_id)
+                    except google_client.HttpError as fetch_error:
+                        api_error = f"Google API error: {fetch_error}"
+                    else:
+                        apply_event_change(request.user, calendar_id, event_id, current_event)
+                        conflict = True
+                        etag = current_event.get('etag') or ''
+                        labels = {'title': 'Event Name', 'description': 'Description', 'start_time': 'Start Time',
+                                  'end_time': 'End Time', 'location': 'Location'}
+                        theirs = event_form_values(current_event)
+                        conflict_fields = [
+                            {'label': label, 'mine': form_values[name], 'theirs': theirs[name]}
+                            for name, label in labels.items()
+                            if (form_values[name] or '').strip() != (theirs[name] or '').strip()
+                        ]
+                elif 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
                     api_error = "❌ You don't have permission to update events in this calendar. Please select a calendar you own or have write access to."
                 elif '403' in error_str:
                     api_error = "❌ Access denied. This calendar is read-only. Please select your primary calendar or another calendar you own."
@@ -419,6 +532,28 @@ def update_event_view(request):
                     api_error = f"Google API error: {error}"
             except ValueError as error:
                 api_error = str(error)
+    else:
+        existing_event = find_cached_event(request.user, calendar_id, event_id)
+        try:
+            if existing_event is None:
+                existing_event = get_calendar_event(service, calendar_id, event_id)
+            form_values = event_form_values(existing_event)
+            etag = existing_event.get('etag') or ''
+        except google_client.HttpError as error:
+            error_str = str(error)
+            if 'requiredAccessLevel' in error_str or 'writer access' in error_str.lower():
+                api_error = "You don't have permission to read this event. Please select a calendar you own or have write access to."
+            else:
+                api_error = f"Google API error: {error}"
+
+    calendars = []
+    try:
+        # Only show calendars where user can write events
+        calendars = get_writable_calendar_list(request.user, service)
+        if not calendars and not api_error:
+            api_error = "No writable calendars found. Please ensure you have at least one calendar with write access."
+    except google_client.HttpError as error:
+        api_error = api_error or f"Google API error: {error}"
 
     context = {
         'calendars': calendars,
@@ -426,6 +561,9 @@ def update_event_view(request):
         'api_error': api_error,
         'form_values': form_values,
         'event_id': event_id,
+        'etag': etag,
+        'conflict': conflict,
+        'conflict_fields': conflict_fields,
         'mode': 'update',
     }
     return render(request, "google_cal_sync/create_event.html", context)
@@ -454,8 +592,9 @@ def delete_event_view(request):
 
     try:
         delete_calendar_event(service, calendar_id, event_id)
+        apply_event_change(request.user, calendar_id, event_id)
         messages.success(request, "Event deleted successfully.")
-    except HttpError as error:
+    except google_client.HttpError as error:
         messages.error(request, f"Google API error: {error}")
     except ValueError as error:
         messages.error(request, str(error))
@@ -463,6 +602,126 @@ def delete_event_view(request):
     return redirect('google_cal_sync:upcoming_events')
 
 
+def import_events_view(request):
+    """Upload a .ics or CSV file and import its events in the background."""
+    if not request.user.is_authenticated:
+        messages.error(request, "Please login to import events.")
+        return redirect('google_cal_sync:login')
+
+    service = authenticate_with_google(request.user)
+    if not service:
+        messages.error(request, "Connect your Google account before importing events.")
+        return redirect('google_cal_sync:login')
+
+    calendars = []
+    api_error = None
+    selected_calendar = request.POST.get('calendar_id', 'primary')
+
+    try:
+        calendars = get_writable_calendar_list(request.user, service)
+        if not calendars:
+            api_error = "No writable calendars found. Please ensure you have at least one calendar with write access."
+    except google_client.HttpError as error:
+        api_error = f"Google API error: {error}"
+
+    if request.method == 'POST' and not api_error:
+        upload = request.FILES.get('file')
+        try:
+            if not upload:
+                raise ValueError("Choose a .ics or .csv file to import.")
+            file_format = detect_format(upload.name)
+        except ValueError as error:
+            api_error = str(error)
+        else:
+            # Copy the upload to our own temp file chunk by chunk; the request's
+            # copy is removed as soon as this view returns.
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_format}') as destination:
+                for chunk in upload.chunks():
+                    destination.write(chunk)
+            job = ImportJob.objects.create(
+                user=request.user,
+                calendar_id=selected_calendar or 'primary',
+                filename=os.path.basename(upload.name)[:255],
+                file_format=file_format,
+            )
+            start_import_job(job, destination.name)
+            return redirect('google_cal_sync:import_status', job_id=job.pk)
+
+    context = {
+        'calendars': calendars,
+        'selected_calendar': selected_calendar,
+        'api_error': api_error,
+        'recent_jobs': ImportJob.objects.filter(user=request.user)[:5],
+    }
+    return render(request, "google_cal_sync/import_events.html", context)
+
+
+def import_status_view(request, job_id):
+    """Show progress and row failures of an import job."""
+    if not request.user.is_authenticated:
+        messages.error(request, "Please login to view imports.")
+        return redirect('google_cal_sync:login')
+
+    job = get_object_or_404(ImportJob, pk=job_id, user=request.user)
+    context = {
+        'job': job,
+    }
+    return render(request, "google_cal_sync/import_status.html", context)
+
+
+def export_events_view(request):
+    """
+    Render the export form, or stream every event of the chosen calendars
+    as ICS, CSV or NDJSON when a format is requested.
+    """
+    if not request.user.is_authenticated:
+        messages.error(request, "Please login to export events.")
+        return redirect('google_cal_sync:login')
+
+    service = authenticate_with_google(request.user)
+    if not service:
+        messages.error(request, "Connect your Google account before exporting events.")
+        return redirect('google_cal_sync:login')
+
+    export_format = request.GET.get('format')
+    calendar_ids = request.GET.getlist('calendar_id')
+
+    if export_format in EXPORT_FORMATS and calendar_ids:
+        time_min = parse_event_datetime(request.GET.get('start', ''))
+        time_max = parse_event_datetime(request.GET.get('end', ''))
+        content_type, extension = EXPORT_FORMATS[export_format]
+        name = 'calendar' if len(calendar_ids) > 1 else calendar_ids[0].split('@')[0]
+        response = StreamingHttpResponse(
+            stream_export(service, calendar_ids, export_format, time_min, time_max, calendar_name=name),
+            content_type=content_type,
+        )
+        # calendar_id comes from the URL: keep quotes, '#' and non-ASCII out of the header
+        filename = f"{slugify(name) or 'calendar'}.{extension}"
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        # Keep proxies (e.g. nginx) from buffering the whole export
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    calendars = []
+    api_error = None
+    try:
+        calendars = get_calendar_list(request.user, service)
+    except google_client.HttpError as error:
+        api_error = f"Google API error: {error}"
+
+    if export_format and not api_error:
+        api_error = "Select at least one calendar and a supported format."
+
+    context = {
+        'calendars': calendars,
+        'selected_calendars': calendar_ids or ['primary'],
+        'formats': list(EXPORT_FORMATS),
+        'api_error': api_error,
+    }
+    return render(request, "google_cal_sync/export_events.html", context)
+
+
+@conditional_page(_events_page_validator(None, UPCOMING_EVENTS))
 def upcoming_events_view(request):
     """Render a dedicated upcoming events section using live data."""
     events = []
@@ -477,47 +736,18 @@ def upcoming_events_view(request):
             service = authenticate_with_google(request.user)
             if service:
                 try:
-                    calendars = fetch_calendar_list(service)
-                    events = fetch_calendar_events(
-                        service,
-                        calendar_id=selected_calendar,
-                        max_results=20,
-                    )
-
-                    # Pre-process events to add parsed datetime objects for template
-                    for event in events:
-                        start = event.get('start', {})
-                        # Parse start time
-                        if start.get('dateTime'):
-                            try:
-                                dt = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                        elif start.get('date'):
-                            try:
-                                dt = datetime.strptime(start['date'], '%Y-%m-%d')
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                    
-                    # Pre-process events to add parsed datetime objects for template
-                    for event in events:
-                        start = event.get('start', {})
-                        # Parse start time
-                        if start.get('dateTime'):
-                            try:
-                                dt = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                        elif start.get('date'):
-                            try:
-                                dt = datetime.strptime(start['date'], '%Y-%m-%d')
-                                event['start_dt'] = dt
-                            except ValueError:
-                                event['start_dt'] = None
-                except HttpError as error:
+                    calendars = get_calendar_list(request.user, service)
+                    events = get_upcoming_events(request.user, service, selected_calendar, UPCOMING_EVENTS)
+                    _add_start_dt(events)
+                    # Warm the other calendars of the <select>
+                    spec = ('upcoming', UPCOMING_EVENTS)
+                    selected = canonical_calendar_id(request.user.pk, selected_calendar)
+                    prefetcher.record_use(request.user, selected, spec)
+                    prefetcher.schedule(request.user, [
+                        (calendar['id'], spec) for calendar in calendars
+                        if canonical_calendar_id(request.user.pk, calendar['id']) != selected
+                    ])
+                except google_client.HttpError as error:
                     api_error = f"Google API error: {error}"
             else:
                 api_error = "Connect your Google account to view events."
@@ -532,19 +762,170 @@ def upcoming_events_view(request):
     return render(request, "google_cal_sync/upcoming_events.html", context)
 
 
+# Pages that open a live stream: (events shown, compact cards)
+LIVE_PAGES = {'dashboard': (DASHBOARD_EVENTS, True), 'upcoming': (UPCOMING_EVENTS, False)}
+
+
+def _live_change(entry, calendar_id, compact, csrf_token):
+    """A change log entry as the JSON delta live.js applies."""
+    event = entry['event']
+    if event is not None and event.get('status') != 'cancelled' and still_upcoming([event]):
+        event = _add_start_dt([dict(event)])[0]
+        html = render_to_string('google_cal_sync/_event_card.html', {
+            'event': event,
+            'calendar_id': calendar_id,
+            'compact': compact,
+            'csrf_token': csrf_token,
+        })
+        start = event['start_dt'].timestamp() if event['start_dt'] else 0
+        return {'action': 'upsert', 'id': entry['event_id'], 'start': start, 'html': html}
+    return {'action': 'remove', 'id': entry['event_id']}
+
+
+async def live_events_view(request):
+    """
+    Server-Sent Events stream of changes to one calendar's upcoming events,
+    rendered as cards for the page that opened it. Needs an ASGI server; see
+    google_cal_sync/live.py. The user comes from the async ORM and the one
+    sync helper runs off the request's thread.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Please login first.'}, status=401)
+    if request.GET.get('page') not in LIVE_PAGES:
+        return JsonResponse({'error': f"page must be one of: {', '.join(LIVE_PAGES)}"}, status=400)
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI an endless stream would pin a worker; 204 tells EventSource not to retry
+        return HttpResponse(status=204)
+
+    _, compact = LIVE_PAGES[request.GET['page']]
+    calendar_id = request.GET.get('calendar_id') or 'primary'
+    canonical_id = await sync_to_async(canonical_calendar_id, thread_sensitive=False)(user.pk, calendar_id)
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_seq = None
+    csrf_token = get_token(request)
+
+    async def stream():
+        hub = live.hub()
+        connection = await hub.subscribe(user.pk, last_seq)
+        try:
+            yield live.message(retry=live.RECONNECT_MILLISECONDS)
+            while True:
+                changes = await connection.changes(live.HEARTBEAT_SECONDS)
+                if not changes:
+                    yield ': keep-alive\n\n'
+                for seq, entry in changes:
+                    if entry is None:
+                        yield live.message({'action': 'reload'}, event='reload', id=seq)
+                    elif entry['calendar_id'] != canonical_id:
+                        yield live.message(id=seq)
+                    else:
+                        yield live.message(_live_change(entry, calendar_id, compact, csrf_token), event='change', id=seq)
+        finally:
+            hub.unsubscribe(connection)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def search_view(request):
+    """Search the user's events from the local full-text index (no Google calls)."""
+    if not request.user.is_authenticated:
+        messages.error(request, "Please login to search events.")
+        return redirect('google_cal_sync:login')
+
+    query = request.GET.get('q', '').strip()
+    results = search_events(request.user, query) if query else []
+
+    context = {
+        'query': query,
+        'results': results,
+    }
+    return render(request, "google_cal_sync/search.html", context)
+
+
+def calendar_grid_view(request):
+    """Week or month grid of events for one calendar, bucketed by day server-side."""
+    weeks = []
+    calendars = []
+    selected_calendar = request.GET.get('calendar_id', 'primary')
+    view = request.GET.get('view') if request.GET.get('view') in GRID_VIEWS else 'week'
+    api_error = None
+    has_token = False
+
+    try:
+        anchor = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        anchor = timezone.localdate()
+    first_day, last_day = window_bounds(view, anchor)
+    previous_anchor, next_anchor = adjacent_anchors(view, anchor)
+
+    if request.user.is_authenticated:
+        has_token = GoogleToken.objects.filter(user=request.user).exists()
+        if has_token:
+            service = authenticate_with_google(request.user)
+            if service:
+                try:
+                    calendars = get_calendar_list(request.user, service)
+                    time_min, time_max = window_time_range(first_day, last_day)
+                    events = get_events_window(request.user, service, selected_calendar, time_min, time_max)
+                    weeks = bucket_events_by_day(events, first_day, last_day)
+                    # Warm the windows behind the next and previous links
+                    prefetcher.record_use(request.user, selected_calendar, ('window', time_min, time_max))
+                    prefetcher.schedule(request.user, [
+                        (selected_calendar, ('window', *window_time_range(*window_bounds(view, adjacent))))
+                        for adjacent in (next_anchor, previous_anchor)
+                    ])
+                except google_client.HttpError as error:
+                    api_error = f"Google API error: {error}"
+            else:
+                api_error = "Connect your Google account to view events."
+
+    context = {
+        'weeks': weeks,
+        'calendars': calendars,
+        'selected_calendar': selected_calendar,
+        'view': view,
+        'anchor': anchor,
+        'first_day': first_day,
+        'last_day': last_day - timedelta(days=1),
+        'previous_anchor': previous_anchor,
+        'next_anchor': next_anchor,
+        'api_error': api_error,
+        'has_token': has_token,
+    }
+    return render(request, "google_cal_sync/calendar_grid.html", context)
+
+
+@conditional_page(_settings_validator)
 def settings_view(request):
-    """Render settings with live token + calendar info."""
+    """
+    Render settings with live token + calendar info. Analytics that aren't
+    cached yet are loaded afterwards from settings_analytics_view;
+    ?inline=1 (the no-JS link) computes them here.
+    """
     has_token = False
     token_status = "Not connected"
     primary_calendar = None
     api_error = None
     user_email = None
+    analytics = None
+    analytics_url = None
+    analytics_range = request.GET.get('range') if request.GET.get('range') in ANALYTICS_RANGES else DEFAULT_RANGE
+    calendars = []
 
     if request.user.is_authenticated:
         try:
             google_token = GoogleToken.objects.get(user=request.user)
             has_token = True
-            if google_token.token_expiry and google_token.token_expiry > timezone.now():
+            if google_token.needs_reauth:
+                token_status = "Reconnect required"
+            elif google_token.token_expiry and google_token.token_expiry > timezone.now():
                 token_status = "Active"
             else:
                 token_status = "Expired"
@@ -554,12 +935,19 @@ def settings_view(request):
                 service = authenticate_with_google(request.user)
                 if service:
                     try:
-                        calendars = fetch_calendar_list(service)
+                        calendars = get_calendar_list(request.user, service)
                         primary_calendar = next((cal for cal in calendars if cal.get('primary')), None)
                         # Try to get user email from primary calendar
                         if primary_calendar:
                             user_email = primary_calendar.get('id', '').split('@')[0] if '@' in primary_calendar.get('id', '') else None
-                    except HttpError as error:
+                        analytics = peek_calendar_analytics(request.user, analytics_calendars(calendars), analytics_range)
+                        if analytics is None and request.GET.get('inline'):
+                            analytics = get_calendar_analytics(
+                                request.user, service, analytics_calendars(calendars), analytics_range,
+                            )
+                        elif analytics is None:
+                            analytics_url = f"{reverse('google_cal_sync:settings_analytics')}?range={analytics_range}"
+                    except google_client.HttpError as error:
                         api_error = f"Google API error: {error}"
                     except Exception as e:
                         # Handle network errors gracefully
@@ -576,10 +964,122 @@ def settings_view(request):
         'primary_calendar': primary_calendar,
         'api_error': api_error,
         'user_email': user_email,
+        'analytics_url': analytics_url,
     }
+    context.update(_analytics_context(analytics, analytics_range))
+    if has_token:
+        context.update(
+            sync_health=_sync_health_rows(request.user, calendars),
+            calendar_feeds=_calendar_feed_rows(request, calendars),
+            upstream_health=health.summary(f'user:{request.user.pk}'),
+            health_window_minutes=SUMMARY_WINDOW // 60,
+        )
+        if request.user.is_staff:
+            context.update(
+                endpoint_health=health.endpoint_summaries(), breakers=breaker_metrics(), single_flight=single_flight.stats(),
+                prefetch=prefetcher.stats(),
+            )
     return render(request, "google_cal_sync/settings.html", context)
 
 
+def _analytics_context(analytics, analytics_range):
+    return {
+        'analytics': analytics,
+        'analytics_heatmap': heatmap_rows(analytics) if analytics else [],
+        'analytics_range': analytics_range,
+        'analytics_ranges': list(ANALYTICS_RANGES),
+    }
+
+
+def settings_analytics_view(request):
+    """The settings page's meeting load panel as an HTML fragment, loaded after the page itself."""
+    if not request.user.is_authenticated:
+        return render(request, "google_cal_sync/_fragment_error.html", {'error': "Please login first."}, status=401)
+    analytics_range = request.GET.get('range') if request.GET.get('range') in ANALYTICS_RANGES else DEFAULT_RANGE
+
+    service = authenticate_with_google(request.user)
+    if not service:
+        return render(
+            request, "google_cal_sync/_fragment_error.html",
+            {'error': "Connect your Google account to view calendars."}, status=403,
+        )
+    try:
+        calendars = analytics_calendars(get_calendar_list(request.user, service))
+        analytics = get_calendar_analytics(request.user, service, calendars, analytics_range)
+    except google_client.HttpError as error:
+        return render(request, "google_cal_sync/_fragment_error.html", {'error': f"Google API error: {error}"}, status=502)
+    return render(request, "google_cal_sync/_settings_analytics.html", _analytics_context(analytics, analytics_range))
+
+
+def _sync_health_rows(user, calendars):
+    """Per-calendar data age and last failure for the settings health panel."""
+    entries = calendar_health(user, [calendar['id'] for calendar in calendars])
+    rows = []
+    for calendar in calendars:
+        entry = entries.get(calendar['id'], {})
+        refreshed_at, failed_at = entry.get('refreshed_at'), entry.get('failed_at')
+        rows.append({
+            'summary': calendar.get('summary') or calendar['id'],
+            'refreshed_at': datetime.fromtimestamp(refreshed_at, tz=dt_timezone.utc) if refreshed_at else None,
+            # Google failed after the last good load, so pages show the last-good copy
+            'failing': bool(failed_at and (not refreshed_at or failed_at > refreshed_at)),
+            'error': entry.get('error', ''),
+        })
+    return rows
+
+
+def _calendar_feed_rows(request, calendars):
+    """Each calendar with the URL of its subscription feed, if it has one."""
+    feeds = {feed.calendar_id: feed for feed in CalendarFeed.objects.filter(user=request.user)}
+    rows = []
+    for calendar in calendars:
+        feed = feeds.get(canonical_calendar_id(request.user.pk, calendar['id']))
+        rows.append({
+            'calendar_id': calendar['id'],
+            'summary': calendar.get('summary') or calendar['id'],
+            'url': request.build_absolute_uri(reverse('google_cal_sync:calendar_feed', args=[feed.token])) if feed else None,
+        })
+    return rows
+
+
+def analytics_view(request):
+    """Busy-hours heatmap and meeting load for the user's writable calendars as JSON."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Please login first.'}, status=401)
+    range_name = request.GET.get('range', DEFAULT_RANGE)
+    if range_name not in ANALYTICS_RANGES:
+        return JsonResponse({'error': f"range must be one of: {', '.join(ANALYTICS_RANGES)}"}, status=400)
+
+    service = authenticate_with_google(request.user)
+    if not service:
+        return JsonResponse({'error': 'Please connect your Google account first.'}, status=403)
+    try:
+        calendars = analytics_calendars(get_calendar_list(request.user, service))
+        analytics = get_calendar_analytics(request.user, service, calendars, range_name)
+    except google_client.HttpError as error:
+        return JsonResponse({'error': f"Google API error: {error}"}, status=502)
+    return JsonResponse(dict(analytics, range=range_name))
+
+
+def changes_view(request):
+    """
+    Events created, updated or deleted on the user's calendars since `cursor`,
+    as JSON with the cursor for the next poll; see google_cal_sync/changes.py.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Please login first.'}, status=401)
+    try:
+        return JsonResponse(poll_changes(request.user, request.GET.get('cursor')))
+    except CursorExpired as error:
+        return JsonResponse({'error': str(error)}, status=410)
+    except CursorError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except ChangeFeedUnavailable as error:
+        return JsonResponse({'error': str(error)}, status=403)
+    except google_client.HttpError as error:
+        return JsonResponse({'error': f"Google API error: {error}"}, status=502)
+
+
 def switch_account_view(request):
     """Disconnect current Google account and allow user to connect a different one."""
     if not request.user.is_authenticated:
@@ -598,6 +1098,87 @@ def switch_account_view(request):
     return redirect('google_cal_sync:settings')
 
 
+def calendar_feeds_view(request):
+    """Create or revoke the .ics subscription feed of one calendar."""
+    if not request.user.is_authenticated:
+        messages.error(request, "Please login first.")
+        return redirect('google_cal_sync:login')
+    if request.method != 'POST':
+        return redirect('google_cal_sync:settings')
+
+    calendar_id = canonical_calendar_id(request.user.pk, request.POST.get('calendar_id'))
+    if request.POST.get('action') == 'revoke':
+        feed = CalendarFeed.objects.filter(user=request.user, calendar_id=calendar_id).first()
+        if feed:
+            revoke_feed(feed)
+            messages.success(request, "Feed link revoked. Apps subscribed to it will stop updating.")
+        return redirect('google_cal_sync:settings')
+
+    service = authenticate_with_google(request.user)
+    if not service:
+        messages.error(request, "Please connect your Google account first.")
+        return redirect('google_cal_sync:settings')
+    try:
+        calendars = get_calendar_list(request.user, service)
+    except google_client.HttpError as error:
+        messages.error(request, f"Google API error: {error}")
+        return redirect('google_cal_sync:settings')
+    calendar = next(
+        (cal for cal in calendars
+         if canonical_calendar_id(request.user.pk, cal['id']) == calendar_id or (calendar_id == 'primary' and cal.get('primary'))),
+        None,
+    )
+    if calendar is None:
+        messages.error(request, "Calendar not found.")
+        return redirect('google_cal_sync:settings')
+
+    _, created = CalendarFeed.objects.get_or_create(
+        user=request.user, calendar_id=calendar_id,
+        defaults={'name': calendar.get('summary') or '', 'token': new_feed_token()},
+    )
+    if created:
+        messages.success(request, f"Feed link created for {calendar.get('summary') or calendar_id}.")
+    return redirect('google_cal_sync:settings')
+
+
+def calendar_feed_view(request, token):
+    """Serve a calendar as an .ics subscription feed; the secret token is the only credential."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    feed = lookup_feed(token)
+    if feed is None:
+        raise Http404("Feed not found")
+    return feed_response(request, feed)
+
+
+def profile_report_view(request, name):
+    """Serve a request profile written by ProfilingMiddleware (staff only)."""
+    if not settings.PROFILING_ENABLED or not request.user.is_staff or not PROFILE_NAME_RE.match(name):
+        raise Http404("Profile not found")
+
+    if request.GET.get('download'):
+        path = profile_path(name, 'prof')
+        if not os.path.exists(path):
+            raise Http404("Profile not found")
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}.prof')
+
+    path = profile_path(name, 'txt')
+    if not os.path.exists(path):
+        raise Http404("Profile not found")
+    with open(path) as report:
+        return HttpResponse(report.read(), content_type='text/plain; charset=utf-8')
+
+
+def google_status_view(request):
+    """Circuit breaker state of this worker process as JSON (staff only)."""
+    if not request.user.is_staff:
+        raise Http404("Not found")
+    return JsonResponse({
+        'pid': os.getpid(), 'breakers': breaker_metrics(), 'single_flight': single_flight.stats(),
+        'prefetch': prefetcher.stats(),
+    })
+
+
 def logout_view(request):
     """Log out the user and redirect to login page."""
     logout(request)
@@ -0,0 +1,19 @@
+"""
+Gunicorn configuration (picked up automatically from the project root).
+
+Set APP_PRELOAD=True to load the application, including the Google client
+libraries and discovery document, once in the master before forking workers.
+Worker count and bind address keep gunicorn's defaults (WEB_CONCURRENCY, PORT).
+"""
+import gc
+import os
+
+
+preload_app = os.getenv('APP_PRELOAD', 'False') == 'True'
+
+
+def when_ready(server):
+    if preload_app:
+        # Move the preloaded heap out of the collector's reach so GC passes in
+        # the workers don't write to (and un-share) those pages
+        gc.freeze()